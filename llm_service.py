@@ -0,0 +1,411 @@
+"""
+LLM分析服务 - 由单个常驻工作线程持有Llama实例，串行处理生成请求
+Web端检测器和桌面端main.py共用同一个服务，避免重复加载GGUF模型
+"""
+
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future, CancelledError, TimeoutError as FutureTimeoutError
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """请求在截止时间前未能完成生成"""
+
+    def __init__(self, message, partial_text=''):
+        super().__init__(message)
+        self.partial_text = partial_text
+
+
+class _GenerationRequest:
+    """队列中的一个生成请求（相同参数的请求会合并为同一个实例）"""
+
+    def __init__(self, key, prompt, prefix, params, deadline):
+        self.key = key
+        self.prompt = prompt
+        self.prefix = prefix
+        self.params = params
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+        self.future = Future()
+        self.waiters = 1        # 仍在等待结果的调用方数量
+        self.cancelled = False  # 所有调用方都已超时放弃，工作线程跳过或在下一个token处停止
+        self.pieces = []        # 已生成的文本片段
+        self.token_callbacks = []
+
+
+class LLMService:
+    def __init__(self, model_path, n_ctx=512, n_threads=None, verbose=False, max_prefix_states=4,
+                 cpu_affinity=None):
+        """
+        初始化LLM服务（模型在工作线程首次处理请求时加载）
+
+        Args:
+            model_path: GGUF模型路径
+            n_ctx: 上下文长度
+            n_threads: 推理线程数（None表示由llama.cpp自动决定）
+            verbose: 是否输出llama.cpp日志
+            max_prefix_states: 最多缓存的固定前缀KV状态数
+            cpu_affinity: 工作线程（及llama.cpp由其创建的计算线程）允许使用的CPU核心编号集合，
+                None表示不限制（仅Linux支持）
+        """
+        self.model_path = model_path
+        self.n_ctx = n_ctx
+        self.n_threads = n_threads
+        self.verbose = verbose
+        self.max_prefix_states = max_prefix_states
+        self.cpu_affinity = set(cpu_affinity) if cpu_affinity else None
+
+        self._llm = None
+        self._prefix_states = {}  # 固定前缀文本 -> 已求值的KV状态（每次模型加载计算一次）
+        self._load_error = None
+        self._queue = queue.Queue()
+        self._pending = {}  # 请求键 -> 排队或生成中的请求，用于合并重复请求
+        self._lock = threading.Lock()
+        self._thread = None
+        self._busy = False
+
+        # 服务统计
+        self.stats = {
+            'submitted': 0,
+            'coalesced': 0,
+            'completed': 0,
+            'deadline_exceeded': 0,
+            'cancelled': 0,
+            'errors': 0,
+            'total_queue_wait': 0.0,
+            'total_generation_time': 0.0,
+            'total_tokens': 0
+        }
+        # 按前缀缓存情况分类的延迟统计: 无前缀 / 前缀首次求值 / 前缀状态复用
+        self.latency = {
+            mode: {'count': 0, 'total_ttft': 0.0, 'total_time': 0.0}
+            for mode in ('none', 'cold', 'warm')
+        }
+
+    def is_available(self):
+        """模型文件存在且未发生加载错误"""
+        return os.path.exists(self.model_path) and self._load_error is None
+
+    def is_busy(self):
+        """当前是否正在生成"""
+        return self._busy
+
+    def start(self):
+        """启动工作线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name='llm-service', daemon=True)
+                self._thread.start()
+
+    def preload(self, wait=False):
+        """
+        在工作线程中提前加载模型（模型文件不存在时忽略）
+
+        Args:
+            wait: 是否等待加载完成（fork前预加载时使用，避免fork时工作线程正持有锁加载模型）
+        """
+        if os.path.exists(self.model_path):
+            self.start()
+            self._queue.put(None)
+            if wait:
+                self._queue.join()
+
+    def submit(self, prompt, max_tokens=300, stop=None, temperature=0.8, timeout=None, prefix='',
+               on_token=None):
+        """
+        提交生成请求
+
+        Args:
+            prompt: 提示词（指定prefix时为前缀之后的可变部分）
+            prefix: 固定的提示词前缀，其KV状态只求值一次并在后续请求中复用
+            on_token: 流式回调，每生成一个token调用一次on_token(text)
+            max_tokens: 最大生成token数
+            stop: 停止词列表
+            temperature: 采样温度
+            timeout: 从提交起计算的截止时间（秒），None表示不限
+
+        Returns:
+            Future: 结果为包含text和耗时指标的字典
+        """
+        return self._enqueue(prompt, max_tokens, stop, temperature, timeout, prefix, on_token).future
+
+    def _enqueue(self, prompt, max_tokens, stop, temperature, timeout, prefix, on_token):
+        """提交或合并生成请求，返回对应的_GenerationRequest"""
+        self.start()
+        params = {
+            'max_tokens': max_tokens,
+            'stop': list(stop or []),
+            'temperature': temperature
+        }
+        key = (prefix, prompt, max_tokens, tuple(params['stop']), temperature)
+        deadline = time.monotonic() + timeout if timeout else None
+
+        with self._lock:
+            self.stats['submitted'] += 1
+            request = self._pending.get(key)
+            if request is not None:
+                # 合并重复请求：共享同一结果，截止时间取较晚者
+                request.waiters += 1
+                if request.deadline is not None:
+                    request.deadline = None if deadline is None else max(request.deadline, deadline)
+                if on_token is not None:
+                    # 先补发已生成的部分，之后随生成继续回调
+                    if request.pieces:
+                        self._notify(on_token, ''.join(request.pieces))
+                    request.token_callbacks.append(on_token)
+                self.stats['coalesced'] += 1
+                return request
+
+            request = _GenerationRequest(key, prompt, prefix, params, deadline)
+            if on_token is not None:
+                request.token_callbacks.append(on_token)
+            self._pending[key] = request
+
+        self._queue.put(request)
+        return request
+
+    def generate(self, prompt, max_tokens=300, stop=None, temperature=0.8, timeout=None, prefix='',
+                 on_token=None):
+        """
+        同步生成，等待结果或截止时间
+
+        超时后调用方不再等待：合并的请求中没有其他调用方时请求被取消，排队中的直接跳过，生成中的在下一个token处停止
+        """
+        request = self._enqueue(prompt, max_tokens, stop, temperature, timeout, prefix, on_token)
+        try:
+            return request.future.result(timeout=timeout)
+        except FutureTimeoutError:
+            if not request.future.done():
+                self._abandon(request, on_token)
+            raise
+
+    def _abandon(self, request, on_token=None):
+        """调用方放弃等待：减少等待数，最后一个调用方放弃时取消请求"""
+        with self._lock:
+            if on_token is not None and on_token in request.token_callbacks:
+                request.token_callbacks.remove(on_token)
+            request.waiters -= 1
+            if request.waiters > 0 or request.future.done():
+                return
+            request.cancelled = True
+            self.stats['cancelled'] += 1
+            # 之后的相同请求重新排队，不再合并到已取消的请求
+            if self._pending.get(request.key) is request:
+                del self._pending[request.key]
+        # 还在排队时直接取消Future，工作线程取出后跳过
+        request.future.cancel()
+
+    def get_stats(self):
+        """返回服务统计"""
+        with self._lock:
+            stats = dict(self.stats)
+            queue_depth = len(self._pending)
+        completed = max(1, stats['completed'])
+        stats.update({
+            'model_path': self.model_path,
+            'loaded': self._llm is not None,
+            'load_error': self._load_error,
+            'busy': self._busy,
+            'queue_depth': queue_depth,
+            'avg_queue_wait': stats['total_queue_wait'] / completed,
+            'avg_generation_time': stats['total_generation_time'] / completed,
+            'tokens_per_second': (stats['total_tokens'] / stats['total_generation_time']
+                                  if stats['total_generation_time'] > 0 else 0),
+            'prefix_states': len(self._prefix_states),
+            'n_threads': self.n_threads,
+            'cpu_affinity': sorted(self.cpu_affinity) if self.cpu_affinity else None,
+            'latency': {
+                mode: {
+                    'count': item['count'],
+                    'avg_time_to_first_token': item['total_ttft'] / max(1, item['count']),
+                    'avg_total_time': item['total_time'] / max(1, item['count'])
+                }
+                for mode, item in self.latency.items()
+            }
+        })
+        return stats
+
+    @staticmethod
+    def _notify(callback, text):
+        """调用流式回调，回调异常不影响生成"""
+        try:
+            callback(text)
+        except Exception as e:
+            print(f"⚠️ LLM流式回调出错: {str(e)}")
+
+    def _load(self):
+        """在工作线程中加载模型"""
+        if self._llm is not None or self._load_error is not None:
+            return
+        try:
+            from llama_cpp import Llama
+
+            print("🔄 正在加载LLaMA模型...")
+            kwargs = {'model_path': self.model_path, 'n_ctx': self.n_ctx, 'verbose': self.verbose}
+            if self.n_threads:
+                kwargs['n_threads'] = self.n_threads
+            self._llm = Llama(**kwargs)
+            print("✅ LLaMA模型加载完成")
+        except Exception as e:
+            self._load_error = str(e)
+            print(f"❌ LLaMA模型加载失败: {str(e)}")
+
+    def _restore_prefix(self, prefix):
+        """
+        将模型置于"已求值固定前缀"的状态，随后llama.cpp的前缀匹配只需处理可变后缀
+
+        Returns:
+            str: cold（本次首次求值并保存状态）或 warm（复用已保存的状态）
+        """
+        state = self._prefix_states.get(prefix)
+        if state is not None:
+            self._llm.load_state(state)
+            return 'warm'
+
+        tokens = self._llm.tokenize(prefix.encode('utf-8'))
+        self._llm.reset()
+        self._llm.eval(tokens)
+        if len(self._prefix_states) >= self.max_prefix_states:
+            self._prefix_states.pop(next(iter(self._prefix_states)))
+        self._prefix_states[prefix] = self._llm.save_state()
+        print(f"💾 已缓存提示词前缀KV状态 ({len(tokens)} tokens)")
+        return 'cold'
+
+    def _apply_affinity(self):
+        """将当前（工作）线程绑定到指定CPU核心，llama.cpp随后创建的计算线程会继承该设置"""
+        if not self.cpu_affinity:
+            return
+        if not hasattr(os, 'sched_setaffinity'):
+            print("⚠️ 当前平台不支持设置CPU亲和性，LLM线程不受限制")
+            return
+        try:
+            os.sched_setaffinity(0, self.cpu_affinity)
+            print(f"📌 LLM工作线程已绑定CPU核心: {sorted(self.cpu_affinity)}")
+        except OSError as e:
+            print(f"⚠️ 设置LLM线程CPU亲和性失败: {str(e)}")
+
+    def _worker(self):
+        """工作线程：逐个处理队列中的请求"""
+        self._apply_affinity()
+        while True:
+            request = self._queue.get()
+            if request is None:
+                # 预加载请求
+                self._load()
+                self._queue.task_done()
+                continue
+            try:
+                self._process(request)
+            finally:
+                with self._lock:
+                    if self._pending.get(request.key) is request:
+                        del self._pending[request.key]
+                self._queue.task_done()
+
+    def _process(self, request):
+        """处理单个请求并设置Future结果"""
+        if not request.future.set_running_or_notify_cancel():
+            return
+
+        started = time.monotonic()
+        queue_wait = started - request.enqueued_at
+
+        with self._lock:
+            deadline = request.deadline
+        if deadline is not None and started >= deadline:
+            with self._lock:
+                self.stats['deadline_exceeded'] += 1
+            request.future.set_exception(
+                LLMDeadlineExceeded(f"请求在队列中等待{queue_wait:.1f}秒，已超过截止时间"))
+            return
+
+        self._load()
+        if self._llm is None:
+            with self._lock:
+                self.stats['errors'] += 1
+            request.future.set_exception(RuntimeError(f"LLaMA模型不可用: {self._load_error}"))
+            return
+
+        self._busy = True
+        pieces = request.pieces
+        tokens = 0
+        first_token_at = None
+        prefix_mode = 'none'
+        try:
+            if request.prefix:
+                prefix_mode = self._restore_prefix(request.prefix)
+            for chunk in self._llm(request.prefix + request.prompt, stream=True, **request.params):
+                if first_token_at is None:
+                    first_token_at = time.monotonic()
+                text = chunk["choices"][0]["text"]
+                with self._lock:
+                    if request.cancelled:
+                        break
+                    pieces.append(text)
+                    callbacks = list(request.token_callbacks)
+                    # 合并请求时截止时间可能被延后，每个token重新读取
+                    deadline = request.deadline
+                for callback in callbacks:
+                    self._notify(callback, text)
+                tokens += 1
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise LLMDeadlineExceeded(
+                        f"生成超过截止时间（已生成{tokens}个token）", ''.join(pieces))
+        except LLMDeadlineExceeded as e:
+            with self._lock:
+                self.stats['deadline_exceeded'] += 1
+            request.future.set_exception(e)
+            return
+        except Exception as e:
+            with self._lock:
+                self.stats['errors'] += 1
+            print(f"❌ LLM生成失败: {str(e)}")
+            request.future.set_exception(e)
+            return
+        finally:
+            self._busy = False
+
+        if request.cancelled:
+            print(f"⏹️ LLM请求的调用方已全部超时，已停止生成（已生成{tokens}个token）")
+            request.future.set_exception(CancelledError())
+            return
+
+        generation_time = time.monotonic() - started
+        time_to_first_token = (first_token_at or time.monotonic()) - started
+        with self._lock:
+            self.stats['completed'] += 1
+            self.stats['total_queue_wait'] += queue_wait
+            self.stats['total_generation_time'] += generation_time
+            self.stats['total_tokens'] += tokens
+            latency = self.latency[prefix_mode]
+            latency['count'] += 1
+            latency['total_ttft'] += time_to_first_token
+            latency['total_time'] += generation_time
+
+        request.future.set_result({
+            'text': ''.join(pieces),
+            'queue_wait': queue_wait,
+            'time_to_first_token': time_to_first_token,
+            'prefix_cache': prefix_mode,
+            'generation_time': generation_time,
+            'completion_tokens': tokens,
+            'tokens_per_second': tokens / generation_time if generation_time > 0 else 0,
+            'waiters': request.waiters
+        })
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_llm_service(model_path, **kwargs):
+    """获取（必要时创建）指定模型的共享LLM服务，同一进程内每个模型只有一个实例"""
+    key = os.path.abspath(model_path)
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = LLMService(model_path, **kwargs)
+            _services[key] = service
+        return service
@@ -1,78 +1,205 @@
 import cv2
-from ultralytics import YOLO
-from collections import deque, defaultdict
+from collections import deque
 import numpy as np
-from llama_cpp import Llama
 from tkinter import messagebox
 import json
 import threading
 import tkinter as tk
 import time
+import os
+from llm_service import get_llm_service
+import model_loader
 
 
 last_llm_time = 0
 llm_cooldown = 10
+llm_deadline = 120  # seconds an alert may wait + generate before it is dropped
+
+# CPU budget for the LLM: a quarter of the cores (at least one), pinned to the last cores.
+# Detection (YOLO/torch and OpenCV) is pinned to the remaining cores when it starts, so the two
+# never compete and the detection frame rate holds while an alert is generated
+cpu_count = os.cpu_count() or 1
+llm_threads = max(1, cpu_count // 4)
+llm_cpu_affinity = set(range(cpu_count - llm_threads, cpu_count)) if cpu_count > llm_threads else None
+detection_cpus = set(range(cpu_count - llm_threads)) if llm_cpu_affinity else None
+_detection_pools_sized = False
+
+
+def reserve_detection_cores():
+    """Pin the calling detection thread to the non-LLM cores and size the torch/OpenCV pools to match.
+
+    Called when detection starts rather than at import, so importing main (the GUI) stays light
+    and the Tk thread is not pinned. The torch/OpenCV pool threads are created by the first
+    inference on this thread and inherit its mask.
+    """
+    global _detection_pools_sized
+    if detection_cpus is None:
+        return
+    if hasattr(os, "sched_setaffinity"):
+        try:
+            # pins the calling thread only (Linux), so every detection thread pins itself
+            os.sched_setaffinity(0, detection_cpus)
+        except OSError as e:
+            print(f"Could not pin detection thread: {e}")
+    if not _detection_pools_sized:
+        _detection_pools_sized = True
+        cv2.setNumThreads(len(detection_cpus))
+        try:
+            import torch  # already imported by ultralytics at this point
+            torch.set_num_threads(len(detection_cpus))
+        except ImportError:
+            pass
+        print(f"Detection pinned to CPU cores {sorted(detection_cpus)}")
+
+# shared LLM worker; the model is loaded by its own thread on first request
+llm = get_llm_service("models/tinyllama-1.1b-chat-v1.0.Q4_K_M.gguf", n_ctx=512,
+                      n_threads=llm_threads, cpu_affinity=llm_cpu_affinity)
 
-llm = Llama(
-    model_path="models/tinyllama-1.1b-chat-v1.0.Q4_K_M.gguf",  
-    n_ctx=512,
-    verbose=False
-)
+# fixed instruction prefix; its KV state is evaluated once and reused for every alert
+llm_prompt_prefix = "You are an elderly care expert. Based on the following fall event data, please generate a concise care suggestion or an alert message:Event Data: "
 
 last_popup_window = None
 
 
-def send_to_llm_and_show(data: dict):
-    def llm_thread():
-        global last_popup_window
+def fold_alert(pending, event):
+    """Fold a new alert into the pending slot: running counts plus the latest event, so its size is fixed."""
+    if pending is None:
+        return {"count": 1, "first_frame": event["frame"], "fall_types": {event["fall_type"]: 1},
+                "max_velocity": event["velocity"], "latest": event}
+    pending["count"] += 1
+    pending["fall_types"][event["fall_type"]] = pending["fall_types"].get(event["fall_type"], 0) + 1
+    pending["max_velocity"] = max(pending["max_velocity"], event["velocity"])
+    pending["latest"] = event
+    return pending
+
+
+def summarize_alerts(pending):
+    """Event data for the prompt: the alert itself, or a summary of the alerts folded in during one generation."""
+    latest = pending["latest"]
+    if pending["count"] == 1:
+        return latest
+    return {
+        "alerts": pending["count"],
+        "frames": [pending["first_frame"], latest["frame"]],
+        "fall": True,
+        "person_id": latest["person_id"],
+        "fall_types": pending["fall_types"],
+        "max_velocity": pending["max_velocity"],
+        "center": latest["center"],
+        "bbox": latest["bbox"],
+        "fall_type": latest["fall_type"]
+    }
+
+
+class AlertWorker:
+    """
+    Single consumer for LLM alert popups with a queue of depth one.
+
+    At most one generation runs at a time; alerts that arrive meanwhile are folded into one
+    pending slot (a count plus the latest event) and sent as a single summarized request once
+    the current one finishes, so memory and prompt size stay bounded however long it runs.
+    """
+
+    def __init__(self, service, max_tokens=600, deadline=llm_deadline):
+        self.service = service
+        self.max_tokens = max_tokens
+        self.deadline = deadline
+        self._pending = None
+        self._cond = threading.Condition()
+        self._busy = False
+        self.stats = {"alerts": 0, "requests": 0, "coalesced": 0}
+        self._thread = threading.Thread(target=self._run, name="alert-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, event):
+        with self._cond:
+            self.stats["alerts"] += 1
+            if self._pending is not None:
+                self.stats["coalesced"] += 1
+            self._pending = fold_alert(self._pending, event)
+            self._cond.notify()
+
+    def is_busy(self):
+        return self._busy
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                pending, self._pending = self._pending, None
+                self._busy = True
+                self.stats["requests"] += 1
+            try:
+                self._generate(summarize_alerts(pending), pending["count"])
+            finally:
+                self._busy = False
+
+    def _generate(self, data, alert_count):
+        prompt = f"""{json.dumps(data, ensure_ascii=False)}Please respond in English:"""
+        try:
+            res = self.service.generate(prompt, prefix=llm_prompt_prefix, max_tokens=self.max_tokens,
+                                        stop=["</s>"], timeout=self.deadline) #adjust max_token to get detailed outputs
+        except Exception as e:
+            print(f"LLM request failed: {e}")
+            return
+
+        print(f"LLM: {alert_count} alert(s), waited {res['queue_wait']:.1f}s, first token "
+              f"{res['time_to_first_token']:.2f}s (prefix {res['prefix_cache']}), generated "
+              f"{res['completion_tokens']} tokens at {res['tokens_per_second']:.1f} tokens/s")
+        show_llm_popup(res["text"].strip())
 
-        prompt = f"""You are an elderly care expert. Based on the following fall event data, please generate a concise care suggestion or an alert message:Event Data: {json.dumps(data, ensure_ascii=False)}Please respond in English:"""
 
+def show_llm_popup(text_output):
+    def show():
+        global last_popup_window
+        if last_popup_window is not None:
+            try:
+                last_popup_window.destroy()
+            except:
+                pass
 
-        res = llm(prompt, max_tokens=600, stop=["</s>"]) #adjust max_token to get detailed outputs
-        text_output = res["choices"][0]["text"].strip()
+        popup = tk.Toplevel()
+        popup.title("LLM Analysis Result")
+        popup.geometry("500x300")  
+        popup.resizable(True, True)
 
 
-        def show():
-            global last_popup_window
-            if last_popup_window is not None:
-                try:
-                    last_popup_window.destroy()
-                except:
-                    pass
+        frame = tk.Frame(popup)
+        frame.pack(fill='both', expand=True)
 
-            popup = tk.Toplevel()
-            popup.title("LLM Analysis Result")
-            popup.geometry("500x300")  
-            popup.resizable(True, True)
+        scrollbar = tk.Scrollbar(frame)
+        scrollbar.pack(side='right', fill='y')
 
+        text_widget = tk.Text(frame, wrap='word', yscrollcommand=scrollbar.set)
+        text_widget.insert('1.0', text_output)
+        text_widget.config(state='disabled') 
+        text_widget.pack(fill='both', expand=True)
 
-            frame = tk.Frame(popup)
-            frame.pack(fill='both', expand=True)
+        scrollbar.config(command=text_widget.yview)
 
-            scrollbar = tk.Scrollbar(frame)
-            scrollbar.pack(side='right', fill='y')
+        tk.Button(popup, text="Close", command=popup.destroy).pack(pady=10)
 
-            text_widget = tk.Text(frame, wrap='word', yscrollcommand=scrollbar.set)
-            text_widget.insert('1.0', text_output)
-            text_widget.config(state='disabled') 
-            text_widget.pack(fill='both', expand=True)
+        last_popup_window = popup
 
-            scrollbar.config(command=text_widget.yview)
+    try:
+        root = tk._default_root
+        if root:
+            root.after(0, show)
+    except:
+        pass
 
-            tk.Button(popup, text="Close", command=popup.destroy).pack(pady=10)
 
-            last_popup_window = popup
+alert_worker = AlertWorker(llm)
 
-        try:
-            root = tk._default_root
-            if root:
-                root.after(0, show)
-        except:
-            pass
+
+def warm_up(model_paths=(), on_done=None):
+    """Load the given YOLO models and the LLM in the background."""
+    return model_loader.warm_up(model_paths, llm=llm, on_done=on_done)
 
 
-    threading.Thread(target=llm_thread, daemon=True).start()
+def send_to_llm_and_show(data: dict):
+    alert_worker.submit(data)
 
 def compute_center(box):
     x1, y1, x2, y2 = box
@@ -92,8 +219,10 @@ def detect_fall_smart(
     vote_threshold=10,
     speed_threshold=20
 ):
-    fall_model = YOLO(fall_model_path)
-    pose_model = YOLO(pose_model_path)
+    # loaded on first use and cached, so repeated runs (and a GUI warm-up) skip the load
+    fall_model = model_loader.get_yolo(fall_model_path)
+    pose_model = model_loader.get_yolo(pose_model_path)
+    reserve_detection_cores()
 
     llm_called = False
     cap = cv2.VideoCapture(video_path)
@@ -105,7 +234,12 @@ def detect_fall_smart(
     fall_history = deque(maxlen=window_size)
     last_centers = []
 
+    # detection FPS, split by whether an LLM generation was running during the frame
+    fps_stats = {"idle": [0, 0.0], "llm_busy": [0, 0.0]}
+    frame_times = deque(maxlen=30)
+
     while True:
+        frame_start = time.perf_counter()
         ret, frame = cap.read()
         if not ret:
             break
@@ -179,6 +313,15 @@ def detect_fall_smart(
         if not persistent_fall and not sudden_fall_flag:
             llm_called = False
 
+        llm_busy = alert_worker.is_busy()
+        frame_times.append(time.perf_counter() - frame_start)
+        current_fps = len(frame_times) / sum(frame_times)
+        bucket = fps_stats["llm_busy" if llm_busy else "idle"]
+        bucket[0] += 1
+        bucket[1] += frame_times[-1]
+        cv2.putText(frame, f"FPS: {current_fps:.1f}" + (" (LLM running)" if llm_busy else ""),
+                    (10, height - 15), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
+
         out.write(frame)
         cv2.imshow("Smart Fall Detection", frame)
         if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -187,3 +330,9 @@ def detect_fall_smart(
     cap.release()
     out.release()
     cv2.destroyAllWindows()
+
+    for name, (frames, elapsed) in fps_stats.items():
+        if frames:
+            print(f"Detection FPS ({name}): {frames / elapsed:.1f} over {frames} frames")
+    print(f"Alerts: {alert_worker.stats['alerts']}, LLM requests: {alert_worker.stats['requests']}, "
+          f"coalesced: {alert_worker.stats['coalesced']}")
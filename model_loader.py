@@ -0,0 +1,73 @@
+"""
+Lazy model loading for main.py and gui.py.
+
+Nothing heavy is imported or loaded until a model is first needed, so importing main.py
+(and opening the GUI window) does not wait on ultralytics or the GGUF file.
+"""
+
+import os
+import threading
+import time
+
+_yolo_models = {}
+_yolo_locks = {}
+_locks_guard = threading.Lock()
+
+# seconds spent loading each model, for startup diagnostics
+load_times = {}
+
+
+def get_yolo(model_path):
+    """Return the YOLO model for model_path, loading it on first use (thread-safe)."""
+    model = _yolo_models.get(model_path)
+    if model is not None:
+        return model
+
+    with _locks_guard:
+        lock = _yolo_locks.setdefault(model_path, threading.Lock())
+
+    # per-path lock: a background warm-up of one model does not block loading another
+    with lock:
+        model = _yolo_models.get(model_path)
+        if model is None:
+            start = time.perf_counter()
+            from ultralytics import YOLO  # imported on first use; this import alone takes seconds
+
+            model = YOLO(model_path)
+            _yolo_models[model_path] = model
+            load_times[model_path] = time.perf_counter() - start
+            print(f"Loaded {model_path} in {load_times[model_path]:.2f}s")
+        return model
+
+
+def is_loaded(model_path):
+    return model_path in _yolo_models
+
+
+def warm_up(model_paths=(), llm=None, on_done=None):
+    """
+    Load models in a background thread so the first detection run starts immediately.
+
+    Paths that do not exist (e.g. not chosen yet) are skipped; the LLM service only
+    loads its GGUF file in its own worker thread. on_done(errors) is called at the end.
+    """
+    def run():
+        errors = {}
+        start = time.perf_counter()
+        if llm is not None:
+            llm.preload()
+        for path in model_paths:
+            if not path or not os.path.exists(path):
+                continue
+            try:
+                get_yolo(path)
+            except Exception as e:
+                errors[path] = str(e)
+                print(f"Warm-up failed for {path}: {e}")
+        print(f"Model warm-up finished in {time.perf_counter() - start:.2f}s")
+        if on_done is not None:
+            on_done(errors)
+
+    thread = threading.Thread(target=run, name="model-warmup", daemon=True)
+    thread.start()
+    return thread
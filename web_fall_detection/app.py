@@ -5,12 +5,16 @@
 
 import os
 import sys
+import re
+import csv
 import uuid
 import json
 import time
+import shutil
+import tempfile
 import threading
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_file, url_for
+from flask import Flask, render_template, request, jsonify, url_for, Response, stream_with_context, redirect
 from werkzeug.utils import secure_filename
 from werkzeug.serving import make_server
 import cv2
@@ -29,7 +33,32 @@ except ImportError:
     from utils.demo import DemoAnalyzer as ResultAnalyzer
     DEMO_MODE = True
 
+from utils.profiler import TaskProfiler
+from utils.llm_cache import LLMResponseCache
+from utils.event_stream import EventBroker, format_sse, stream_channel, parse_last_event_id
+from utils.task_store import TaskStore
+from utils.media import send_media
+from utils.upload import StreamingUploadRequest, UploadRejected, save_upload, probe_video
+from utils.resumable_upload import UploadSessionStore, UploadSessionError
+from utils.growing_video import UploadFollower
+from utils.progressive_output import PLAYLIST_NAME, INIT_SEGMENT, PREVIEW_FILE_RE
+from utils.thumbnails import ThumbnailRecorder, THUMBNAIL_FILE_RE
+from utils.clips import ClipExtractor, ClipError, clip_filename
+from utils.storage import StorageManager
+from utils.job_control import JobControl, JobCancelled, WorkerPool, PRIORITIES
+from utils.checkpoint import CheckpointStore
+from utils.job_queue import JobQueue
+from utils.batch import BatchStore, BatchError, collect_videos
+from utils.columnar import (compact_detection_result, expand_detection_result, event_table, event_count,
+                            event_rows, expand_rows, slice_rows)
+from utils.compression import compress_response
+from utils.calibration import (CalibrationError, model_signature, set_inference_threads, prepare_clip,
+                               run_calibration, load_profile, save_profile, machine_info)
+from llm_service import get_llm_service
+
 app = Flask(__name__)
+# 上传文件在解析表单时直接分块写入上传目录
+app.request_class = StreamingUploadRequest
 app.config['SECRET_KEY'] = 'fall-detection-secret-key'
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max file size
 
@@ -38,24 +67,637 @@ PERFORMANCE_CONFIG = {
     'use_gpu': True,       # 是否使用GPU加速
     'skip_frames': 5,      # 跳帧间隔（1=每帧检测，3=每3帧检测）
     'detection_conf': 0.6, # 检测置信度阈值
-    'iou_threshold': 0.3   # IOU阈值
+    'iou_threshold': 0.3,  # IOU阈值
+    'imgsz': 640,          # YOLO推理输入尺寸（预热按此尺寸执行）
+    'threads': 0           # 推理线程数（PyTorch、OpenCV，0为库的默认值）
+}
+
+# 部署模式：inline为单进程模式（python app.py，检测在Web进程的线程中运行）；
+# queue为生产模式（gunicorn多进程处理HTTP请求，检测任务放入队列，由detection_worker.py启动的模型工作进程执行）
+DEPLOY_MODE = os.environ.get('FALL_DETECTION_MODE', 'inline')
+
+# 检测工作线程配置
+WORKER_CONFIG = {
+    'max_workers': 2,          # 同时运行的检测任务数，超出的任务排队等待（生产模式下为工作进程数）
+    'preload_models': True,    # 生产模式下在fork工作进程前加载模型（写时复制共享；使用GPU时在各工作进程中加载）
+    'poll_interval': 0.5,      # 工作进程空闲时检查队列的间隔（秒）
+    'heartbeat_interval': 2,   # 监督进程写入工作进程心跳的间隔（秒），超过3倍间隔未更新视为不可用
+    'max_attempts': 3          # 工作进程异常退出时任务重新排队，超过该领取次数的任务标记为失败
+}
+
+# 模型路径
+FALL_MODEL_PATH = '../models/best.pt'
+POSE_MODEL_PATH = '../models/yolov8n-pose.pt'
+LLM_MODEL_PATH = '../models/tinyllama-1.1b-chat-v1.0.Q4_K_M.gguf'
+
+# LLM分析阶段配置
+LLM_CONFIG = {
+    'time_budget': 90   # 分析阶段时间预算（秒，含排队），超时使用备用分析
+}
+
+# LLM响应缓存配置
+LLM_CACHE_CONFIG = {
+    'ttl': 7 * 24 * 3600,   # 缓存有效期（秒）
+    'max_entries': 1000     # 最大缓存条目数
+}
+
+# 断点续传配置
+RESUMABLE_UPLOAD_CONFIG = {
+    'chunk_size': 8 * 1024 * 1024,   # 分块大小（字节）
+    'session_ttl': 24 * 3600         # 会话在最后一次活动后保留的时长（秒）
+}
+
+# 边上传边检测配置（客户端通过/uploads/<id>/detect选择启用）
+EARLY_DETECTION_CONFIG = {
+    'enabled': True,        # 是否允许边上传边检测
+    'poll_interval': 0.2,   # 读到已接收数据末尾后检查新分块的间隔（秒）
+    'idle_timeout': 300     # 超过该时长没有新分块时放弃检测并释放工作槽位（秒）
+}
+
+# 视频文件服务配置
+MEDIA_CONFIG = {
+    'chunk_size': 256 * 1024,   # 非零拷贝路径的读取块大小（字节）
+    'zero_copy': True           # 服务器支持时使用wsgi.file_wrapper（sendfile）发送
+}
+
+# 响应压缩配置（JSON、HTML，客户端支持时使用brotli或gzip）
+COMPRESSION_CONFIG = {
+    'enabled': True,
+    'min_size': 1024,       # 小于该大小的响应不压缩（字节）
+    'gzip_level': 6,
+    'brotli_quality': 5     # 需要安装brotli
+}
+
+# 事件列表接口配置
+EVENT_PAGE_MAX_LIMIT = 5000
+
+# 处理中预览配置（需要ffmpeg，不可用时检测结束后才能观看结果）
+PREVIEW_CONFIG = {
+    'hls': True,             # 输出同时写成HLS分段，检测进行中可播放已处理的部分
+    'segment_seconds': 2,    # 分段时长（秒）
+    'retention': 600         # 任务结束后保留预览分段的时长（秒），之后只保留完整MP4
+}
+
+# 结果页缩略图配置
+THUMBNAIL_CONFIG = {
+    'enabled': True,
+    'event_width': 320,       # 事件缩略图宽度（像素）
+    'sprite_interval': 10,    # 雪碧图截取间隔（视频秒数）
+    'tile_width': 160,        # 雪碧图中单个缩略图宽度（像素）
+    'sprite_columns': 10,     # 每张雪碧图10x10个缩略图
+    'sprite_rows': 10,
+    'jpeg_quality': 80
+}
+
+# 事件片段配置
+CLIP_CONFIG = {
+    'pre_seconds': 5,     # 默认截取事件前的时长（秒）
+    'post_seconds': 5,    # 默认截取事件后的时长（秒）
+    'max_seconds': 30,    # 请求参数pre/post的上限（秒）
+    'stream_copy': True   # 有ffmpeg时从关键帧起无损截取，不重新编码
+}
+
+# 存储配额配置（字节，None表示不限）：超出配额时按最近访问时间淘汰任务的视频文件，任务记录和检测事件保留
+STORAGE_CONFIG = {
+    'quotas': {
+        'uploads': 20 * 1024 ** 3,    # 上传的原始视频
+        'outputs': 20 * 1024 ** 3     # 标注后的输出视频、事件片段和预览分段
+    },
+    'tenant_quota': None,             # 每个租户（两个区域合计）的默认配额
+    'tenant_quotas': {},              # 指定租户的配额 {租户: 字节数}
+    'tenant_header': 'X-Tenant-ID',   # 租户标识请求头，缺省为default
+    'min_idle': 300,                  # 最近该时长内访问过的文件不淘汰（秒）
+    'touch_interval': 60              # 访问时间的最小更新间隔（秒）
+}
+TENANT_RE = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+# 断点续跑配置：长视频检测定期保存检查点，服务重启后从最近的检查点继续（需要ffmpeg分段输出）
+CHECKPOINT_CONFIG = {
+    'enabled': True,
+    'interval': 60,          # 检查点间隔（视频秒数，对齐到输出分段边界）
+    'min_duration': 300,     # 只为时长不短于该值的视频保存检查点（秒）
+    'keep': 2                # 每个任务保留的检查点数量
+}
+
+# 批量任务配置：一次提交目录或清单中的本地视频，视频在原位置读取，不复制到上传目录
+BATCH_CONFIG = {
+    # 允许批量读取的目录（环境变量FALL_DETECTION_BATCH_ROOTS，多个目录用路径分隔符分隔），未配置时不能提交批次
+    'allowed_roots': [path for path in os.environ.get('FALL_DETECTION_BATCH_ROOTS', '').split(os.pathsep) if path],
+    'max_concurrency': 2,      # 所有批次同时检测的视频数上限，其余条目等待调度
+    'max_videos': 5000,        # 单个批次的视频数上限
+    'priority': 'batch',       # 默认优先级（单进程模式下可被交互任务抢占）
+    'dispatch_interval': 1.0   # 调度检查间隔（秒）
+}
+
+# 性能校准配置：在参考视频上用实际模型测试跳帧间隔、推理尺寸和线程数的组合，
+# 选出满足目标实时倍率和检测一致性的最省资源的配置，结果按模型文件签名保存，模型更新后重新校准
+CALIBRATION_CONFIG = {
+    # 参考视频（环境变量FALL_DETECTION_CALIBRATION_CLIP，最好包含跌倒），未配置时只能通过接口或命令行指定
+    'reference_clip': os.environ.get('FALL_DETECTION_CALIBRATION_CLIP'),
+    'max_seconds': 20,        # 参考视频只取开头的该时长（秒）
+    'target_rtf': 1.0,        # 目标实时倍率（视频时长 / 检测耗时）
+    'min_agreement': 0.9,     # 与最精确配置检测结果的最低一致性（按时段计算的F1）
+    'event_tolerance': 1.0,   # 比较检测结果的时间分箱（秒）
+    'grid': {
+        'skip_frames': [1, 2, 3, 5, 8],
+        'imgsz': [320, 480, 640],
+        'threads': sorted({n for n in (1, 2, 4, os.cpu_count() or 1) if n <= (os.cpu_count() or 1)})
+    },
+    'auto': True,             # 配置了参考视频时，启动时没有校准结果或模型已更新则自动校准
+    'apply': True             # 校准后直接应用推荐配置（否则只保存推荐，通过接口确认后应用）
 }
 
-# 全局任务存储
-tasks = {}
+# 进度推送配置
+PROGRESS_WATCH_INTERVAL = 1.0   # 任务不在本进程运行时，推送端检查存储变化的间隔（秒）
+EVENT_CHANNEL_RETENTION = 60    # 通道关闭后保留供迟到订阅者读取的时长（秒）
+
+# 剖析配置
+PROFILE_MAX_SECONDS = 60   # 单次剖析最长时长
+
+# 任务列表分页上限
+TASK_LIST_MAX_LIMIT = 200
+
+# 运行中任务的运行时信息（线程ID、检测器实例），不对外序列化
+active_jobs = {}
+
+# 边上传边检测中的上传会话：upload_id -> {'task_id', 'follower'}
+early_uploads = {}
+early_uploads_lock = threading.Lock()
+
+# 任务事件通道（LLM流式输出等）
+event_broker = EventBroker()
+
+# 检测工作槽位（按优先级分配，高优先级任务可暂停运行中的批量任务）；
+# 生产模式下每个检测工作进程同时只运行一个任务，并发数为工作进程数，优先级由队列的领取顺序保证
+worker_pool = WorkerPool(WORKER_CONFIG['max_workers'] if DEPLOY_MODE != 'queue' else 1)
+
+# 模型预热状态（就绪探针使用）
+readiness = {
+    'warm': False,
+    'warming': False,
+    'error': None,
+    'warm_up_time': None,
+    'started_at': time.time()
+}
+readiness_lock = threading.Lock()
+
+# 性能校准状态（needed: 没有对应当前模型的校准结果）
+calibration = {
+    'running': False,
+    'needed': False,
+    'started_at': None,
+    'progress': None,
+    'error': None
+}
+calibration_lock = threading.Lock()
+
+# 本进程最近读取或写入的性能配置文件版本（修改时间，纳秒）
+performance_config_state = {'mtime_ns': None}
 
 # 使用绝对路径
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads')
 OUTPUT_FOLDER = os.path.join(BASE_DIR, 'static', 'outputs')
+DATA_FOLDER = os.path.join(BASE_DIR, 'data')
 
 # 确保目录存在
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+os.makedirs(DATA_FOLDER, exist_ok=True)
+app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+PERFORMANCE_PROFILE_PATH = os.path.join(DATA_FOLDER, 'performance_profile.json')
+# 运行时修改的性能配置（生产模式下由Web进程写入，检测工作进程在每个任务开始时读取）
+PERFORMANCE_CONFIG_PATH = os.path.join(DATA_FOLDER, 'performance_config.json')
+
+@app.after_request
+def compress_large_responses(response):
+    """压缩较大的JSON、HTML响应（上万个事件的检测结果压缩后通常只有原来的几分之一）"""
+    if not COMPRESSION_CONFIG['enabled']:
+        return response
+    return compress_response(
+        response, request.accept_encodings,
+        min_size=COMPRESSION_CONFIG['min_size'],
+        gzip_level=COMPRESSION_CONFIG['gzip_level'],
+        brotli_quality=COMPRESSION_CONFIG['brotli_quality']
+    )
 
 print(f"📁 上传目录: {UPLOAD_FOLDER}")
 print(f"📁 输出目录: {OUTPUT_FOLDER}")
 
+# 任务存储（SQLite文件，多个工作进程共享，重启后保留历史任务）
+task_store = TaskStore(os.path.join(DATA_FOLDER, 'tasks.db'))
+
+# 断点续传上传会话（磁盘目录，多个工作进程共享）
+upload_sessions = UploadSessionStore(
+    os.path.join(DATA_FOLDER, 'upload_sessions'),
+    chunk_size=RESUMABLE_UPLOAD_CONFIG['chunk_size'],
+    max_size=app.config['MAX_CONTENT_LENGTH'],
+    ttl=RESUMABLE_UPLOAD_CONFIG['session_ttl']
+)
+
+# 批量任务（批次和条目，多个工作进程共享）
+batch_store = BatchStore(os.path.join(DATA_FOLDER, 'batches.db'))
+batch_dispatcher = {'started': False}
+batch_dispatcher_lock = threading.Lock()
+
+# 检测任务队列（生产模式下Web进程与模型工作进程之间的本地队列）
+job_queue = JobQueue(os.path.join(DATA_FOLDER, 'jobs.db'), max_attempts=WORKER_CONFIG['max_attempts'])
+
+# 事件片段截取（缓存在各任务的输出目录中，同一片段的并发请求只截取一次）
+clip_extractor = ClipExtractor(use_ffmpeg=CLIP_CONFIG['stream_copy'])
+
+# LLM响应缓存（SQLite文件，多个工作进程共享）
+llm_cache = LLMResponseCache(
+    os.path.join(DATA_FOLDER, 'llm_cache.db'),
+    ttl=LLM_CACHE_CONFIG['ttl'],
+    max_entries=LLM_CACHE_CONFIG['max_entries']
+)
+
+def create_detector(skip_frames=None, imgsz=None):
+    """按当前性能配置创建检测器（性能校准时指定跳帧间隔和推理尺寸）"""
+    if DEMO_MODE:
+        print("⚠️ 使用演示模式检测器")
+        return FallDetector(segment_seconds=PREVIEW_CONFIG['segment_seconds'])
+
+    print("✅ 使用真实AI模型检测器")
+    detector = FallDetector(
+        fall_model_path=FALL_MODEL_PATH,
+        pose_model_path=POSE_MODEL_PATH,
+        llm_model_path=LLM_MODEL_PATH,
+        use_gpu=PERFORMANCE_CONFIG['use_gpu'],
+        skip_frames=skip_frames or PERFORMANCE_CONFIG['skip_frames'],
+        llm_cache=llm_cache,
+        imgsz=imgsz or PERFORMANCE_CONFIG['imgsz'],
+        segment_seconds=PREVIEW_CONFIG['segment_seconds']
+    )
+    print(f"⚡ 性能优化: GPU={PERFORMANCE_CONFIG['use_gpu']}, 跳帧={detector.skip_frames}, 尺寸={detector.imgsz}")
+    return detector
+
+def warm_up_models(wait_llm=False, inference=True):
+    """
+    加载模型并执行一次空白帧推理，完成后标记服务就绪
+
+    Args:
+        wait_llm: 是否等待LLM模型加载完成（默认在LLM服务线程中后台加载；fork工作进程前需要等待）
+        inference: 是否执行空白帧推理；fork工作进程前只加载权重（推理会启动PyTorch的OpenMP线程池，
+                   fork后的子进程中不可用），推理预热在各工作进程中进行
+
+    Returns:
+        bool: 是否成功
+    """
+    start = time.time()
+    try:
+        print("🔥 开始预热检测模型..." if inference else "🔥 开始加载检测模型...")
+        if not DEMO_MODE and os.path.exists(LLM_MODEL_PATH):
+            get_llm_service(LLM_MODEL_PATH, n_ctx=512).preload(wait=wait_llm)
+        # 创建检测器即把模型加载进模型池，释放后留给之后的检测器使用
+        detector = create_detector()
+        try:
+            if inference:
+                detector.warm_up()
+        finally:
+            detector.release()
+        with readiness_lock:
+            readiness['warm'] = True
+            readiness['error'] = None
+            readiness['warm_up_time'] = time.time() - start
+        if not inference:
+            print(f"✅ 模型加载完成，耗时 {readiness['warm_up_time']:.1f}s")
+            return True
+        print(f"✅ 模型预热完成，耗时 {readiness['warm_up_time']:.1f}s，开始接收检测任务")
+        if DEPLOY_MODE != 'queue':
+            start_auto_calibration()
+        return True
+    except Exception as e:
+        print(f"❌ 模型预热失败: {str(e)}")
+        with readiness_lock:
+            readiness['error'] = str(e)
+        return False
+    finally:
+        with readiness_lock:
+            readiness['warming'] = False
+
+def start_warm_up():
+    """在后台线程中预热模型（已预热或正在预热时不重复启动；生产模式下模型只在工作进程中加载）"""
+    if DEPLOY_MODE == 'queue':
+        return
+    with readiness_lock:
+        if readiness['warm'] or readiness['warming']:
+            return
+        readiness['warming'] = True
+    threading.Thread(target=warm_up_models, name='model-warmup', daemon=True).start()
+
+def detection_ready():
+    """是否可以接收检测任务：单进程模式下模型已预热，生产模式下有存活的检测工作进程"""
+    if DEPLOY_MODE == 'queue':
+        return job_queue.live_workers(WORKER_CONFIG['heartbeat_interval'] * 3) > 0
+    return readiness['warm']
+
+def current_model_signature():
+    """当前检测模型文件的签名（性能校准结果只适用于校准时的模型）"""
+    if DEMO_MODE:
+        return 'demo'
+    return model_signature([FALL_MODEL_PATH, POSE_MODEL_PATH])
+
+def save_performance_config():
+    """保存当前性能配置，其他进程（生产模式下的检测工作进程、其他Web进程）下次同步时读取"""
+    save_profile(PERFORMANCE_CONFIG_PATH, PERFORMANCE_CONFIG)
+    performance_config_state['mtime_ns'] = os.stat(PERFORMANCE_CONFIG_PATH).st_mtime_ns
+
+def sync_performance_config():
+    """读取其他进程保存的性能配置（文件未变化时不读取）"""
+    try:
+        mtime_ns = os.stat(PERFORMANCE_CONFIG_PATH).st_mtime_ns
+    except OSError:
+        return
+    if mtime_ns == performance_config_state['mtime_ns']:
+        return
+    saved = load_profile(PERFORMANCE_CONFIG_PATH)
+    performance_config_state['mtime_ns'] = mtime_ns
+    if saved is None:
+        return
+    threads = PERFORMANCE_CONFIG['threads']
+    PERFORMANCE_CONFIG.update({key: value for key, value in saved.items() if key in PERFORMANCE_CONFIG})
+    if PERFORMANCE_CONFIG['threads'] != threads:
+        set_inference_threads(PERFORMANCE_CONFIG['threads'])
+    print(f"⚙️ 已同步性能配置: 跳帧={PERFORMANCE_CONFIG['skip_frames']}, 尺寸={PERFORMANCE_CONFIG['imgsz']}, "
+          f"线程={PERFORMANCE_CONFIG['threads']}")
+
+def apply_performance_profile(profile, persist=False):
+    """按校准推荐的配置设置跳帧间隔、推理尺寸和线程数（persist为True时保存，其他进程同步）"""
+    recommended = profile['recommended']
+    PERFORMANCE_CONFIG['skip_frames'] = recommended['skip_frames']
+    PERFORMANCE_CONFIG['imgsz'] = recommended['imgsz']
+    PERFORMANCE_CONFIG['threads'] = recommended['threads']
+    set_inference_threads(recommended['threads'])
+    if persist:
+        save_performance_config()
+    print(f"⚙️ 应用校准配置: 跳帧={recommended['skip_frames']}, 尺寸={recommended['imgsz']}, "
+          f"线程={recommended['threads']} (实时倍率 {recommended['rtf']:.2f}x, 一致性 {recommended['agreement']:.2f})")
+
+def load_performance_profile():
+    """
+    读取保存的校准结果，模型未变化且已确认应用时按其设置性能配置
+
+    Returns:
+        bool: 是否需要（重新）校准
+    """
+    profile = load_profile(PERFORMANCE_PROFILE_PATH)
+    if profile is None:
+        return True
+    if profile.get('models') != current_model_signature():
+        print("⚠️ 检测模型已更新，保存的性能校准结果不再适用")
+        return True
+    if profile.get('applied'):
+        apply_performance_profile(profile)
+    return False
+
+def calibrate_performance(clip_path, apply=None, target_rtf=None, min_agreement=None, grid=None,
+                          exhaustive=False):
+    """
+    在参考视频上用实际模型测试参数组合，保存校准结果（阻塞运行，等待并占用全部检测工作槽位）
+
+    Args:
+        clip_path: 参考视频路径
+        apply: 是否直接应用推荐配置，默认CALIBRATION_CONFIG['apply']
+        target_rtf, min_agreement: 目标实时倍率和最低一致性，默认取CALIBRATION_CONFIG
+        grid: 覆盖部分参数网格，如 {'threads': [1, 2]}
+        exhaustive: 测试全部组合（默认按单调性跳过不可能更优的组合）
+
+    Returns:
+        dict: 保存的校准结果
+
+    Raises:
+        CalibrationError: 参考视频无法打开
+    """
+    apply = CALIBRATION_CONFIG['apply'] if apply is None else apply
+    target_rtf = CALIBRATION_CONFIG['target_rtf'] if target_rtf is None else target_rtf
+    min_agreement = CALIBRATION_CONFIG['min_agreement'] if min_agreement is None else min_agreement
+    grid = dict(CALIBRATION_CONFIG['grid'], **(grid or {}))
+    signature = current_model_signature()
+    work_dir = tempfile.mkdtemp(prefix='calibration_', dir=DATA_FOLDER)
+    # 占用全部检测工作槽位：推理线程数是进程级设置，校准期间不能有检测任务运行（否则任务的线程数随测试的组合
+    # 变化，任务也会影响测量）；排队中的任务在校准结束后继续
+    controls = [JobControl('calibration', 'normal') for _ in range(worker_pool.max_workers)]
+    acquired = []
+
+    def run_detection(skip_frames, imgsz, threads):
+        set_inference_threads(threads)
+        detector = create_detector(skip_frames=skip_frames, imgsz=imgsz)
+        try:
+            # 预热不计入耗时（各推理尺寸首次推理较慢）
+            detector.warm_up()
+            start = time.time()
+            result = detector.detect_video(
+                video_path=clip,
+                output_path=os.path.join(work_dir, 'output.mp4'),
+                confidence=PERFORMANCE_CONFIG['detection_conf'],
+                iou_threshold=PERFORMANCE_CONFIG['iou_threshold'],
+                with_llm_analysis=False
+            )
+            elapsed = time.time() - start
+        finally:
+            detector.release()
+        return result['fall_events'], result['video_info']['duration'], elapsed
+
+    def progress(tested, grid_size, result):
+        with calibration_lock:
+            calibration['progress'] = {'tested': tested, 'grid_size': grid_size, 'last': result}
+        print(f"📏 校准 {tested}/{grid_size}: 跳帧={result['skip_frames']}, 尺寸={result['imgsz']}, "
+              f"线程={result['threads']} -> 实时倍率 {result['rtf']:.2f}x, 一致性 {result['agreement']:.2f}")
+
+    try:
+        for control in controls:
+            worker_pool.acquire(control)
+            acquired.append(control)
+        clip = prepare_clip(clip_path, CALIBRATION_CONFIG['max_seconds'], work_dir)
+        print(f"📏 开始性能校准: {clip_path}（目标实时倍率 {target_rtf}x，最低一致性 {min_agreement}）")
+        report = run_calibration(run_detection, grid, target_rtf=target_rtf, min_agreement=min_agreement,
+                                 bin_seconds=CALIBRATION_CONFIG['event_tolerance'], exhaustive=exhaustive,
+                                 progress=progress)
+    finally:
+        for control in acquired:
+            worker_pool.release(control)
+        set_inference_threads(PERFORMANCE_CONFIG['threads'])
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    profile = dict(
+        report,
+        models=signature,
+        machine=machine_info(),
+        reference_clip=os.path.abspath(clip_path),
+        target={'rtf': target_rtf, 'min_agreement': min_agreement},
+        applied=bool(apply)
+    )
+    save_profile(PERFORMANCE_PROFILE_PATH, profile)
+    recommended = profile['recommended']
+    print(f"{'✅' if profile['meets_target'] else '⚠️'} 性能校准完成: 测试 {report['tested']}/{report['grid_size']} 个组合，"
+          f"推荐 跳帧={recommended['skip_frames']}, 尺寸={recommended['imgsz']}, 线程={recommended['threads']}"
+          + ('' if profile['meets_target'] else '（没有同时满足实时和一致性要求的配置）'))
+    if apply:
+        apply_performance_profile(profile, persist=True)
+    with calibration_lock:
+        calibration['needed'] = False
+    return profile
+
+def calibration_task(clip_path, options):
+    try:
+        calibrate_performance(clip_path, **options)
+    except Exception as e:
+        print(f"❌ 性能校准失败: {str(e)}")
+        with calibration_lock:
+            calibration['error'] = str(e)
+    finally:
+        with calibration_lock:
+            calibration['running'] = False
+
+def start_calibration(clip_path, **options):
+    """
+    在后台线程中校准性能配置
+
+    Returns:
+        bool: 是否已启动（已有校准在运行时返回False）
+    """
+    with calibration_lock:
+        if calibration['running']:
+            return False
+        calibration.update(running=True, started_at=time.time(), progress=None, error=None)
+    threading.Thread(target=calibration_task, args=(clip_path, options), name='performance-calibration',
+                     daemon=True).start()
+    return True
+
+def auto_calibration_clip():
+    """需要自动校准时返回参考视频：配置了参考视频，且没有当前模型的校准结果"""
+    clip_path = CALIBRATION_CONFIG['reference_clip']
+    if DEMO_MODE or not CALIBRATION_CONFIG['auto'] or not clip_path or not calibration['needed']:
+        return None
+    return clip_path
+
+def start_auto_calibration():
+    clip_path = auto_calibration_clip()
+    if clip_path:
+        print("📏 没有当前模型的性能校准结果，开始自动校准")
+        start_calibration(clip_path)
+
+# 启动时应用保存的校准结果，之后通过接口修改（或校准后应用）的配置优先
+# （生产模式下由fork前的监督进程读取，工作进程继承，并在每个任务开始时同步）
+calibration['needed'] = load_performance_profile()
+sync_performance_config()
+
+def release_channel_later(key):
+    """通道关闭后保留一段时间供迟到的订阅者读取，之后释放"""
+    cleanup = threading.Timer(EVENT_CHANNEL_RETENTION, event_broker.discard, args=(key,))
+    cleanup.daemon = True
+    cleanup.start()
+
+def publish_task_event(task_id, event, data):
+    """向任务的进度通道发布事件（通道不存在时忽略）"""
+    channel = event_broker.get(f"progress:{task_id}")
+    if channel is not None:
+        channel.publish(event, data)
+
+def progress_snapshot(task):
+    """进度事件的数据（不含检测结果）"""
+    return {
+        'status': task['status'],
+        'stage': task.get('stage'),
+        'progress': task['progress'],
+        'message': task['message'],
+        'preview_url': task.get('preview_url')
+    }
+
+def preview_dir_for(task_id):
+    """任务的HLS预览分段目录"""
+    return os.path.join(OUTPUT_FOLDER, f"hls_{task_id}")
+
+def thumbnail_dir_for(task_id):
+    """任务的事件缩略图和雪碧图目录"""
+    return os.path.join(OUTPUT_FOLDER, f"thumbs_{task_id}")
+
+def clip_dir_for(task_id):
+    return os.path.join(OUTPUT_FOLDER, f"clips_{task_id}")
+
+def checkpoint_dir_for(task_id):
+    """任务的检测检查点目录"""
+    return os.path.join(DATA_FOLDER, 'checkpoints', task_id)
+
+def checkpoint_for(task):
+    """长视频检测的检查点存储（未启用、边上传边检测或视频较短时返回None）"""
+    if not CHECKPOINT_CONFIG['enabled'] or task.get('early_detection'):
+        return None
+    duration = (task.get('video_info') or {}).get('duration')
+    if duration is not None and duration < CHECKPOINT_CONFIG['min_duration']:
+        return None
+    return CheckpointStore(checkpoint_dir_for(task['id']), interval=CHECKPOINT_CONFIG['interval'],
+                           keep=CHECKPOINT_CONFIG['keep'])
+
+def discard_partial_outputs(task_id):
+    """删除被取消任务已写出的部分输出（视频、预览分段和缩略图）"""
+    output_path = os.path.join(OUTPUT_FOLDER, f"result_{task_id}.mp4")
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    for directory in (preview_dir_for(task_id), thumbnail_dir_for(task_id), checkpoint_dir_for(task_id)):
+        shutil.rmtree(directory, ignore_errors=True)
+
+def remove_preview_later(task_id):
+    """任务结束后保留预览分段一段时间（正在观看的播放器可以播完），之后删除"""
+    cleanup = threading.Timer(PREVIEW_CONFIG['retention'], shutil.rmtree,
+                              args=(preview_dir_for(task_id),), kwargs={'ignore_errors': True})
+    cleanup.daemon = True
+    cleanup.start()
+
+def terminal_event(task):
+    """已结束任务对应的终止事件，未结束时返回None"""
+    if task['status'] == TaskStatus.COMPLETED:
+        return 'completed', {'status': task['status'], 'llm_status': task.get('llm_status')}
+    if task['status'] == TaskStatus.ERROR:
+        return 'failed', {'status': task['status'], 'message': task['message'], 'error': task.get('error')}
+    if task['status'] == TaskStatus.CANCELLED:
+        return 'cancelled', {'status': task['status'], 'message': task['message']}
+    return None
+
+def watch_task_store(task_id):
+    """任务不在本进程运行时，定期读取存储并只在变化时推送进度"""
+    last = None
+    last_sent = time.time()
+    while True:
+        task = task_store.get(task_id)
+        if task is None:
+            return
+        final = terminal_event(task)
+        if final is not None:
+            yield format_sse(*final)
+            return
+        snapshot = progress_snapshot(task)
+        if snapshot != last:
+            last = snapshot
+            last_sent = time.time()
+            yield format_sse('progress', snapshot)
+        elif time.time() - last_sent >= 15:
+            last_sent = time.time()
+            yield ': keepalive\n\n'
+        time.sleep(PROGRESS_WATCH_INTERVAL)
+
+def watch_llm_status(task_id):
+    """LLM分析不在本进程生成时，定期读取存储，分析结束后推送done事件"""
+    last_sent = time.time()
+    while True:
+        task = task_store.get(task_id)
+        if task is None:
+            return
+        if task.get('llm_status') != LLMStatus.PENDING:
+            llm_analysis = (task_store.get_result(task_id) or {}).get('llm_analysis')
+            yield format_sse('done', {
+                'llm_status': task.get('llm_status'),
+                'llm_analysis': llm_analysis,
+                'html': format_llm_text(llm_analysis)
+            })
+            return
+        if time.time() - last_sent >= 15:
+            last_sent = time.time()
+            yield ': keepalive\n\n'
+        time.sleep(PROGRESS_WATCH_INTERVAL)
+
 @app.template_filter('format_llm_text')
 def format_llm_text(text):
     """格式化LLM分析文本为HTML"""
@@ -87,6 +729,197 @@ class TaskStatus:
     PROCESSING = "processing"
     COMPLETED = "completed"
     ERROR = "error"
+    CANCELLED = "cancelled"
+
+class LLMStatus:
+    PENDING = "pending"        # 检测已完成，分析生成中
+    COMPLETED = "completed"    # LLM生成或命中缓存
+    FALLBACK = "fallback"      # 超时或失败，使用备用分析
+    SKIPPED = "skipped"        # 无跌倒事件或LLM不可用
+
+class TaskStage:
+    QUEUED = "queued"          # 等待空闲的检测工作线程
+    DETECTING = "detecting"    # 逐帧检测中
+    PAUSED = "paused"          # 被高优先级任务抢占，等待重新获得工作线程
+    ANALYZING = "analyzing"    # 统计分析检测结果
+    DONE = "done"              # 检测阶段结束（LLM分析可能仍在进行）
+
+
+def request_tenant():
+    """当前请求的租户（请求头缺失或格式不合法时为default）"""
+    tenant = request.headers.get(STORAGE_CONFIG['tenant_header'], '').strip()
+    return tenant if TENANT_RE.match(tenant) else 'default'
+
+def storage_can_evict(task_id, area):
+    """检测进行中、等待检测或LLM分析仍需读取原始视频的任务不淘汰"""
+    task = task_store.get(task_id)
+    if task is None:
+        return True
+    if task['status'] in (TaskStatus.PENDING, TaskStatus.PROCESSING):
+        return False
+    return not (area == 'uploads' and task.get('llm_status') == LLMStatus.PENDING)
+
+def storage_on_evict(task_id, area, size):
+    """文件被淘汰后在任务上记录，下载等接口据此返回410"""
+    field = 'upload_evicted_at' if area == 'uploads' else 'output_evicted_at'
+    task_store.update(task_id, **{field: datetime.now().isoformat()})
+
+# 上传和输出文件的配额管理（SQLite文件，多个工作进程共享）
+storage_manager = StorageManager(
+    os.path.join(DATA_FOLDER, 'storage.db'),
+    quotas=STORAGE_CONFIG['quotas'],
+    tenant_quota=STORAGE_CONFIG['tenant_quota'],
+    tenant_quotas=STORAGE_CONFIG['tenant_quotas'],
+    min_idle=STORAGE_CONFIG['min_idle'],
+    touch_interval=STORAGE_CONFIG['touch_interval'],
+    can_evict=storage_can_evict,
+    on_evict=storage_on_evict
+)
+
+def output_paths_for(task_id, output_path):
+    """任务在输出区域占用的文件（缩略图体积很小，随任务记录保留，不参与淘汰）"""
+    return [output_path, clip_dir_for(task_id), preview_dir_for(task_id)]
+
+def evicted_response(task):
+    """输出视频已被存储配额淘汰时返回410"""
+    if task.get('output_evicted_at'):
+        return jsonify({
+            'error': '输出视频已因存储配额被清理，检测结果和事件仍可查看',
+            'evicted_at': task['output_evicted_at']
+        }), 410
+    return jsonify({'error': '输出视频文件不存在'}), 404
+
+def backfill_storage():
+    """登记启用配额管理前已有任务的文件（只在启动时执行一次）"""
+    offset, registered = 0, 0
+    while True:
+        tasks, _ = task_store.list(limit=TASK_LIST_MAX_LIMIT, offset=offset)
+        if not tasks:
+            break
+        offset += len(tasks)
+        for item in tasks:
+            task = task_store.get(item['id'], include_result=True)
+            tenant = task.get('tenant', 'default')
+            # 批量任务的视频在原位置读取，不属于上传目录，不参与淘汰
+            if task.get('filepath') and not task.get('batch_id') and os.path.exists(task['filepath']) \
+                    and not storage_manager.is_registered(task['id'], 'uploads'):
+                storage_manager.register(task['id'], 'uploads', tenant, [task['filepath']],
+                                         last_access=os.path.getmtime(task['filepath']))
+                registered += 1
+            output_path = (task.get('result') or {}).get('output_video_path')
+            if output_path and os.path.exists(output_path) \
+                    and not storage_manager.is_registered(task['id'], 'outputs'):
+                storage_manager.register(task['id'], 'outputs', tenant, output_paths_for(task['id'], output_path),
+                                         last_access=os.path.getmtime(output_path))
+                registered += 1
+    if registered:
+        print(f"📦 已登记 {registered} 个既有任务文件到存储配额管理")
+
+def batch_dir_for(batch_id):
+    """批次报告目录"""
+    return os.path.join(OUTPUT_FOLDER, f"batch_{batch_id}")
+
+def dispatch_batches():
+    """调度一轮批量任务：回收已结束的条目，按全局并发上限开始新条目，为全部结束的批次生成报告"""
+    started = batch_store.started_task_ids()
+    if started:
+        tasks = task_store.get_many(started)
+        # 任务记录已被删除的条目也视为结束
+        batch_store.mark_done([task_id for task_id in started if task_id not in tasks or tasks[task_id]['status']
+                               in (TaskStatus.COMPLETED, TaskStatus.ERROR, TaskStatus.CANCELLED)])
+    
+    if detection_ready():
+        for batch_id, task_id, options in batch_store.admit(BATCH_CONFIG['max_concurrency']):
+            if not start_task(task_id, options['confidence'], options['iou_threshold'], options['priority']):
+                # 已被单独取消
+                batch_store.mark_done([task_id])
+    
+    for batch_id in batch_store.claim_finished():
+        try:
+            write_batch_report(batch_id)
+        except Exception as e:
+            print(f"❌ 批次 {batch_id} 报告生成失败: {str(e)}")
+
+def batch_dispatcher_loop():
+    while True:
+        try:
+            dispatch_batches()
+        except Exception as e:
+            print(f"❌ 批量任务调度错误: {str(e)}")
+        time.sleep(BATCH_CONFIG['dispatch_interval'])
+
+def start_batch_dispatcher():
+    """启动批量任务调度线程（每个进程一个，多个进程通过批次存储的事务协调）"""
+    with batch_dispatcher_lock:
+        if batch_dispatcher['started']:
+            return
+        batch_dispatcher['started'] = True
+    threading.Thread(target=batch_dispatcher_loop, name='batch-dispatcher', daemon=True).start()
+
+def write_batch_report(batch_id):
+    """
+    生成批次的汇总报告：report.json（每个视频的结果和全部跌倒事件）和 events.csv（每行一个事件）
+    """
+    batch = batch_store.get(batch_id)
+    tasks = task_store.get_many([item['task_id'] for item in batch['items'] if item['task_id']])
+    videos, events = [], []
+    counts = {status: 0 for status in ('skipped', TaskStatus.COMPLETED, TaskStatus.ERROR, TaskStatus.CANCELLED)}
+    for item in batch['items']:
+        task = tasks.get(item['task_id']) if item['task_id'] else None
+        status = task['status'] if task else 'skipped'
+        counts[status] = counts.get(status, 0) + 1
+        video = {
+            'path': item['path'],
+            'task_id': item['task_id'],
+            'status': status,
+            'error': item['error'] or (task or {}).get('error'),
+            'fall_events': 0
+        }
+        if status == TaskStatus.COMPLETED:
+            result = task_store.get_result(item['task_id']) or {}
+            detection = result.get('detection_data') or {}
+            fall_events = event_rows(detection)
+            video.update({
+                'duration': (detection.get('video_info') or {}).get('duration'),
+                'total_frames': (detection.get('video_info') or {}).get('total_frames'),
+                'processing_time': detection.get('processing_time'),
+                'fall_events': len(fall_events)
+            })
+            for index, event in enumerate(fall_events, 1):
+                events.append({
+                    'path': item['path'],
+                    'task_id': item['task_id'],
+                    'event_id': index,
+                    'timestamp': round(event.get('timestamp', 0), 3),
+                    'frame': event.get('frame'),
+                    'type': event.get('type'),
+                    'confidence': round(event.get('confidence', 0), 4)
+                })
+        videos.append(video)
+    
+    summary = {
+        'batch_id': batch_id,
+        'name': batch['name'],
+        'status': batch['status'],
+        'videos': len(videos),
+        'counts': counts,
+        'fall_events': len(events),
+        'videos_with_falls': sum(1 for video in videos if video['fall_events']),
+        'generated_at': datetime.now().isoformat()
+    }
+    report_dir = batch_dir_for(batch_id)
+    os.makedirs(report_dir, exist_ok=True)
+    # 先写临时文件再替换，读取方不会读到写了一半的报告
+    with open(os.path.join(report_dir, 'report.json.tmp'), 'w', encoding='utf-8') as f:
+        json.dump(dict(summary, videos=videos, events=events), f, ensure_ascii=False, indent=2)
+    with open(os.path.join(report_dir, 'events.csv.tmp'), 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['path', 'task_id', 'event_id', 'timestamp', 'frame', 'type', 'confidence'])
+        writer.writeheader()
+        writer.writerows(events)
+    for name in ('report.json', 'events.csv'):
+        os.replace(os.path.join(report_dir, name + '.tmp'), os.path.join(report_dir, name))
+    batch_store.set_report(batch_id, summary)
+    print(f"📑 批次 {batch_id} 已结束: {len(videos)} 个视频, {len(events)} 个跌倒事件")
 
 @app.route('/')
 def index():
@@ -114,8 +947,6 @@ def upload_video():
             return jsonify({'error': '没有选择文件'}), 400
         
         print(f"📝 上传文件: {file.filename}")
-        print(f"📏 文件大小: {len(file.read())} bytes")
-        file.seek(0)  # 重置文件指针
         
         if not allowed_file(file.filename):
             print(f"❌ 不支持的文件格式: {file.filename}")
@@ -131,37 +962,14 @@ def upload_video():
         # 确保目录存在
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
         
-        # 保存文件
-        file.save(filepath)
-        
-        # 验证文件是否保存成功
-        if not os.path.exists(filepath):
-            print(f"❌ 文件保存失败: {filepath}")
-            return jsonify({'error': '文件保存失败'}), 500
-        
-        file_size = os.path.getsize(filepath)
-        print(f"✅ 文件保存成功，大小: {file_size} bytes")
-        
-        # 初始化任务状态
-        tasks[task_id] = {
-            'id': task_id,
-            'status': TaskStatus.PENDING,
-            'filename': filename,
-            'filepath': filepath,
-            'upload_time': datetime.now().isoformat(),
-            'progress': 0,
-            'message': '视频上传成功，等待处理...',
-            'result': None
-        }
-        
-        print(f"✅ 任务创建成功: {task_id}")
+        # 保存文件（上传内容已在接收时写入磁盘并计算哈希，这里只需移动）
+        file_info = save_upload(file, filepath)
+        print(f"✅ 文件保存成功，大小: {file_info['size']} bytes, SHA-256: {file_info['sha256'][:16]}...")
         
-        return jsonify({
-            'success': True,
-            'task_id': task_id,
-            'message': '视频上传成功',
-            'filename': filename
-        })
+        try:
+            return jsonify(register_uploaded_video(task_id, filename, filepath, file_info))
+        except UploadRejected as e:
+            return jsonify({'error': f'视频校验失败: {str(e)}'}), 400
         
     except Exception as e:
         print(f"❌ 上传错误: {str(e)}")
@@ -169,88 +977,569 @@ def upload_video():
         traceback.print_exc()
         return jsonify({'error': f'上传失败: {str(e)}'}), 500
 
+def validate_uploaded_video(filepath, file_info):
+    """
+    校验已保存的上传文件，返回视频信息
+
+    无法识别或无法解码的文件会被删除并抛出UploadRejected
+    """
+    try:
+        if file_info['container'] is None:
+            raise UploadRejected('无法识别的视频容器格式')
+        video_info = probe_video(filepath)
+    except UploadRejected as e:
+        os.remove(filepath)
+        print(f"❌ 视频校验失败: {str(e)}")
+        raise
+    print(f"🎞️ 视频信息: {file_info['container']}/{video_info['codec']}, "
+          f"{video_info['width']}x{video_info['height']}, {video_info['fps']:.1f}fps")
+    return video_info
+
+def register_uploaded_video(task_id, filename, filepath, file_info):
+    """
+    校验已保存的上传文件并创建任务
+
+    无法识别或无法解码的文件会被删除并抛出UploadRejected，不会进入检测队列
+    """
+    video_info = validate_uploaded_video(filepath, file_info)
+    tenant = request_tenant()
+    
+    # 初始化任务状态
+    task_store.create({
+        'id': task_id,
+        'status': TaskStatus.PENDING,
+        'filename': filename,
+        'filepath': filepath,
+        'upload_time': datetime.now().isoformat(),
+        'progress': 0,
+        'message': '视频上传成功，等待处理...',
+        'file_size': file_info['size'],
+        'sha256': file_info['sha256'],
+        'container': file_info['container'],
+        'video_info': video_info,
+        'tenant': tenant
+    })
+    storage_manager.register(task_id, 'uploads', tenant, [filepath])
+    
+    print(f"✅ 任务创建成功: {task_id}")
+    
+    return {
+        'success': True,
+        'task_id': task_id,
+        'message': '视频上传成功',
+        'filename': filename,
+        'file_size': file_info['size'],
+        'sha256': file_info['sha256'],
+        'video_info': video_info
+    }
+
+@app.route('/uploads', methods=['POST'])
+def create_upload_session():
+    """创建断点续传上传会话
+
+    请求体(JSON): filename, size
+    返回: upload_id、chunk_size、total_chunks、已接收分块received和连续偏移offset
+    """
+    params = request.get_json(silent=True) or {}
+    filename = params.get('filename', '')
+    if not filename or not allowed_file(filename):
+        return jsonify({'error': '不支持的视频格式，请上传mp4、avi或mov文件'}), 400
+    try:
+        session = upload_sessions.create(secure_filename(filename) or 'video.mp4', int(params.get('size', 0)))
+    except (TypeError, ValueError):
+        return jsonify({'error': '文件大小无效'}), 400
+    except UploadSessionError as e:
+        return jsonify({'error': str(e)}), e.status
+    print(f"📤 创建上传会话 {session['upload_id']}: {filename}, {session['size']} bytes, "
+          f"{session['total_chunks']} 个分块")
+    return jsonify(session), 201
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def get_upload_session(upload_id):
+    """查询上传会话：已接收的分块和连续接收的字节偏移量"""
+    try:
+        return jsonify(upload_sessions.status(upload_id))
+    except UploadSessionError as e:
+        return jsonify({'error': str(e)}), e.status
+
+@app.route('/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def put_upload_chunk(upload_id, index):
+    """上传一个分块（请求体为原始字节，可带X-Chunk-SHA256校验头，可并行、可重试）"""
+    try:
+        chunk = upload_sessions.write_chunk(
+            upload_id, index, request.stream,
+            expected_sha256=request.headers.get('X-Chunk-SHA256')
+        )
+    except UploadSessionError as e:
+        return jsonify({'error': str(e)}), e.status
+    return jsonify(dict(chunk, success=True))
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload_session(upload_id):
+    """合并分块、校验完整文件（可选sha256）并创建检测任务，返回与/upload相同的结果"""
+    params = request.get_json(silent=True) or {}
+    early = early_uploads.get(upload_id)
+    if early is not None:
+        return complete_early_upload(upload_id, early, params.get('sha256'))
+    
+    task_id = str(uuid.uuid4())
+    try:
+        session = upload_sessions.status(upload_id)
+        filepath = os.path.join(UPLOAD_FOLDER, f"{task_id}_{session['filename']}")
+        file_info = upload_sessions.assemble(upload_id, filepath, expected_sha256=params.get('sha256'))
+    except UploadSessionError as e:
+        return jsonify({'error': str(e)}), e.status
+    print(f"✅ 分块上传完成: {file_info['filename']}, {file_info['size']} bytes, "
+          f"SHA-256: {file_info['sha256'][:16]}...")
+    
+    try:
+        return jsonify(register_uploaded_video(task_id, file_info['filename'], filepath, file_info))
+    except UploadRejected as e:
+        return jsonify({'error': f'视频校验失败: {str(e)}'}), 400
+
+def complete_early_upload(upload_id, early, expected_sha256):
+    """合并边上传边检测的会话：文件保存到任务的输入路径，检测线程随后读取完整文件"""
+    task = task_store.get(early['task_id'])
+    follower = early['follower']
+    try:
+        file_info = upload_sessions.assemble(upload_id, task['filepath'], expected_sha256=expected_sha256)
+    except UploadSessionError as e:
+        if e.status == 422:
+            # 已检测的数据与客户端的文件不一致，检测结果不可信
+            follower.abort(str(e))
+        return jsonify({'error': str(e)}), e.status
+    print(f"✅ 分块上传完成（检测进行中）: {file_info['filename']}, {file_info['size']} bytes")
+    
+    try:
+        video_info = validate_uploaded_video(task['filepath'], file_info)
+    except UploadRejected as e:
+        follower.abort(f'视频校验失败: {str(e)}')
+        return jsonify({'error': f'视频校验失败: {str(e)}'}), 400
+    
+    task_store.update(
+        task['id'],
+        file_size=file_info['size'],
+        sha256=file_info['sha256'],
+        container=file_info['container'],
+        video_info=video_info
+    )
+    storage_manager.register(task['id'], 'uploads', task.get('tenant', 'default'), [task['filepath']])
+    follower.finish()
+    
+    return jsonify({
+        'success': True,
+        'task_id': task['id'],
+        'message': '视频上传成功，检测已在进行中',
+        'filename': file_info['filename'],
+        'file_size': file_info['size'],
+        'sha256': file_info['sha256'],
+        'video_info': video_info,
+        'early_detection': True
+    })
+
+@app.route('/uploads/<upload_id>', methods=['DELETE'])
+def delete_upload_session(upload_id):
+    """放弃上传会话"""
+    try:
+        upload_sessions.status(upload_id)
+    except UploadSessionError as e:
+        return jsonify({'error': str(e)}), e.status
+    early = early_uploads.get(upload_id)
+    if early is not None:
+        early['follower'].abort('上传已取消')
+    upload_sessions.discard(upload_id)
+    return jsonify({'success': True})
+
+@app.route('/uploads/<upload_id>/detect', methods=['POST'])
+def start_early_detection(upload_id):
+    """边上传边检测：为上传中的会话创建任务并立即开始检测已接收的部分
+
+    请求体(JSON): confidence, iou_threshold, priority（同/detect）
+    返回: task_id；客户端继续上传分块并调用/uploads/<id>/complete，进度通过/events/<task_id>获取
+    分块乱序到达时只检测从文件开头起连续接收的部分；容器索引在文件末尾的视频（如普通MP4）
+    要等上传完成才能开始解码
+    """
+    if not EARLY_DETECTION_CONFIG['enabled']:
+        return jsonify({'error': '边上传边检测未启用'}), 400
+    if DEPLOY_MODE == 'queue':
+        # 检测线程需要与接收分块的Web进程共享上传跟随器，工作进程中无法运行
+        return jsonify({'error': '生产模式下不支持边上传边检测，请上传完成后调用/detect'}), 400
+    try:
+        session = upload_sessions.status(upload_id)
+    except UploadSessionError as e:
+        return jsonify({'error': str(e)}), e.status
+    
+    if not detection_ready():
+        return warming_response()
+    
+    params = request.get_json(silent=True) or {}
+    confidence = params.get('confidence', 0.5)
+    iou_threshold = params.get('iou_threshold', 0.4)
+    priority = params.get('priority', 'normal')
+    if priority not in PRIORITIES:
+        return jsonify({'error': f"priority必须是 {', '.join(PRIORITIES)} 之一"}), 400
+    
+    task_id = str(uuid.uuid4())
+    filepath = os.path.join(UPLOAD_FOLDER, f"{task_id}_{session['filename']}")
+    with early_uploads_lock:
+        if upload_id in early_uploads:
+            return jsonify({'error': '该上传已在检测中', 'task_id': early_uploads[upload_id]['task_id']}), 409
+        follower = UploadFollower(upload_sessions, upload_id, filepath,
+                                  poll_interval=EARLY_DETECTION_CONFIG['poll_interval'],
+                                  idle_timeout=EARLY_DETECTION_CONFIG['idle_timeout'])
+        early_uploads[upload_id] = {'task_id': task_id, 'follower': follower}
+    
+    now = datetime.now().isoformat()
+    task_store.create({
+        'id': task_id,
+        'status': TaskStatus.PROCESSING,
+        'filename': session['filename'],
+        'filepath': filepath,
+        'upload_time': now,
+        'start_time': now,
+        'progress': 0,
+        'message': '边上传边检测，等待视频数据...',
+        'file_size': session['size'],
+        'upload_id': upload_id,
+        'early_detection': True,
+        'tenant': request_tenant(),
+        'priority': priority
+    })
+    print(f"🚀 边上传边检测: 会话 {upload_id} -> 任务 {task_id}")
+    
+    event_broker.channel(f"progress:{task_id}")
+    threading.Thread(
+        target=run_detection_task,
+        args=(task_id, confidence, iou_threshold, follower, priority),
+        daemon=True
+    ).start()
+    
+    return jsonify({
+        'success': True,
+        'message': '检测任务已启动，将跟随上传进度处理',
+        'task_id': task_id
+    })
+
+def warming_response():
+    """模型预热完成前拒绝检测请求（503，附带建议的重试间隔）"""
+    start_warm_up()
+    response = jsonify({
+        'error': '模型预热中，请稍后重试',
+        'warming': True,
+        'warm_up_error': readiness['error']
+    })
+    response.headers['Retry-After'] = '3'
+    return response, 503
+
+def start_task(task_id, confidence, iou_threshold, priority='normal'):
+    """
+    开始检测待处理的任务：单进程模式下启动检测线程，生产模式下放入队列由模型工作进程领取
+
+    Returns:
+        bool: 任务不是pending（已开始、已结束或已取消）时返回False
+    """
+    # 仅从pending原子转换，避免同一任务被重复启动
+    started = task_store.update(
+        task_id, expected_status=TaskStatus.PENDING,
+        status=TaskStatus.PROCESSING,
+        progress=0,
+        message='开始检测处理...',
+        start_time=datetime.now().isoformat(),
+        priority=priority
+    )
+    if not started:
+        return False
+    
+    if DEPLOY_MODE == 'queue':
+        # 进度通过存储推送给各Web进程
+        task_store.update(task_id, stage=TaskStage.QUEUED, message='等待空闲的检测工作进程...')
+        job_queue.enqueue(task_id, priority, confidence=confidence, iou_threshold=iou_threshold)
+        return True
+    
+    # 进度通道需在检测线程启动前创建，订阅方据此接收推送
+    event_broker.channel(f"progress:{task_id}")
+    threading.Thread(
+        target=run_detection_task,
+        args=(task_id, confidence, iou_threshold, None, priority),
+        daemon=True
+    ).start()
+    return True
+
 @app.route('/detect/<task_id>', methods=['POST'])
 def start_detection(task_id):
     """开始检测任务"""
     try:
-        if task_id not in tasks:
+        task = task_store.get(task_id)
+        if task is None:
             return jsonify({'error': '任务不存在'}), 404
         
-        task = tasks[task_id]
         if task['status'] != TaskStatus.PENDING:
             return jsonify({'error': '任务已在处理中或已完成'}), 400
         
+        if task.get('upload_evicted_at'):
+            return jsonify({'error': '原始视频已因存储配额被清理，请重新上传'}), 410
+        
+        # 模型预热完成前（生产模式下没有存活的工作进程时）不接收新任务
+        if not detection_ready():
+            return warming_response()
+        
         # 获取检测参数
         params = request.get_json() or {}
         confidence = params.get('confidence', 0.5)
         iou_threshold = params.get('iou_threshold', 0.4)
+        priority = params.get('priority', 'normal')
+        if priority not in PRIORITIES:
+            return jsonify({'error': f"priority必须是 {', '.join(PRIORITIES)} 之一"}), 400
         
-        # 更新任务状态
-        task['status'] = TaskStatus.PROCESSING
-        task['progress'] = 0
-        task['message'] = '开始检测处理...'
-        task['start_time'] = datetime.now().isoformat()
-        
-        # 在后台线程中运行检测
-        detection_thread = threading.Thread(
-            target=run_detection_task,
-            args=(task_id, confidence, iou_threshold),
-            daemon=True
-        )
-        detection_thread.start()
+        if not start_task(task_id, confidence, iou_threshold, priority):
+            return jsonify({'error': '任务已在处理中或已完成'}), 400
         
         return jsonify({
             'success': True,
-            'message': '检测任务已启动',
+            'message': '检测任务已加入队列' if DEPLOY_MODE == 'queue' else '检测任务已启动',
             'task_id': task_id
         })
         
     except Exception as e:
         return jsonify({'error': f'启动检测失败: {str(e)}'}), 500
 
+@app.route('/cancel/<task_id>', methods=['POST'])
+def cancel_detection(task_id):
+    """取消检测任务：未开始的任务直接取消，运行中（含排队、暂停）的任务在下一帧停止并释放视频读写"""
+    task = task_store.get(task_id)
+    if task is None:
+        return jsonify({'error': '任务不存在'}), 404
+    
+    reason = '任务已被用户取消'
+    status = request_cancel(task_id, reason)
+    if status is None:
+        return jsonify({'error': '任务已结束，无法取消', 'status': task_store.get(task_id)['status']}), 400
+    if status == TaskStatus.CANCELLED:
+        return jsonify({'success': True, 'status': TaskStatus.CANCELLED, 'message': reason})
+    return jsonify({'success': True, 'status': TaskStatus.PROCESSING, 'message': '正在取消，将在当前帧处理完后停止'}), 202
+
+def request_cancel(task_id, reason):
+    """
+    取消任务
+
+    Returns:
+        str: TaskStatus.CANCELLED（已直接取消）、TaskStatus.PROCESSING（检测线程将在下一帧停止），
+             任务已结束时返回None
+    """
+    task = task_store.get(task_id)
+    if task['status'] == TaskStatus.PENDING:
+        if task_store.update(task_id, expected_status=TaskStatus.PENDING, status=TaskStatus.CANCELLED,
+                             stage=TaskStage.DONE, message=reason, end_time=datetime.now().isoformat()):
+            return TaskStatus.CANCELLED
+        task = task_store.get(task_id)
+    
+    if task['status'] != TaskStatus.PROCESSING:
+        return None
+    
+    if job_queue.discard(task_id):
+        # 还在队列中未被工作进程领取
+        mark_cancelled(task_id, reason)
+        return TaskStatus.CANCELLED
+    
+    # 写入存储供其他工作进程中的检测线程读取，本进程中的任务立即通知
+    task_store.update(task_id, cancel_requested=reason)
+    job = active_jobs.get(task_id)
+    if job is not None:
+        job['control'].cancel(reason)
+    with early_uploads_lock:
+        followers = [early['follower'] for early in early_uploads.values() if early['task_id'] == task_id]
+    for follower in followers:
+        # 正在等待上传数据的检测线程不会经过检查点，中止跟随器使其立即退出
+        follower.abort(reason)
+    print(f"🛑 已请求取消任务 {task_id}")
+    return TaskStatus.PROCESSING
+
 @app.route('/status/<task_id>')
 def get_task_status(task_id):
     """获取任务状态"""
-    if task_id not in tasks:
+    task = task_store.get(task_id)
+    if task is None:
         return jsonify({'error': '任务不存在'}), 404
     
-    task = tasks[task_id]
-    return jsonify({
+    response = {
         'task_id': task_id,
         'status': task['status'],
+        'stage': task.get('stage'),
         'progress': task['progress'],
         'message': task['message'],
-        'result': task.get('result')
-    })
+        'llm_status': task.get('llm_status'),
+        'preview_url': task.get('preview_url')
+    }
+    # 检测结果体积较大，只在显式请求（?include=result）且任务完成后返回
+    if 'result' not in request.args.get('include', '').split(','):
+        return jsonify(response)
+    if task['status'] != TaskStatus.COMPLETED:
+        response['result'] = None
+        return jsonify(response)
+    
+    if request.args.get('events') == 'rows':
+        # 按旧格式展开为事件字典列表
+        result = task_store.get_result(task_id)
+        if result and result.get('detection_data'):
+            result['detection_data'] = expand_detection_result(result['detection_data'])
+        response['result'] = result
+        return jsonify(response)
+    
+    # 已保存的结果JSON原样拼入响应，不必解析后再序列化
+    result_json = task_store.get_result_json(task_id)
+    body = json.dumps(response, ensure_ascii=False)
+    body = f'{body[:-1]}, "result": {result_json or "null"}}}'
+    return app.response_class(body, mimetype='application/json')
+
+@app.route('/events/<task_id>')
+def stream_task_events(task_id):
+    """以Server-Sent Events推送任务进度，只在进度、阶段变化和任务结束时发送
+
+    事件: progress（status/stage/progress/message）、completed（含llm_status）、failed、cancelled
+    """
+    # 先记录通道位置再读取状态，两者之间发布的事件会在快照之后补发
+    channel = event_broker.get(f"progress:{task_id}")
+    after_seq = channel.last_seq if channel is not None else 0
+    task = task_store.get(task_id)
+    if task is None:
+        return jsonify({'error': '任务不存在'}), 404
+    
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    final = terminal_event(task)
+    if final is not None:
+        body = format_sse('progress', progress_snapshot(task)) + format_sse(*final)
+        return Response(body, mimetype='text/event-stream', headers=headers)
+    
+    last_event_id = parse_last_event_id(request.headers.get('Last-Event-ID'))
+    
+    def generate():
+        if channel is None:
+            # 任务在其他进程中运行（或尚未开始），从存储中观察变化
+            yield from watch_task_store(task_id)
+            return
+        if last_event_id:
+            # 断线重连：从上次收到的事件继续
+            yield from stream_channel(channel, last_event_id)
+            return
+        yield format_sse('progress', progress_snapshot(task))
+        yield from stream_channel(channel, after_seq)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
 
 @app.route('/result/<task_id>')
 def get_result(task_id):
     """获取检测结果详情"""
-    if task_id not in tasks:
+    task = task_store.get(task_id, include_result=True)
+    if task is None:
         return jsonify({'error': '任务不存在'}), 404
     
-    task = tasks[task_id]
     if task['status'] != TaskStatus.COMPLETED:
         return jsonify({'error': '任务尚未完成'}), 400
     
+    # 事件由页面按需从/api/events读取，不嵌入页面
     return render_template('result.html', 
                          task_id=task_id, 
                          result=task['result'],
-                         task=task)
+                         task=task,
+                         event_total=event_count(task['result'].get('detection_data')))
+
+@app.route('/api/events/<task_id>')
+def list_events(task_id):
+    """
+    获取任务的跌倒事件
+
+    查询参数:
+        format: columnar（默认，每个字段一个数组）或 rows（事件字典列表）
+        offset / limit: 分页（columnar默认返回全部事件，rows每页最多EVENT_PAGE_MAX_LIMIT个）
+    """
+    task = task_store.get(task_id)
+    if task is None:
+        return jsonify({'error': '任务不存在'}), 404
+    if task['status'] != TaskStatus.COMPLETED:
+        return jsonify({'error': '任务尚未完成'}), 400
+    
+    event_format = request.args.get('format', 'columnar')
+    if event_format not in ('columnar', 'rows'):
+        return jsonify({'error': 'format必须是columnar或rows'}), 400
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = request.args.get('limit')
+        if limit is not None:
+            limit = max(1, min(int(limit), EVENT_PAGE_MAX_LIMIT))
+        elif event_format == 'rows':
+            limit = EVENT_PAGE_MAX_LIMIT
+    except ValueError as e:
+        return jsonify({'error': f'参数错误: {str(e)}'}), 400
+    
+    table = event_table((task_store.get_result(task_id) or {}).get('detection_data'))
+    page = slice_rows(table, offset, limit)
+    return jsonify({
+        'success': True,
+        'task_id': task_id,
+        'total': table['count'],
+        'offset': offset,
+        'has_more': offset + page['count'] < table['count'],
+        'events': page if event_format == 'columnar' else expand_rows(page)
+    })
+
+@app.route('/llm_analysis/<task_id>')
+def get_llm_analysis(task_id):
+    """获取异步LLM分析阶段的状态和结果"""
+    task = task_store.get(task_id, include_result=True)
+    if task is None:
+        return jsonify({'error': '任务不存在'}), 404
+    
+    llm_analysis = (task.get('result') or {}).get('llm_analysis')
+    return jsonify({
+        'task_id': task_id,
+        'llm_status': task.get('llm_status'),
+        'llm_analysis': llm_analysis,
+        'html': format_llm_text(llm_analysis)
+    })
+
+@app.route('/stream/llm/<task_id>')
+def stream_llm_analysis(task_id):
+    """以Server-Sent Events推送LLM分析的流式token"""
+    task = task_store.get(task_id, include_result=True)
+    if task is None:
+        return jsonify({'error': '任务不存在'}), 404
+    
+    channel = event_broker.get(f"llm:{task_id}")
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    
+    if channel is None and task.get('llm_status') == LLMStatus.PENDING and DEPLOY_MODE == 'queue':
+        # 分析在其他进程中生成（生产模式下的工作进程），等待存储中的状态变化后一次性返回
+        return Response(stream_with_context(watch_llm_status(task_id)), mimetype='text/event-stream',
+                        headers=headers)
+    
+    if channel is None or task.get('llm_status') != LLMStatus.PENDING:
+        # 分析已结束（或尚未开始），直接返回当前结果
+        llm_analysis = (task.get('result') or {}).get('llm_analysis')
+        done = format_sse('done', {
+            'llm_status': task.get('llm_status'),
+            'llm_analysis': llm_analysis,
+            'html': format_llm_text(llm_analysis)
+        })
+        return Response(done, mimetype='text/event-stream', headers=headers)
+    
+    last_event_id = parse_last_event_id(request.headers.get('Last-Event-ID'))
+    return Response(stream_with_context(stream_channel(channel, last_event_id)),
+                    mimetype='text/event-stream', headers=headers)
 
 @app.route('/download/<task_id>')
 def download_result(task_id):
     """下载处理后的视频"""
-    if task_id not in tasks:
+    task = task_store.get(task_id, include_result=True)
+    if task is None:
         return jsonify({'error': '任务不存在'}), 404
     
-    task = tasks[task_id]
     if task['status'] != TaskStatus.COMPLETED or not task['result']:
         return jsonify({'error': '结果文件不存在'}), 404
     
     output_path = task['result'].get('output_video_path')
     if not output_path or not os.path.exists(output_path):
-        return jsonify({'error': '输出视频文件不存在'}), 404
+        return evicted_response(task)
+    storage_manager.touch(task_id, 'outputs')
     
     try:
         # 生成下载文件名
@@ -258,86 +1547,157 @@ def download_result(task_id):
         name_without_ext = os.path.splitext(original_filename)[0]
         download_filename = f"fall_detection_{name_without_ext}.mp4"
         
-        response = send_file(
-            output_path, 
-            as_attachment=True,  # 设置为True以触发下载
+        return send_media(
+            output_path,
             download_name=download_filename,
-            mimetype='video/mp4'
+            chunk_size=MEDIA_CONFIG['chunk_size'],
+            zero_copy=MEDIA_CONFIG['zero_copy']
         )
         
-        # 设置额外的响应头
-        response.headers['Content-Disposition'] = f'attachment; filename="{download_filename}"'
-        response.headers['Cache-Control'] = 'no-cache'
-        
-        return response
-        
     except Exception as e:
         print(f"发送文件失败: {str(e)}")
         return jsonify({'error': f'文件发送失败: {str(e)}'}), 500
 
 @app.route('/preview/<task_id>')
 def preview_result(task_id):
-    """预览处理后的视频（用于在线播放）"""
-    if task_id not in tasks:
+    """预览处理后的视频（用于在线播放；检测进行中返回已处理部分的HLS播放列表）"""
+    task = task_store.get(task_id, include_result=True)
+    if task is None:
         return jsonify({'error': '任务不存在'}), 404
     
-    task = tasks[task_id]
     if task['status'] != TaskStatus.COMPLETED or not task['result']:
+        if task.get('preview_url') and os.path.exists(os.path.join(preview_dir_for(task_id), PLAYLIST_NAME)):
+            # 重定向到播放列表地址，列表中的分段相对路径才能正确解析
+            return redirect(task['preview_url'])
         return jsonify({'error': '结果文件不存在'}), 404
     
     output_path = task['result'].get('output_video_path')
     if not output_path or not os.path.exists(output_path):
-        return jsonify({'error': '输出视频文件不存在'}), 404
+        return evicted_response(task)
+    storage_manager.touch(task_id, 'outputs')
     
     try:
-        # 创建响应，添加必要的headers支持视频流
-        response = send_file(
-            output_path, 
-            as_attachment=False,
-            mimetype='video/mp4',
-            conditional=True  # 支持范围请求，对视频播放很重要
+        # 支持范围请求，浏览器拖动进度条时只请求需要的部分
+        response = send_media(
+            output_path,
+            chunk_size=MEDIA_CONFIG['chunk_size'],
+            zero_copy=MEDIA_CONFIG['zero_copy']
         )
-        
-        # 添加CORS头和缓存控制
         response.headers['Access-Control-Allow-Origin'] = '*'
-        response.headers['Accept-Ranges'] = 'bytes'
-        response.headers['Cache-Control'] = 'no-cache'
-        
         return response
     except Exception as e:
         print(f"预览文件失败: {str(e)}")
         return jsonify({'error': f'文件预览失败: {str(e)}'}), 500
 
+@app.route('/preview/<task_id>/<name>')
+def preview_segment(task_id, name):
+    """处理中预览的HLS播放列表和fMP4分段"""
+    if not PREVIEW_FILE_RE.match(name):
+        return jsonify({'error': '文件不存在'}), 404
+    path = os.path.join(preview_dir_for(task_id), name)
+    if not os.path.exists(path):
+        return jsonify({'error': '预览分段不存在'}), 404
+    
+    if name == PLAYLIST_NAME:
+        # 播放列表随新分段滚动更新，每次都要重新验证
+        response = send_media(path, mimetype='application/vnd.apple.mpegurl', zero_copy=False)
+    else:
+        # 分段写完后不再改变（ffmpeg先写临时文件再重命名）
+        response = send_media(
+            path,
+            mimetype='video/mp4' if name == INIT_SEGMENT else 'video/iso.segment',
+            chunk_size=MEDIA_CONFIG['chunk_size'],
+            cache_control='public, max-age=31536000, immutable',
+            zero_copy=MEDIA_CONFIG['zero_copy']
+        )
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+@app.route('/thumbnails/<task_id>/<name>')
+def serve_thumbnail(task_id, name):
+    """事件缩略图和雪碧图（写入后不再改变，允许长期缓存）"""
+    if not THUMBNAIL_FILE_RE.match(name):
+        return jsonify({'error': '文件不存在'}), 404
+    path = os.path.join(thumbnail_dir_for(task_id), name)
+    if not os.path.exists(path):
+        return jsonify({'error': '缩略图不存在'}), 404
+    return send_media(path, mimetype='image/jpeg', cache_control='public, max-age=31536000, immutable',
+                      zero_copy=MEDIA_CONFIG['zero_copy'])
+
+@app.route('/clip/<task_id>/<int:event_id>')
+def download_event_clip(task_id, event_id):
+    """事件前后几秒的短片段（event_id与时间线的事件编号一致，从1开始）"""
+    task = task_store.get(task_id, include_result=True)
+    if task is None:
+        return jsonify({'error': '任务不存在'}), 404
+    
+    if task['status'] != TaskStatus.COMPLETED or not task['result']:
+        return jsonify({'error': '结果文件不存在'}), 404
+    
+    detection = task['result'].get('detection_data')
+    if not 1 <= event_id <= event_count(detection):
+        return jsonify({'error': '事件不存在'}), 404
+    
+    output_path = task['result'].get('output_video_path')
+    if not output_path or not os.path.exists(output_path):
+        return evicted_response(task)
+    storage_manager.touch(task_id, 'outputs')
+    
+    try:
+        pre = max(0.0, min(CLIP_CONFIG['max_seconds'], float(request.args.get('pre', CLIP_CONFIG['pre_seconds']))))
+        post = max(0.0, min(CLIP_CONFIG['max_seconds'], float(request.args.get('post', CLIP_CONFIG['post_seconds']))))
+    except ValueError:
+        return jsonify({'error': 'pre/post必须是数字'}), 400
+    if pre + post <= 0:
+        return jsonify({'error': '片段时长必须大于0'}), 400
+    
+    timestamp = event_rows(detection, event_id - 1, 1)[0].get('timestamp') or 0
+    clip_path = os.path.join(clip_dir_for(task_id), clip_filename(event_id, pre, post))
+    try:
+        created = not os.path.exists(clip_path)
+        clip_extractor.get(output_path, clip_path, max(0.0, timestamp - pre), timestamp + post)
+        if created:
+            # 新片段计入输出区域的占用
+            storage_manager.refresh(task_id, 'outputs')
+    except (ClipError, OSError) as e:
+        print(f"❌ 截取事件片段失败: {str(e)}")
+        return jsonify({'error': f'片段截取失败: {str(e)}'}), 500
+    
+    download_name = None
+    if request.args.get('download'):
+        name_without_ext = os.path.splitext(task.get('filename', 'video.mp4'))[0]
+        download_name = f"fall_detection_{name_without_ext}_event{event_id}.mp4"
+    response = send_media(
+        clip_path,
+        download_name=download_name,
+        chunk_size=MEDIA_CONFIG['chunk_size'],
+        zero_copy=MEDIA_CONFIG['zero_copy']
+    )
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
 @app.route('/video/<task_id>')
 def serve_video(task_id):
     """直接服务视频文件（静态文件方式）"""
-    if task_id not in tasks:
+    task = task_store.get(task_id, include_result=True)
+    if task is None:
         return jsonify({'error': '任务不存在'}), 404
     
-    task = tasks[task_id]
     if task['status'] != TaskStatus.COMPLETED or not task['result']:
         return jsonify({'error': '结果文件不存在'}), 404
     
     output_path = task['result'].get('output_video_path')
     if not output_path or not os.path.exists(output_path):
-        return jsonify({'error': '输出视频文件不存在'}), 404
+        return evicted_response(task)
+    storage_manager.touch(task_id, 'outputs')
     
-    # 使用静态文件方式服务
     try:
-        from flask import Response
-        
-        def generate():
-            with open(output_path, 'rb') as f:
-                data = f.read(1024)
-                while data:
-                    yield data
-                    data = f.read(1024)
-        
-        response = Response(generate(), mimetype='video/mp4')
-        response.headers.add('Accept-Ranges', 'bytes')
-        response.headers.add('Cache-Control', 'no-cache')
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        
+        response = send_media(
+            output_path,
+            chunk_size=MEDIA_CONFIG['chunk_size'],
+            zero_copy=MEDIA_CONFIG['zero_copy']
+        )
+        response.headers['Access-Control-Allow-Origin'] = '*'
         return response
         
     except Exception as e:
@@ -347,13 +1707,12 @@ def serve_video(task_id):
 @app.route('/debug/task/<task_id>')
 def debug_task(task_id):
     """调试任务状态（开发用）"""
-    if task_id not in tasks:
+    task = task_store.get(task_id, include_result=True)
+    if task is None:
         return jsonify({'error': '任务不存在'}), 404
     
-    task = tasks[task_id]
-    
     # 检查输出文件
-    output_path = task.get('result', {}).get('output_video_path')
+    output_path = (task.get('result') or {}).get('output_video_path')
     file_info = {}
     if output_path:
         file_info = {
@@ -371,32 +1730,337 @@ def debug_task(task_id):
         'upload_folder': UPLOAD_FOLDER
     })
 
+@app.route('/admin/profile/<task_id>', methods=['POST'])
+def profile_task(task_id):
+    """对运行中的检测任务进行按需剖析（仅限本机访问）
+
+    参数（JSON或查询字符串）:
+        mode: sample（采样剖析，输出折叠栈）或 tracemalloc（内存增长快照）
+        seconds: 剖析时长，最长PROFILE_MAX_SECONDS秒
+        interval: 采样间隔（秒），仅sample模式
+    """
+    if request.remote_addr not in ('127.0.0.1', '::1'):
+        return jsonify({'error': '仅允许本机访问'}), 403
+    
+    task = task_store.get(task_id)
+    if task is None:
+        return jsonify({'error': '任务不存在'}), 404
+    
+    job = active_jobs.get(task_id)
+    if task['status'] != TaskStatus.PROCESSING or not job:
+        return jsonify({'error': '任务未在运行'}), 400
+    
+    params = request.get_json(silent=True) or request.args.to_dict()
+    try:
+        mode = params.get('mode', 'sample')
+        seconds = max(0.5, min(float(params.get('seconds', 10)), PROFILE_MAX_SECONDS))
+        interval = max(0.001, float(params.get('interval', 0.005)))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'参数错误: {str(e)}'}), 400
+    
+    profiler = TaskProfiler(interval=interval)
+    print(f"🔬 剖析任务 {task_id}: 模式={mode}, 时长={seconds}s")
+    
+    if mode == 'sample':
+        profile = profiler.sample_thread(job['thread_id'], seconds)
+        body = profile['collapsed']
+        filename = f"profile_{task_id}.folded"
+        extra_headers = {
+            'X-Profile-Samples': str(profile['samples']),
+            'X-Profile-Duration': f"{profile['duration']:.2f}"
+        }
+    elif mode == 'tracemalloc':
+        detector = job.get('detector')
+        body = profiler.trace_allocations(
+            seconds,
+            frame_counter=lambda: getattr(detector, 'current_frame', 0)
+        )
+        filename = f"tracemalloc_{task_id}.txt"
+        extra_headers = {}
+    else:
+        return jsonify({'error': f'不支持的剖析模式: {mode}'}), 400
+    
+    response = Response(body, mimetype='text/plain')
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers.update(extra_headers)
+    return response
+
 @app.route('/api/tasks')
 def list_tasks():
-    """获取所有任务列表"""
-    task_list = []
-    for task_id, task in tasks.items():
-        task_list.append({
-            'id': task_id,
-            'filename': task['filename'],
-            'status': task['status'],
-            'upload_time': task['upload_time'],
-            'progress': task['progress']
-        })
+    """分页获取任务列表（按上传时间倒序）
+
+    查询参数:
+        status: 状态过滤，多个状态用逗号分隔
+        since / until: 上传时间范围（ISO格式）
+        limit: 每页数量（默认50，最多TASK_LIST_MAX_LIMIT）
+        offset: 偏移量
+    """
+    try:
+        limit = max(1, min(int(request.args.get('limit', 50)), TASK_LIST_MAX_LIMIT))
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'参数错误: {str(e)}'}), 400
     
-    # 按上传时间排序
-    task_list.sort(key=lambda x: x['upload_time'], reverse=True)
+    statuses = [s for s in request.args.get('status', '').split(',') if s]
+    task_list, total = task_store.list(
+        statuses=statuses or None,
+        since=request.args.get('since'),
+        until=request.args.get('until'),
+        limit=limit,
+        offset=offset
+    )
     return jsonify({
         'success': True,
         'tasks': task_list,
+        'total': total,
+        'limit': limit,
+        'offset': offset,
+        'has_more': offset + len(task_list) < total,
         'performance': PERFORMANCE_CONFIG
     })
 
+@app.route('/api/batches', methods=['POST'])
+def create_batch():
+    """
+    提交批量检测任务：视频在原位置读取，不复制到上传目录
+
+    请求体(JSON):
+        directory: 视频目录（与manifest、manifest_path三选一）
+        recursive: 是否包含子目录（默认false）
+        manifest: 视频路径列表
+        manifest_path: 清单文件路径（JSON或每行一个路径的文本）
+        name: 批次名称
+        confidence, iou_threshold, priority: 检测参数（同/detect，priority默认batch）
+    """
+    params = request.get_json(silent=True) or {}
+    priority = params.get('priority', BATCH_CONFIG['priority'])
+    if priority not in PRIORITIES:
+        return jsonify({'error': f"priority必须是 {', '.join(PRIORITIES)} 之一"}), 400
+    try:
+        videos = collect_videos(
+            BATCH_CONFIG['allowed_roots'],
+            directory=params.get('directory'),
+            recursive=bool(params.get('recursive', False)),
+            manifest=params.get('manifest'),
+            manifest_path=params.get('manifest_path'),
+            max_videos=BATCH_CONFIG['max_videos']
+        )
+    except BatchError as e:
+        return jsonify({'error': str(e)}), e.status
+    
+    batch_id = str(uuid.uuid4())
+    tenant = request_tenant()
+    options = {
+        'confidence': params.get('confidence', 0.5),
+        'iou_threshold': params.get('iou_threshold', 0.4),
+        'priority': priority
+    }
+    print(f"📚 创建批次 {batch_id}: {len(videos)} 个视频")
+    
+    items, tasks = [], []
+    for path in videos:
+        try:
+            video_info = probe_video(path)
+        except UploadRejected as e:
+            # 无法解码的视频记入报告，不创建任务
+            items.append({'path': path, 'error': str(e)})
+            continue
+        task_id = str(uuid.uuid4())
+        items.append({'path': path, 'task_id': task_id})
+        tasks.append({
+            'id': task_id,
+            'status': TaskStatus.PENDING,
+            'filename': os.path.basename(path),
+            'filepath': path,
+            'upload_time': datetime.now().isoformat(),
+            'progress': 0,
+            'message': '批量任务，等待调度...',
+            'file_size': os.path.getsize(path),
+            'video_info': video_info,
+            'tenant': tenant,
+            'batch_id': batch_id
+        })
+    for task in tasks:
+        task_store.create(task)
+    # 任务创建完后再登记批次，调度线程不会领取到尚不存在的任务
+    batch_store.create(batch_id, params.get('name'), tenant, options, items)
+    start_batch_dispatcher()
+    
+    skipped = len(items) - len(tasks)
+    return jsonify({
+        'success': True,
+        'batch_id': batch_id,
+        'videos': len(items),
+        'queued': len(tasks),
+        'skipped': skipped
+    }), 201
+
+def batch_summary(batch, include_items=False):
+    """批次的聚合进度：各状态的视频数和按视频平均的进度"""
+    task_ids = [item['task_id'] for item in batch['items'] if item['task_id']]
+    tasks = task_store.get_many(task_ids)
+    counts = {'skipped': 0}
+    progress = 0.0
+    items = []
+    for item in batch['items']:
+        task = tasks.get(item['task_id']) if item['task_id'] else None
+        status = task['status'] if task else 'skipped'
+        counts[status] = counts.get(status, 0) + 1
+        if task is not None:
+            progress += 100 if status in (TaskStatus.COMPLETED, TaskStatus.ERROR, TaskStatus.CANCELLED) \
+                else task.get('progress', 0)
+        if include_items:
+            items.append(dict(item, status=status, progress=task.get('progress', 0) if task else 0,
+                              message=(task or {}).get('message')))
+    
+    summary = {
+        'batch_id': batch['id'],
+        'name': batch['name'],
+        'status': batch['status'],
+        'tenant': batch['tenant'],
+        'options': batch['options'],
+        'created_at': datetime.fromtimestamp(batch['created_at']).isoformat(),
+        'finished_at': datetime.fromtimestamp(batch['finished_at']).isoformat() if batch['finished_at'] else None,
+        'videos': len(batch['items']),
+        'counts': counts,
+        'progress': round(progress / len(task_ids), 1) if task_ids else 100.0,
+        'report': batch['report']
+    }
+    if include_items:
+        summary['items'] = items
+    return summary
+
+@app.route('/api/batches')
+def list_batches():
+    """分页获取批次列表（按创建时间倒序，不含每个视频的进度）"""
+    try:
+        limit = max(1, min(int(request.args.get('limit', 50)), TASK_LIST_MAX_LIMIT))
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'参数错误: {str(e)}'}), 400
+    
+    batches, total = batch_store.list(limit=limit, offset=offset)
+    return jsonify({
+        'success': True,
+        'batches': [{
+            'batch_id': batch['id'],
+            'name': batch['name'],
+            'status': batch['status'],
+            'created_at': datetime.fromtimestamp(batch['created_at']).isoformat(),
+            'report': batch['report']
+        } for batch in batches],
+        'total': total,
+        'limit': limit,
+        'offset': offset,
+        'has_more': offset + len(batches) < total
+    })
+
+@app.route('/api/batches/<batch_id>')
+def get_batch(batch_id):
+    """批次的聚合进度（?include=items 时附带每个视频的状态）"""
+    batch = batch_store.get(batch_id)
+    if batch is None:
+        return jsonify({'error': '批次不存在'}), 404
+    include_items = 'items' in request.args.get('include', '').split(',')
+    return jsonify(dict(batch_summary(batch, include_items), success=True))
+
+@app.route('/api/batches/<batch_id>/cancel', methods=['POST'])
+def cancel_batch(batch_id):
+    """取消批次：未开始的视频不再检测，检测中的视频在当前帧处理完后停止"""
+    if batch_store.get(batch_id) is None:
+        return jsonify({'error': '批次不存在'}), 404
+    cancelled = batch_store.cancel(batch_id)
+    if cancelled is None:
+        return jsonify({'error': '批次已结束，无法取消'}), 400
+    
+    pending, started = cancelled
+    reason = '批次已被用户取消'
+    for task_id in pending + started:
+        request_cancel(task_id, reason)
+    print(f"🛑 已请求取消批次 {batch_id}: {len(pending)} 个未开始, {len(started)} 个检测中")
+    return jsonify({'success': True, 'cancelled': len(pending), 'stopping': len(started)}), 202
+
+@app.route('/api/batches/<batch_id>/report')
+def download_batch_report(batch_id):
+    """下载批次报告（?format=json 为完整报告，csv 为事件列表）"""
+    batch = batch_store.get(batch_id)
+    if batch is None:
+        return jsonify({'error': '批次不存在'}), 404
+    if batch['report'] is None:
+        return jsonify({'error': '批次尚未结束，报告未生成', 'status': batch['status']}), 409
+    
+    report_format = request.args.get('format', 'json')
+    if report_format not in ('json', 'csv'):
+        return jsonify({'error': 'format必须是json或csv'}), 400
+    name = 'report.json' if report_format == 'json' else 'events.csv'
+    path = os.path.join(batch_dir_for(batch_id), name)
+    if not os.path.exists(path):
+        return jsonify({'error': '报告文件不存在'}), 404
+    return send_media(path, mimetype='application/json' if report_format == 'json' else 'text/csv',
+                      download_name=f"batch_{batch_id}_{name}")
+
+@app.route('/api/llm/stats')
+def llm_stats():
+    """获取LLM分析服务的队列、吞吐和响应缓存统计"""
+    return jsonify({
+        'success': True,
+        'stats': get_llm_service(LLM_MODEL_PATH).get_stats(),
+        'cache': llm_cache.get_stats()
+    })
+
+@app.route('/api/clips/stats')
+def clip_stats():
+    """获取事件片段的缓存命中、合并请求和截取方式统计"""
+    return jsonify({
+        'success': True,
+        'stats': clip_extractor.get_stats()
+    })
+
+@app.route('/api/storage')
+def storage_stats():
+    """获取上传/输出目录的占用、配额、淘汰统计和磁盘剩余空间"""
+    disk = shutil.disk_usage(OUTPUT_FOLDER)
+    return jsonify({
+        'success': True,
+        'usage': storage_manager.usage(),
+        'disk': {'total': disk.total, 'used': disk.used, 'free': disk.free}
+    })
+
+@app.route('/healthz')
+def healthz():
+    """存活探针：进程能响应请求即返回正常"""
+    return jsonify({
+        'status': 'ok',
+        'uptime': time.time() - readiness['started_at']
+    })
+
+@app.route('/readyz')
+def readyz():
+    """就绪探针：模型预热完成（生产模式下有存活的工作进程）后返回200，同时报告检测工作线程的空闲/忙碌数"""
+    ready = detection_ready()
+    workers = (job_queue.snapshot(WORKER_CONFIG['heartbeat_interval'] * 3) if DEPLOY_MODE == 'queue'
+               else worker_pool.snapshot())
+    return jsonify({
+        'ready': ready,
+        'demo_mode': DEMO_MODE,
+        'deploy_mode': DEPLOY_MODE,
+        'models': {
+            'warm': readiness['warm'],
+            'warming': readiness['warming'],
+            'warm_up_time': readiness['warm_up_time'],
+            'error': readiness['error']
+        },
+        'workers': workers
+    }), 200 if ready else 503
+
 @app.route('/api/performance', methods=['GET', 'POST'])
 def handle_performance_config():
     """处理性能配置"""
     global PERFORMANCE_CONFIG
     
+    # 多个Web进程时，配置可能由其他进程修改
+    sync_performance_config()
+    
     if request.method == 'GET':
         return jsonify({
             'success': True,
@@ -404,7 +2068,8 @@ def handle_performance_config():
             'info': {
                 'skip_frames_effect': f"每{PERFORMANCE_CONFIG['skip_frames']}帧检测1次 (速度提升约{PERFORMANCE_CONFIG['skip_frames']}倍)",
                 'gpu_status': "启用GPU加速" if PERFORMANCE_CONFIG['use_gpu'] else "使用CPU计算"
-            }
+            },
+            'calibration': calibration_summary(load_profile(PERFORMANCE_PROFILE_PATH))
         })
     
     elif request.method == 'POST':
@@ -420,6 +2085,14 @@ def handle_performance_config():
                 PERFORMANCE_CONFIG['detection_conf'] = max(0.1, min(1.0, float(data['detection_conf'])))
             if 'iou_threshold' in data:
                 PERFORMANCE_CONFIG['iou_threshold'] = max(0.1, min(1.0, float(data['iou_threshold'])))
+            if 'imgsz' in data:
+                # YOLO要求输入尺寸为32的倍数
+                PERFORMANCE_CONFIG['imgsz'] = max(160, min(1280, int(data['imgsz']) // 32 * 32))
+            if 'threads' in data:
+                PERFORMANCE_CONFIG['threads'] = max(0, int(data['threads']))
+                set_inference_threads(PERFORMANCE_CONFIG['threads'])
+            # 保存后检测工作进程在下一个任务开始时读取（运行中的任务不受影响）
+            save_performance_config()
             
             return jsonify({
                 'success': True,
@@ -433,10 +2106,162 @@ def handle_performance_config():
                 'error': f'配置更新失败: {str(e)}'
             }), 400
 
-def run_detection_task(task_id, confidence=0.5, iou_threshold=0.4):
-    """在后台运行检测任务"""
+def calibration_summary(profile):
+    """校准结果摘要（不含各组合的测量数据）"""
+    if profile is None:
+        return None
+    return {
+        'calibrated_at': profile['machine']['calibrated_at'],
+        'recommended': profile['recommended'],
+        'meets_target': profile['meets_target'],
+        'target': profile['target'],
+        'applied': profile['applied'],
+        'stale': profile['models'] != current_model_signature()
+    }
+
+@app.route('/api/performance/calibrate', methods=['POST'])
+def start_performance_calibration():
+    """在参考视频上校准性能配置（仅限本机访问，后台运行，通过GET /api/performance/calibration查看进度）
+
+    参数（JSON）:
+        clip: 参考视频路径（服务端本地路径），默认CALIBRATION_CONFIG['reference_clip']
+        apply: 是否直接应用推荐配置
+        target_rtf: 目标实时倍率
+        min_agreement: 最低检测一致性
+        grid: 覆盖部分参数网格，如 {"threads": [1, 2]}
+        exhaustive: 测试全部组合
+    """
+    if request.remote_addr not in ('127.0.0.1', '::1'):
+        return jsonify({'error': '仅允许本机访问'}), 403
+    if DEMO_MODE:
+        return jsonify({'error': '演示模式没有检测模型，无法校准'}), 400
+    if DEPLOY_MODE == 'queue':
+        return jsonify({'error': '生产模式下模型在工作进程中运行，请在工作进程所在机器执行 python calibrate.py'}), 400
+    
+    data = request.get_json(silent=True) or {}
+    clip_path = data.get('clip') or CALIBRATION_CONFIG['reference_clip']
+    if not clip_path or not os.path.isfile(clip_path):
+        return jsonify({'error': '参考视频不存在，请指定clip或配置FALL_DETECTION_CALIBRATION_CLIP'}), 400
     try:
-        task = tasks[task_id]
+        options = {
+            'apply': bool(data.get('apply', CALIBRATION_CONFIG['apply'])),
+            'target_rtf': float(data.get('target_rtf', CALIBRATION_CONFIG['target_rtf'])),
+            'min_agreement': max(0.0, min(1.0, float(data.get('min_agreement', CALIBRATION_CONFIG['min_agreement'])))),
+            'exhaustive': bool(data.get('exhaustive', False))
+        }
+        grid = data.get('grid') or {}
+        options['grid'] = {key: [max(1, int(value)) for value in grid[key]]
+                           for key in ('skip_frames', 'threads') if grid.get(key)}
+        if grid.get('imgsz'):
+            # YOLO要求输入尺寸为32的倍数
+            options['grid']['imgsz'] = [max(160, min(1280, int(value) // 32 * 32)) for value in grid['imgsz']]
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'参数错误: {str(e)}'}), 400
+    
+    if not start_calibration(clip_path, **options):
+        return jsonify({'error': '已有校准在运行'}), 409
+    return jsonify({
+        'success': True,
+        'message': '性能校准已开始',
+        'status_url': '/api/performance/calibration'
+    }), 202
+
+@app.route('/api/performance/calibration')
+def get_performance_calibration():
+    """校准进度和保存的校准结果（含各组合的测量数据）"""
+    with calibration_lock:
+        state = dict(calibration)
+    profile = load_profile(PERFORMANCE_PROFILE_PATH)
+    return jsonify({
+        'running': state['running'],
+        'started_at': state['started_at'],
+        'progress': state['progress'],
+        'error': state['error'],
+        'summary': calibration_summary(profile),
+        'profile': profile
+    })
+
+@app.route('/api/performance/calibration/apply', methods=['POST'])
+def apply_performance_calibration():
+    """应用保存的推荐配置（校准时未直接应用的情况，仅限本机访问）"""
+    if request.remote_addr not in ('127.0.0.1', '::1'):
+        return jsonify({'error': '仅允许本机访问'}), 403
+    profile = load_profile(PERFORMANCE_PROFILE_PATH)
+    if profile is None:
+        return jsonify({'error': '没有校准结果'}), 404
+    if profile['models'] != current_model_signature():
+        return jsonify({'error': '校准结果对应的模型已更新，请重新校准'}), 409
+    profile['applied'] = True
+    save_profile(PERFORMANCE_PROFILE_PATH, profile)
+    apply_performance_profile(profile, persist=True)
+    return jsonify({
+        'success': True,
+        'message': '已应用校准配置（检测工作进程在下一个任务开始时读取）',
+        'config': PERFORMANCE_CONFIG
+    })
+
+def early_detection_report(follower, detection_start, result):
+    """
+    边上传边检测的耗时，并估算先上传完再检测（串行）的对应耗时
+
+    时间均从上传会话创建起算；串行估算 = 上传耗时 + 检测中不含等待上传数据的处理时间，
+    不含用户上传后点击开始检测的间隔
+    """
+    timing = result.get('timing') or {}
+    upload_time = follower.upload_completed - follower.upload_started
+    busy_time = result.get('processing_time', 0) - timing.get('input_wait_time', 0)
+    report = {
+        'upload_time': upload_time,
+        'input_wait_time': timing.get('input_wait_time', 0),
+        'wall_time': time.time() - follower.upload_started,
+        'serialized_wall_time': upload_time + busy_time,
+        'time_to_first_event': None,
+        'serialized_time_to_first_event': None
+    }
+    if timing.get('first_event_time') is not None:
+        report['time_to_first_event'] = detection_start - follower.upload_started + timing['first_event_time']
+        report['serialized_time_to_first_event'] = (
+            upload_time + timing['first_event_time'] - timing.get('first_event_input_wait', 0))
+    return report
+
+def mark_cancelled(task_id, reason):
+    """检测线程退出后记录取消状态并删除部分输出"""
+    print(f"🛑 任务 {task_id} 已取消: {reason}")
+    discard_partial_outputs(task_id)
+    task_store.update(
+        task_id,
+        status=TaskStatus.CANCELLED,
+        stage=TaskStage.DONE,
+        message=reason,
+        end_time=datetime.now().isoformat()
+    )
+    publish_task_event(task_id, 'cancelled', {'status': TaskStatus.CANCELLED, 'message': reason})
+
+def job_state_callback(task_id):
+    """任务被抢占暂停、恢复时更新状态并推送"""
+    def on_state(state):
+        if state == 'paused':
+            task_store.update(task_id, stage=TaskStage.PAUSED, message='已暂停，工作线程让给高优先级任务...')
+        else:
+            task_store.update(task_id, stage=TaskStage.DETECTING, message='继续检测...')
+        publish_task_event(task_id, 'progress', progress_snapshot(task_store.get(task_id)))
+    return on_state
+
+def run_detection_task(task_id, confidence=0.5, iou_threshold=0.4, source=None, priority='normal'):
+    """在后台运行检测任务（source为UploadFollower时边上传边检测）"""
+    slot_acquired = False
+    detector = None
+    checkpoint = None
+    # 取消请求可能由其他工作进程写入存储，检测线程定期读取
+    control = JobControl(
+        task_id, priority,
+        poll_cancel=lambda: (task_store.get(task_id) or {}).get('cancel_requested'),
+        on_state=job_state_callback(task_id)
+    )
+    try:
+        task = task_store.get(task_id)
+        active_jobs[task_id] = {'thread_id': threading.get_ident(), 'detector': None, 'control': control}
+        storage_manager.touch(task_id, 'uploads')
         print(f"🔄 开始处理任务 {task_id}")
         print(f"📁 输入文件: {task['filepath']}")
         
@@ -444,41 +2269,91 @@ def run_detection_task(task_id, confidence=0.5, iou_threshold=0.4):
         os.makedirs(OUTPUT_FOLDER, exist_ok=True)
         print(f"📁 输出目录: {OUTPUT_FOLDER}")
         
-        # 初始化检测器
-        if DEMO_MODE:
-            print("⚠️ 使用演示模式检测器")
-            detector = FallDetector()
-        else:
-            print("✅ 使用真实AI模型检测器")
-            # 使用全局性能配置
-            detector = FallDetector(
-                fall_model_path='../models/best.pt',
-                pose_model_path='../models/yolov8n-pose.pt',
-                llm_model_path='../models/tinyllama-1.1b-chat-v1.0.Q4_K_M.gguf',
-                use_gpu=PERFORMANCE_CONFIG['use_gpu'],
-                skip_frames=PERFORMANCE_CONFIG['skip_frames']
+        # 等待空闲的检测工作槽位（按优先级排队）
+        task_store.update(task_id, stage=TaskStage.QUEUED, message='等待空闲的检测工作线程...')
+        publish_task_event(task_id, 'progress', progress_snapshot(task_store.get(task_id)))
+        worker_pool.acquire(control)
+        slot_acquired = True
+        task_store.update(task_id, stage=TaskStage.DETECTING)
+        
+        # 初始化检测器（使用全局性能配置，模型来自已预热的模型池）；生产模式下配置由Web进程修改，先同步
+        sync_performance_config()
+        detector = create_detector()
+        active_jobs[task_id]['detector'] = detector
+        
+        # 长视频定期保存检查点，服务重启后从最近的检查点继续（续写的输出分段也在预览目录中）
+        checkpoint = checkpoint_for(task)
+        
+        # 处理中预览：第一个分段写完后播放列表出现，随进度一起通知客户端
+        preview_dir = preview_dir_for(task_id) if PREVIEW_CONFIG['hls'] or checkpoint is not None else None
+        preview = {'url': None}
+        
+        # 检测过程中顺带保存事件缩略图和雪碧图，结果页无需加载整个视频
+        thumbnails = None
+        if THUMBNAIL_CONFIG['enabled']:
+            thumbnails = ThumbnailRecorder(
+                thumbnail_dir_for(task_id),
+                event_width=THUMBNAIL_CONFIG['event_width'],
+                sprite_interval=THUMBNAIL_CONFIG['sprite_interval'],
+                tile_width=THUMBNAIL_CONFIG['tile_width'],
+                sprite_columns=THUMBNAIL_CONFIG['sprite_columns'],
+                sprite_rows=THUMBNAIL_CONFIG['sprite_rows'],
+                jpeg_quality=THUMBNAIL_CONFIG['jpeg_quality']
             )
-            print(f"⚡ 性能优化: GPU={PERFORMANCE_CONFIG['use_gpu']}, 跳帧={PERFORMANCE_CONFIG['skip_frames']}")
         
-        # 设置进度回调
+        # 设置进度回调（进度和消息都未变化时不写存储、不推送）
+        last_progress = {}
+        
         def progress_callback(progress, message):
-            tasks[task_id]['progress'] = progress
-            tasks[task_id]['message'] = message
+            if last_progress.get('value') == (progress, message):
+                return
+            last_progress['value'] = (progress, message)
+            fields = {'progress': progress, 'message': message}
+            if preview_dir and preview['url'] is None and os.path.exists(os.path.join(preview_dir, PLAYLIST_NAME)):
+                preview['url'] = f"/preview/{task_id}/{PLAYLIST_NAME}"
+                fields['preview_url'] = preview['url']
+            task_store.update(task_id, **fields)
+            publish_task_event(task_id, 'progress', {
+                'status': TaskStatus.PROCESSING,
+                'stage': TaskStage.DETECTING,
+                'progress': progress,
+                'message': message,
+                'preview_url': preview['url']
+            })
             print(f"📊 任务 {task_id} 进度: {progress}% - {message}")
         
         # 运行检测
         output_path = os.path.join(OUTPUT_FOLDER, f"result_{task_id}.mp4")
         print(f"📹 输出路径: {output_path}")
         
+        detection_start = time.time()
         result = detector.detect_video(
             video_path=task['filepath'],
             output_path=output_path,
             confidence=PERFORMANCE_CONFIG['detection_conf'],
             iou_threshold=PERFORMANCE_CONFIG['iou_threshold'],
-            progress_callback=progress_callback
+            progress_callback=progress_callback,
+            with_llm_analysis=False,  # LLM分析作为独立阶段异步生成
+            source=source,
+            preview_dir=preview_dir,
+            thumbnails=thumbnails,
+            control=control,
+            checkpoint=checkpoint
         )
         
+        early_report = None
+        if source is not None:
+            early_report = early_detection_report(source, detection_start, result)
+            first_event = early_report['time_to_first_event']
+            serialized_first_event = early_report['serialized_time_to_first_event']
+            print(f"📈 边上传边检测: 总耗时 {early_report['wall_time']:.1f}s "
+                  f"(串行约 {early_report['serialized_wall_time']:.1f}s), 首个事件 "
+                  + (f"{first_event:.1f}s (串行约 {serialized_first_event:.1f}s)"
+                     if first_event is not None else "无"))
+        
         print(f"✅ 检测完成，开始分析结果...")
+        task_store.update(task_id, stage=TaskStage.ANALYZING, message='正在分析检测结果...')
+        publish_task_event(task_id, 'progress', progress_snapshot(task_store.get(task_id)))
         
         # 检查输出文件是否生成
         if not os.path.exists(output_path):
@@ -499,14 +2374,14 @@ def run_detection_task(task_id, confidence=0.5, iou_threshold=0.4):
             
         analysis = analyzer.analyze_detection_result(result)
         
-        # 更新任务状态
-        task['status'] = TaskStatus.COMPLETED
-        task['progress'] = 100
-        task['message'] = '检测完成'
-        task['end_time'] = datetime.now().isoformat()
-        task['result'] = {
-            'detection_data': result,
+        # 先发布结果再更新状态，轮询方看到completed时结果已就绪
+        fall_events = result.get('fall_events', [])
+        llm_status = LLMStatus.PENDING if fall_events or DEMO_MODE else LLMStatus.SKIPPED
+        # 事件以列式表保存一次，时间线和图表由事件表生成
+        task_store.set_result(task_id, {
+            'detection_data': compact_detection_result(result),
             'analysis': analysis,
+            'llm_analysis': None,
             'output_video_path': output_path,
             'summary': {
                 'total_frames': result.get('total_frames', 0),
@@ -514,22 +2389,159 @@ def run_detection_task(task_id, confidence=0.5, iou_threshold=0.4):
                 'max_confidence': max([e.get('confidence', 0) for e in result.get('fall_events', [])], default=0),
                 'processing_time': result.get('processing_time', 0),
                 'output_file_size': file_size
+            },
+            'early_detection': early_report,
+            'preemption': {
+                'priority': priority,
+                'paused_count': control.paused_count,
+                'paused_time': control.paused_time
             }
-        }
+        })
+        storage_manager.register(task_id, 'outputs', task.get('tenant', 'default'),
+                                 output_paths_for(task_id, output_path))
+        
+        # LLM阶段的事件通道需在状态变为completed前创建，订阅方据此判断是否流式读取
+        if llm_status == LLMStatus.PENDING:
+            event_broker.channel(f"llm:{task_id}")
+        
+        # 更新任务状态
+        task_store.update(
+            task_id,
+            status=TaskStatus.COMPLETED,
+            stage=TaskStage.DONE,
+            progress=100,
+            message='检测完成',
+            llm_status=llm_status,
+            end_time=datetime.now().isoformat()
+        )
+        publish_task_event(task_id, 'completed', {'status': TaskStatus.COMPLETED, 'llm_status': llm_status})
         
         print(f"🎉 任务 {task_id} 完成成功")
         print(f"📊 检测结果: {len(result.get('fall_events', []))} 个跌倒事件")
         
+        # 检测结果已发布，LLM分析在独立线程中生成并流式推送
+        if llm_status == LLMStatus.PENDING:
+            threading.Thread(
+                target=run_llm_analysis_task,
+                args=(task_id, detector, fall_events, task['filepath']),
+                daemon=True
+            ).start()
+        
+    except JobCancelled as e:
+        mark_cancelled(task_id, str(e))
     except Exception as e:
+        if control.cancelled:
+            # 边上传边检测在等待数据时通过中止上传跟随器取消
+            mark_cancelled(task_id, control.cancel_reason)
+            return
+        
         # 错误处理
         print(f"❌ 任务 {task_id} 检测失败: {str(e)}")
         import traceback
         traceback.print_exc()
         
-        tasks[task_id]['status'] = TaskStatus.ERROR
-        tasks[task_id]['message'] = f'检测失败: {str(e)}'
-        tasks[task_id]['error'] = str(e)
-        tasks[task_id]['end_time'] = datetime.now().isoformat()
+        task_store.update(
+            task_id,
+            status=TaskStatus.ERROR,
+            stage=TaskStage.DONE,
+            message=f'检测失败: {str(e)}',
+            error=str(e),
+            end_time=datetime.now().isoformat()
+        )
+        publish_task_event(task_id, 'failed', {
+            'status': TaskStatus.ERROR,
+            'message': f'检测失败: {str(e)}',
+            'error': str(e)
+        })
+    finally:
+        active_jobs.pop(task_id, None)
+        # 任务正常结束、失败或取消后检查点不再需要（只有进程退出时保留）
+        if checkpoint is not None:
+            checkpoint.clear()
+        if source is not None:
+            source.close()
+            with early_uploads_lock:
+                early_uploads.pop(source.upload_id, None)
+        if os.path.isdir(preview_dir_for(task_id)):
+            remove_preview_later(task_id)
+        progress_channel = event_broker.get(f"progress:{task_id}")
+        if progress_channel is not None:
+            progress_channel.close()
+            release_channel_later(f"progress:{task_id}")
+        if detector is not None:
+            detector.release()
+        if slot_acquired:
+            worker_pool.release(control)
+
+def resume_interrupted_tasks():
+    """
+    服务重启后继续有检查点的中断任务（只在启动时执行一次）
+
+    Returns:
+        list: 继续检测的任务ID，其余处理中的任务由调用方标记为失败
+    """
+    resumed, offset = [], 0
+    while True:
+        tasks, _ = task_store.list(statuses=[TaskStatus.PROCESSING], limit=TASK_LIST_MAX_LIMIT, offset=offset)
+        if not tasks:
+            break
+        offset += len(tasks)
+        for item in tasks:
+            task = task_store.get(item['id'])
+            if not task.get('early_detection') and not task.get('cancel_requested') \
+                    and os.path.exists(task['filepath']) and CheckpointStore(checkpoint_dir_for(task['id'])).exists():
+                resumed.append((task['id'], task.get('priority', 'normal')))
+            else:
+                shutil.rmtree(checkpoint_dir_for(task['id']), ignore_errors=True)
+    
+    for task_id, priority in resumed:
+        task_store.update(task_id, stage=TaskStage.QUEUED, message='服务重启，从检查点继续检测...')
+        event_broker.channel(f"progress:{task_id}")
+        threading.Thread(
+            target=run_detection_task,
+            args=(task_id, PERFORMANCE_CONFIG['detection_conf'], PERFORMANCE_CONFIG['iou_threshold'], None, priority),
+            daemon=True
+        ).start()
+    if resumed:
+        print(f"⏩ {len(resumed)} 个中断的检测任务将从检查点继续")
+    return [task_id for task_id, _ in resumed]
+
+def run_llm_analysis_task(task_id, detector, fall_events, video_path):
+    """在后台生成LLM分析，超过时间预算时回退到备用分析"""
+    channel_key = f"llm:{task_id}"
+    channel = event_broker.channel(channel_key)
+    start = time.time()
+    try:
+        analysis = detector.generate_llm_analysis(
+            fall_events, video_path, time_budget=LLM_CONFIG['time_budget'],
+            on_token=lambda text: channel.publish('token', {'text': text})
+        )
+        llm_analysis = analysis['text']
+        if llm_analysis is None:
+            llm_status = LLMStatus.SKIPPED
+        elif analysis['source'] == 'fallback':
+            llm_status = LLMStatus.FALLBACK
+        else:
+            llm_status = LLMStatus.COMPLETED
+    except Exception as e:
+        print(f"❌ 任务 {task_id} LLM分析失败: {str(e)}")
+        llm_analysis = '智能分析生成失败'
+        llm_status = LLMStatus.FALLBACK
+    
+    result = task_store.get_result(task_id)
+    result['llm_analysis'] = llm_analysis
+    result['detection_data']['llm_analysis'] = llm_analysis
+    task_store.set_result(task_id, result)
+    task_store.update(task_id, llm_status=llm_status)
+    
+    channel.publish('done', {
+        'llm_status': llm_status,
+        'llm_analysis': llm_analysis,
+        'html': format_llm_text(llm_analysis)
+    })
+    channel.close()
+    release_channel_later(channel_key)
+    print(f"🤖 任务 {task_id} LLM分析阶段结束: {llm_status}, 耗时 {time.time() - start:.1f}s")
 
 def allowed_file(filename):
     """检查文件扩展名是否允许"""
@@ -559,4 +2571,15 @@ if __name__ == '__main__':
     print("   ✓ 实时进度监控")
     print("=" * 60)
     
+    # 调试模式的重载器会启动父子两个进程，只在实际服务请求的子进程中预热
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        resumed = resume_interrupted_tasks()
+        interrupted = task_store.fail_interrupted(
+            TaskStatus.PROCESSING, TaskStatus.ERROR, '服务重启，检测任务已中断', exclude=resumed)
+        if interrupted:
+            print(f"⚠️ {interrupted} 个未完成的检测任务因服务重启被标记为失败")
+        threading.Thread(target=backfill_storage, name='storage-backfill', daemon=True).start()
+        start_warm_up()
+        start_batch_dispatcher()
+    
     app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
@@ -0,0 +1,171 @@
+"""
+批量检测命令行工具 - 通过HTTP接口提交目录或清单中的本地视频，查看进度、下载汇总报告
+视频由服务端在原位置读取，路径必须位于服务端配置的允许目录（FALL_DETECTION_BATCH_ROOTS）中
+
+用法:
+    python batch_cli.py submit --dir /data/cameras --recursive --wait
+    python batch_cli.py submit --manifest videos.txt --name 夜班回放
+    python batch_cli.py status <batch_id> [--wait] [--items]
+    python batch_cli.py report <batch_id> [--format csv] [-o events.csv]
+    python batch_cli.py cancel <batch_id>
+    python batch_cli.py list
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import urllib.error
+import urllib.request
+
+DEFAULT_SERVER = os.environ.get('FALL_DETECTION_SERVER', 'http://127.0.0.1:5000')
+
+
+def request(server, method, path, payload=None, raw=False):
+    """返回 (状态码, 解析后的JSON或原始内容)"""
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(server.rstrip('/') + path, data=data, method=method,
+                                 headers={'Content-Type': 'application/json'} if data else {})
+    try:
+        with urllib.request.urlopen(req, timeout=60) as response:
+            status, body = response.status, response.read()
+    except urllib.error.HTTPError as e:
+        status, body = e.code, e.read()
+    except urllib.error.URLError as e:
+        print(f"❌ 无法连接服务 {server}: {e.reason}", file=sys.stderr)
+        sys.exit(1)
+    if raw and status == 200:
+        return status, body
+    try:
+        return status, json.loads(body) if body else None
+    except ValueError:
+        return status, {'error': body.decode(errors='replace')}
+
+
+def check(status, payload, expected=(200, 201, 202)):
+    if status not in expected:
+        print(f"❌ HTTP {status}: {(payload or {}).get('error', payload)}", file=sys.stderr)
+        sys.exit(1)
+    return payload
+
+
+def print_status(batch, items=False):
+    counts = ', '.join(f"{name} {count}" for name, count in batch['counts'].items() if count)
+    print(f"📚 {batch['batch_id']} [{batch['status']}] {batch['progress']:.1f}% - {batch['videos']} 个视频 ({counts})")
+    if items:
+        for item in batch.get('items', []):
+            detail = item.get('error') or item.get('message') or ''
+            print(f"   {item['status']:<10} {item['progress']:>5.1f}%  {item['path']}  {detail}")
+
+
+def wait(server, batch_id, interval):
+    """轮询直到批次结束，返回最终状态"""
+    last = None
+    while True:
+        batch = check(*request(server, 'GET', f'/api/batches/{batch_id}'))
+        line = (batch['status'], batch['progress'], tuple(sorted(batch['counts'].items())))
+        if line != last:
+            print_status(batch)
+            last = line
+        if batch['status'] in ('completed', 'cancelled'):
+            return batch
+        time.sleep(interval)
+
+
+def print_report(batch):
+    report = batch.get('report')
+    if report:
+        print(f"📑 报告: {report['videos']} 个视频, {report['videos_with_falls']} 个含跌倒, "
+              f"共 {report['fall_events']} 个跌倒事件")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='跌倒检测批量任务')
+    parser.add_argument('--server', default=DEFAULT_SERVER, help='服务地址（默认环境变量FALL_DETECTION_SERVER）')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    submit = commands.add_parser('submit', help='提交批次')
+    source = submit.add_mutually_exclusive_group(required=True)
+    source.add_argument('--dir', help='服务端的视频目录')
+    source.add_argument('--manifest', help='服务端的清单文件（JSON或每行一个路径）')
+    source.add_argument('--paths', nargs='+', help='服务端的视频路径')
+    submit.add_argument('--recursive', action='store_true', help='包含子目录')
+    submit.add_argument('--name', help='批次名称')
+    submit.add_argument('--confidence', type=float)
+    submit.add_argument('--iou-threshold', type=float)
+    submit.add_argument('--priority', choices=['batch', 'normal', 'high'])
+    submit.add_argument('--wait', action='store_true', help='等待批次结束')
+
+    status = commands.add_parser('status', help='查看批次进度')
+    status.add_argument('batch_id')
+    status.add_argument('--items', action='store_true', help='列出每个视频的状态')
+    status.add_argument('--wait', action='store_true', help='等待批次结束')
+
+    report = commands.add_parser('report', help='下载批次报告')
+    report.add_argument('batch_id')
+    report.add_argument('--format', choices=['json', 'csv'], default='json')
+    report.add_argument('-o', '--output', help='保存路径（默认输出到终端）')
+
+    cancel = commands.add_parser('cancel', help='取消批次')
+    cancel.add_argument('batch_id')
+
+    commands.add_parser('list', help='列出最近的批次')
+
+    for sub in (submit, status):
+        sub.add_argument('--interval', type=float, default=2.0, help='等待时的轮询间隔（秒）')
+    args = parser.parse_args()
+    server = args.server
+
+    if args.command == 'submit':
+        payload = {'name': args.name, 'recursive': args.recursive}
+        if args.dir:
+            payload['directory'] = os.path.abspath(args.dir)
+        elif args.manifest:
+            payload['manifest_path'] = os.path.abspath(args.manifest)
+        else:
+            payload['manifest'] = [os.path.abspath(path) for path in args.paths]
+        for key, value in (('confidence', args.confidence), ('iou_threshold', args.iou_threshold),
+                           ('priority', args.priority)):
+            if value is not None:
+                payload[key] = value
+        created = check(*request(server, 'POST', '/api/batches', payload))
+        print(f"✅ 批次已提交: {created['batch_id']} ({created['queued']} 个视频待检测, {created['skipped']} 个无法读取)")
+        if args.wait:
+            print_report(wait(server, created['batch_id'], args.interval))
+
+    elif args.command == 'status':
+        if args.wait:
+            batch = wait(server, args.batch_id, args.interval)
+        else:
+            batch = check(*request(server, 'GET', f'/api/batches/{args.batch_id}'))
+            print_status(batch)
+        if args.items:
+            batch = check(*request(server, 'GET', f'/api/batches/{args.batch_id}?include=items'))
+            print_status(batch, items=True)
+        print_report(batch)
+
+    elif args.command == 'report':
+        code, body = request(server, 'GET', f'/api/batches/{args.batch_id}/report?format={args.format}', raw=True)
+        check(code, body, expected=(200,))
+        if args.output:
+            with open(args.output, 'wb') as f:
+                f.write(body)
+            print(f"✅ 报告已保存: {args.output}")
+        else:
+            sys.stdout.write(body.decode('utf-8'))
+
+    elif args.command == 'cancel':
+        result = check(*request(server, 'POST', f'/api/batches/{args.batch_id}/cancel'))
+        print(f"🛑 已取消: {result['cancelled']} 个未开始, {result['stopping']} 个正在停止")
+
+    elif args.command == 'list':
+        result = check(*request(server, 'GET', '/api/batches'))
+        for batch in result['batches']:
+            report = batch['report'] or {}
+            print(f"{batch['batch_id']}  {batch['status']:<10}  {batch['created_at']}  "
+                  f"{batch['name'] or ''}  {report.get('fall_events', '')}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+边上传边检测基准测试 - 按给定带宽模拟分块上传，对比"上传完成后再检测"（串行）与边上传边检测的
+首帧时间、首个跌倒事件时间和总耗时（均从开始上传起算）
+
+用法:
+    python benchmarks/bench_early_detection.py --video sample.avi
+    python benchmarks/bench_early_detection.py --video sample.mkv --bandwidth-mbps 20 --chunk-mb 2
+
+没有模型文件或ultralytics时使用演示检测器（演示事件在处理结束后生成，首个事件时间等于总耗时）。
+普通MP4的索引（moov）通常在文件末尾，前缀无法解码，边上传边检测会退化为串行；
+AVI/MKV或faststart的MP4可以在上传过程中开始检测。
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.resumable_upload import UploadSessionStore
+from utils.growing_video import UploadFollower
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'models')
+
+
+def create_detector(skip_frames):
+    try:
+        from utils.detector import FallDetector
+    except ImportError:
+        from utils.demo import DemoDetector
+        return DemoDetector(), 'demo'
+    detector = FallDetector(
+        fall_model_path=os.path.join(MODELS_DIR, 'best.pt'),
+        pose_model_path=os.path.join(MODELS_DIR, 'yolov8n-pose.pt'),
+        skip_frames=skip_frames
+    )
+    detector.warm_up()
+    return detector, 'yolo'
+
+
+def simulate_upload(store, upload_id, data, chunk_size, bandwidth, dest, on_complete=None):
+    """按带宽（字节/秒）顺序写入分块并合并，返回上传线程"""
+    def run():
+        for index in range((len(data) + chunk_size - 1) // chunk_size):
+            chunk = data[index * chunk_size:(index + 1) * chunk_size]
+            time.sleep(len(chunk) / bandwidth)
+            store.write_chunk(upload_id, index, io.BytesIO(chunk))
+        store.assemble(upload_id, dest)
+        if on_complete:
+            on_complete()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+class FirstFrameProbe:
+    """通过进度回调记录开始检测帧的时间"""
+
+    def __init__(self, t0):
+        self.t0 = t0
+        self.first_progress = None
+
+    def __call__(self, progress, message):
+        if self.first_progress is None and '帧' in message:
+            self.first_progress = time.time() - self.t0
+
+
+def run_serialized(detector, store, data, args, tmp):
+    session = store.create('bench' + args.ext, len(data))
+    dest = os.path.join(tmp, 'serialized' + args.ext)
+    t0 = time.time()
+    simulate_upload(store, session['upload_id'], data, store.chunk_size, args.bandwidth, dest).join()
+    upload_time = time.time() - t0
+
+    probe = FirstFrameProbe(t0)
+    detection_start = time.time()
+    result = detector.detect_video(dest, os.path.join(tmp, 'serialized_out.mp4'),
+                                   progress_callback=probe, with_llm_analysis=False)
+    first_event = (result.get('timing') or {}).get('first_event_time')
+    return {
+        'upload_time': upload_time,
+        'first_progress': probe.first_progress,
+        'time_to_first_event': detection_start - t0 + first_event if first_event is not None else None,
+        'wall_time': time.time() - t0,
+        'events': len(result.get('fall_events', []))
+    }
+
+
+def run_early(detector, store, data, args, tmp):
+    session = store.create('bench' + args.ext, len(data))
+    dest = os.path.join(tmp, 'early' + args.ext)
+    t0 = time.time()
+    follower = UploadFollower(store, session['upload_id'], dest, poll_interval=0.05)
+    simulate_upload(store, session['upload_id'], data, store.chunk_size, args.bandwidth, dest,
+                    on_complete=follower.finish)
+
+    probe = FirstFrameProbe(t0)
+    detection_start = time.time()
+    try:
+        result = detector.detect_video(dest, os.path.join(tmp, 'early_out.mp4'),
+                                       progress_callback=probe, with_llm_analysis=False, source=follower)
+    finally:
+        follower.close()
+    timing = result.get('timing') or {}
+    first_event = timing.get('first_event_time')
+    return {
+        'upload_time': follower.upload_completed - t0,
+        'first_progress': probe.first_progress,
+        'time_to_first_event': detection_start - t0 + first_event if first_event is not None else None,
+        'wall_time': time.time() - t0,
+        'events': len(result.get('fall_events', [])),
+        'input_wait_time': timing.get('input_wait_time', 0)
+    }
+
+
+def _fmt(value):
+    return f"{value:.2f}s" if value is not None else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='边上传边检测与串行流程的耗时对比')
+    parser.add_argument('--video', required=True, help='测试视频（AVI/MKV或faststart的MP4才能边上传边解码）')
+    parser.add_argument('--bandwidth-mbps', type=float, default=8.0, help='模拟上传带宽（Mbit/s）')
+    parser.add_argument('--chunk-mb', type=float, default=1.0, help='分块大小（MB）')
+    parser.add_argument('--skip-frames', type=int, default=5, help='跳帧间隔')
+    args = parser.parse_args()
+    args.bandwidth = args.bandwidth_mbps * 1000 * 1000 / 8
+    args.ext = os.path.splitext(args.video)[1] or '.mp4'
+
+    with open(args.video, 'rb') as f:
+        data = f.read()
+    detector, kind = create_detector(args.skip_frames)
+    print(f"视频 {len(data) / 1024 / 1024:.1f} MB, 带宽 {args.bandwidth_mbps} Mbit/s, "
+          f"分块 {args.chunk_mb} MB, 检测器: {kind}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = UploadSessionStore(os.path.join(tmp, 'sessions'), chunk_size=int(args.chunk_mb * 1024 * 1024))
+        # 两种流程的结果是在时间起点相同（开始上传）的前提下比较
+        for name, run in (('串行', run_serialized), ('边上传边检测', run_early)):
+            stats = run(detector, store, data, args, tmp)
+            print(f"[{name}] 上传 {_fmt(stats['upload_time'])}, 开始处理帧 {_fmt(stats['first_progress'])}, "
+                  f"首个事件 {_fmt(stats['time_to_first_event'])}, 总耗时 {_fmt(stats['wall_time'])}, "
+                  f"事件数 {stats['events']}"
+                  + (f", 等待上传数据 {_fmt(stats['input_wait_time'])}" if 'input_wait_time' in stats else ""))
+    detector.release()
+
+
+if __name__ == '__main__':
+    main()
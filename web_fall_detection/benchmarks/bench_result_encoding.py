@@ -0,0 +1,138 @@
+"""
+检测结果编码基准测试 - 对比原格式（事件字典列表，并在analysis.timeline、chart_data中重复两次）
+与列式事件表在大量事件时的JSON体积、gzip后体积，以及/status?include=result的序列化耗时
+
+用法:
+    python benchmarks/bench_result_encoding.py                  # 10000个事件
+    python benchmarks/bench_result_encoding.py --events 50000 --repeat 5
+
+原格式的/status需要解析已保存的结果再序列化；列式格式的结果JSON原样拼入响应。
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.analyzer import ResultAnalyzer
+from utils.columnar import compact_detection_result, expand_detection_result
+
+
+def generate_detection_result(count, seed):
+    """模拟长视频的检测结果（每个事件带边框、中心点，约一成有事件缩略图）"""
+    rng = random.Random(seed)
+    fps = 25.0
+    duration = max(600.0, count * 2.0)
+    timestamps = sorted(rng.uniform(0, duration) for _ in range(count))
+    fall_events, thumbnail_events = [], []
+    for index, timestamp in enumerate(timestamps):
+        x1, y1 = rng.uniform(0, 1600), rng.uniform(0, 800)
+        x2, y2 = x1 + rng.uniform(40, 300), y1 + rng.uniform(80, 280)
+        event = {
+            'frame': int(timestamp * fps),
+            'timestamp': timestamp,
+            'type': rng.choice(['sudden', 'sustained']),
+            'confidence': rng.uniform(0.5, 0.99),
+            'bbox': [x1, y1, x2, y2],
+            'center': [(x1 + x2) / 2, (y1 + y2) / 2]
+        }
+        if index % 10 == 0:
+            event['thumbnail'] = f"event_{index + 1:04d}.jpg"
+            thumbnail_events.append({'index': index, 'frame': event['frame'], 'timestamp': timestamp,
+                                     'file': event['thumbnail'], 'width': 320, 'height': 180, 'bytes': 14000})
+        fall_events.append(event)
+    return {
+        'video_info': {'width': 1920, 'height': 1080, 'fps': fps, 'total_frames': int(duration * fps),
+                       'duration': duration},
+        'fall_events': fall_events,
+        'llm_analysis': None,
+        'processing_time': duration / 4,
+        'thumbnails': {'events': thumbnail_events, 'sprite': {'interval': 10, 'sheets': []}}
+    }
+
+
+def legacy_analysis(analysis, fall_events):
+    """原分析器在统计数据之外为每个事件再生成的时间线和图表数据"""
+    analysis = dict(analysis)
+    analysis['chart_data'] = dict(
+        analysis['chart_data'],
+        timeline=[{'timestamp': e['timestamp'], 'frame': e['frame'], 'confidence': e['confidence'],
+                   'type': e['type']} for e in fall_events],
+        confidence_trend=[{'x': i + 1, 'y': e['confidence'], 'type': e['type']} for i, e in enumerate(fall_events)]
+    )
+    analysis['timeline'] = [{
+        'id': i + 1,
+        'time': f"{int(e['timestamp'] // 60):02d}:{int(e['timestamp'] % 60):02d}",
+        'timestamp': e['timestamp'],
+        'type': e['type'],
+        'confidence': e['confidence'],
+        'frame': e['frame'],
+        'thumbnail': e.get('thumbnail'),
+        'description': f"第{i + 1}次跌倒事件 ({e['type']}类型)"
+    } for i, e in enumerate(fall_events)]
+    return analysis
+
+
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def status_body(stored):
+    return json.dumps({'task_id': 'bench', 'status': 'completed'}, ensure_ascii=False)[:-1] + f', "result": {stored}}}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='检测结果原格式与列式格式的体积和序列化耗时对比')
+    parser.add_argument('--events', type=int, default=10000, help='跌倒事件数')
+    parser.add_argument('--repeat', type=int, default=3, help='每项计时重复次数（取最短）')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    detection = generate_detection_result(args.events, args.seed)
+    analysis = ResultAnalyzer().analyze_detection_result(detection)
+
+    legacy = {'detection_data': detection, 'analysis': legacy_analysis(analysis, detection['fall_events'])}
+    compact = {'detection_data': compact_detection_result(detection), 'analysis': analysis}
+    legacy_json = json.dumps(legacy, ensure_ascii=False)
+    compact_json = json.dumps(compact, ensure_ascii=False)
+
+    rows = {
+        # 原/status: 读取已保存的JSON并解析，再序列化为响应
+        'legacy': (legacy_json, lambda: json.dumps({'result': json.loads(legacy_json)}, ensure_ascii=False)),
+        # 列式/status: 已保存的JSON原样拼入响应
+        'columnar': (compact_json, lambda: status_body(compact_json))
+    }
+    print(f"{args.events} 个跌倒事件")
+    print(f"{'格式':<10}{'JSON':>12}{'gzip':>12}{'保存序列化':>12}{'/status':>12}")
+    results = {}
+    for name, (stored, respond) in rows.items():
+        source = legacy if name == 'legacy' else compact
+        body = respond().encode()
+        size, gzip_size = len(stored.encode()), len(gzip.compress(body, compresslevel=6))
+        save_time = best_time(lambda: json.dumps(source, ensure_ascii=False), args.repeat)
+        status_time = best_time(respond, args.repeat)
+        results[name] = (size, gzip_size, save_time, status_time)
+        print(f"{name:<12}{size / 1024:>10.0f}KB{gzip_size / 1024:>10.0f}KB"
+              f"{save_time * 1000:>12.1f}ms{status_time * 1000:>10.2f}ms")
+
+    legacy_row, compact_row = results['legacy'], results['columnar']
+    print(f"体积 {legacy_row[0] / compact_row[0]:.1f}x 更小（gzip传输 {legacy_row[0] / compact_row[1]:.1f}x），"
+          f"/status序列化 {legacy_row[3] / max(compact_row[3], 1e-9):.0f}x 更快")
+
+    # 展开（按旧格式返回或逐个读取事件）的耗时
+    expand_time = best_time(lambda: expand_detection_result(compact['detection_data']), args.repeat)
+    print(f"展开为事件字典列表: {expand_time * 1000:.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
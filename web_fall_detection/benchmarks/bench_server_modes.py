@@ -0,0 +1,199 @@
+"""
+部署模式基准测试 - 对比单进程（python app.py，检测在Web进程的线程中运行）与生产模式
+（gunicorn多进程 + detection_worker.py模型工作进程）在多个并发检测任务下的吞吐量和API延迟
+
+用法:
+    python benchmarks/bench_server_modes.py --video test.mp4
+    python benchmarks/bench_server_modes.py --video test.mp4 --jobs 8 --clients 16 --workers 2 --web-workers 4
+    python benchmarks/bench_server_modes.py --video test.mp4 --mode production
+
+每种模式依次启动服务、上传jobs份视频并同时开始检测，期间clients个客户端持续请求/status和/api/tasks，
+直到所有任务结束。任务写入应用的data和static目录，请在测试环境中运行。
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import signal
+import argparse
+import threading
+import subprocess
+import http.client
+
+WEB_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TERMINAL_STATUSES = ('completed', 'error', 'cancelled')
+
+
+def request(port, method, path, body=None, headers=None):
+    """返回 (状态码, 解析后的JSON或None, 耗时秒)"""
+    start = time.perf_counter()
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        data = response.read()
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - start
+    try:
+        payload = json.loads(data) if data else None
+    except ValueError:
+        payload = None
+    return response.status, payload, elapsed
+
+
+def upload(port, video_path, data):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="video"; '
+            f'filename="{os.path.basename(video_path)}"\r\nContent-Type: application/octet-stream\r\n\r\n').encode()
+    body += data + f'\r\n--{boundary}--\r\n'.encode()
+    status, payload, _ = request(port, 'POST', '/upload', body,
+                                 {'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    if status != 200:
+        raise RuntimeError(f"上传失败: HTTP {status} {payload}")
+    return payload['task_id']
+
+
+def wait_ready(port, timeout=300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            status, _, _ = request(port, 'GET', '/readyz')
+            if status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"服务在 {timeout}s 内未就绪")
+
+
+def start_single(port, workers):
+    code = (f"import app; app.WORKER_CONFIG['max_workers'] = {workers}; "
+            f"app.worker_pool.max_workers = {workers}; app.warm_up_models(); "
+            f"app.app.run(host='127.0.0.1', port={port}, threaded=True)")
+    env = dict(os.environ, FALL_DETECTION_MODE='inline')
+    return [subprocess.Popen([sys.executable, '-c', code], cwd=WEB_ROOT, env=env,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)]
+
+
+def start_production(port, workers, web_workers):
+    env = dict(os.environ, FALL_DETECTION_MODE='queue', FALL_DETECTION_BIND=f'127.0.0.1:{port}',
+               FALL_DETECTION_WEB_WORKERS=str(web_workers))
+    worker = subprocess.Popen([sys.executable, 'detection_worker.py', '--workers', str(workers)], cwd=WEB_ROOT,
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    web = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'], cwd=WEB_ROOT,
+                           env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    return [web, worker]
+
+
+def stop(processes):
+    for process in processes:
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for process in processes:
+        try:
+            process.wait(30)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(name, port, video_path, jobs, clients, seed):
+    data = open(video_path, 'rb').read()
+    task_ids = [upload(port, video_path, data) for _ in range(jobs)]
+
+    latencies = []
+    errors = [0]
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def client(rng):
+        while not done.is_set():
+            path = (f'/status/{rng.choice(task_ids)}' if rng.random() < 0.7
+                    else '/api/tasks?limit=20&status=processing')
+            try:
+                status, _, elapsed = request(port, 'GET', path)
+                with lock:
+                    latencies.append(elapsed)
+                    if status != 200:
+                        errors[0] += 1
+            except OSError:
+                with lock:
+                    errors[0] += 1
+
+    rng = random.Random(seed)
+    threads = [threading.Thread(target=client, args=(random.Random(rng.random()),), daemon=True)
+               for _ in range(clients)]
+    start = time.perf_counter()
+    for task_id in task_ids:
+        status, payload, _ = request(port, 'POST', f'/detect/{task_id}', json.dumps({}).encode(),
+                                     {'Content-Type': 'application/json'})
+        if status != 200:
+            raise RuntimeError(f"启动检测失败: HTTP {status} {payload}")
+    for thread in threads:
+        thread.start()
+
+    pending = set(task_ids)
+    statuses = {}
+    while pending:
+        time.sleep(0.5)
+        for task_id in list(pending):
+            _, payload, _ = request(port, 'GET', f'/status/{task_id}')
+            if payload and payload['status'] in TERMINAL_STATUSES:
+                statuses[task_id] = payload['status']
+                pending.discard(task_id)
+    wall_time = time.perf_counter() - start
+    done.set()
+    for thread in threads:
+        thread.join()
+
+    frames = 0
+    for task_id, status in statuses.items():
+        if status == 'completed':
+            _, payload, _ = request(port, 'GET', f'/status/{task_id}?include=result')
+            detection = (payload.get('result') or {}).get('detection_data') or {}
+            frames += (detection.get('video_info') or {}).get('total_frames', 0)
+    completed = sum(1 for status in statuses.values() if status == 'completed')
+
+    print(f"[{name}] {completed}/{jobs} 个任务完成, 总耗时 {wall_time:.1f}s, "
+          f"吞吐量 {completed / wall_time * 60:.1f} 任务/分钟, {frames / wall_time:.0f} 帧/秒")
+    print(f"[{name}] API延迟 ({len(latencies)} 次请求, {errors[0]} 次失败): "
+          f"p50 {percentile(latencies, 0.5) * 1000:.1f}ms, p95 {percentile(latencies, 0.95) * 1000:.1f}ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f}ms, 最大 {max(latencies) * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='单进程与生产模式的吞吐量、API延迟对比')
+    parser.add_argument('--video', required=True, help='测试视频')
+    parser.add_argument('--mode', choices=['both', 'single', 'production'], default='both')
+    parser.add_argument('--jobs', type=int, default=6, help='并发检测任务数')
+    parser.add_argument('--clients', type=int, default=8, help='并发API客户端数')
+    parser.add_argument('--workers', type=int, default=2, help='检测工作线程数（单进程）/工作进程数（生产模式）')
+    parser.add_argument('--web-workers', type=int, default=4, help='生产模式的gunicorn进程数')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    modes = ['single', 'production'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        processes = (start_single(args.port, args.workers) if mode == 'single'
+                     else start_production(args.port, args.workers, args.web_workers))
+        try:
+            wait_ready(args.port)
+            run(mode, args.port, os.path.abspath(args.video), args.jobs, args.clients, args.seed)
+        finally:
+            stop(processes)
+
+
+if __name__ == '__main__':
+    main()
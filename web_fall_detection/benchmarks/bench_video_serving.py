@@ -0,0 +1,156 @@
+"""
+视频服务基准测试 - 对比原1KB生成器与Range/零拷贝实现的吞吐量和拖动（seek）延迟
+
+用法:
+    python benchmarks/bench_video_serving.py                 # 生成500MB测试文件，本地对比两种实现
+    python benchmarks/bench_video_serving.py --size-mb 100 --seeks 20
+    python benchmarks/bench_video_serving.py --url http://127.0.0.1:8000/video/<task_id>
+        # 测试已部署的服务（如gunicorn，可走sendfile零拷贝路径）
+
+本地模式使用werkzeug开发服务器（没有wsgi.file_wrapper），零拷贝效果需用--url在gunicorn下测试。
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import http.client
+from urllib.parse import urlparse
+
+from flask import Flask, Response
+from werkzeug.serving import make_server
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.media import send_media, DEFAULT_CHUNK_SIZE
+
+SEEK_READ_BYTES = 64 * 1024  # 每次拖动后读取的字节数（约为播放器首次缓冲）
+
+
+def create_app(path, chunk_size):
+    """只包含两种视频服务实现的最小应用"""
+    app = Flask(__name__)
+
+    @app.route('/legacy')
+    def legacy():
+        # 原serve_video实现：1KB读取、忽略Range
+        def generate():
+            with open(path, 'rb') as f:
+                data = f.read(1024)
+                while data:
+                    yield data
+                    data = f.read(1024)
+        response = Response(generate(), mimetype='video/mp4')
+        response.headers.add('Accept-Ranges', 'bytes')
+        return response
+
+    @app.route('/media')
+    def media():
+        return send_media(path, chunk_size=chunk_size)
+
+    return app
+
+
+def _request(url, headers=None):
+    parsed = urlparse(url)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=300)
+    conn.request('GET', parsed.path or '/', headers=headers or {})
+    return conn, conn.getresponse()
+
+
+def measure_download(url):
+    """完整下载，返回 (字节数, 秒)"""
+    start = time.perf_counter()
+    conn, response = _request(url)
+    total = 0
+    while True:
+        data = response.read(1024 * 1024)
+        if not data:
+            break
+        total += len(data)
+    conn.close()
+    return total, time.perf_counter() - start
+
+
+def measure_seek(url, offset):
+    """
+    拖动到offset并读取SEEK_READ_BYTES字节所需时间
+
+    服务端忽略Range（返回200）时，只能从头读取到目标位置
+    """
+    start = time.perf_counter()
+    conn, response = _request(url, {'Range': f'bytes={offset}-{offset + SEEK_READ_BYTES - 1}'})
+    if response.status == 206:
+        response.read()
+    else:
+        need = offset + SEEK_READ_BYTES
+        received = 0
+        while received < need:
+            data = response.read(min(1024 * 1024, need - received))
+            if not data:
+                break
+            received += len(data)
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed, response.status
+
+
+def run(name, url, size, seeks, rng):
+    total, elapsed = measure_download(url)
+    print(f"[{name}] 完整下载: {total / 1024 / 1024:.0f} MB, {elapsed:.2f}s, "
+          f"{total / 1024 / 1024 / elapsed:.1f} MB/s")
+
+    latencies = []
+    status = None
+    for _ in range(seeks):
+        offset = rng.randrange(0, max(1, size - SEEK_READ_BYTES))
+        latency, status = measure_seek(url, offset)
+        latencies.append(latency)
+    latencies.sort()
+    print(f"[{name}] 拖动延迟 ({seeks}次, HTTP {status}): "
+          f"中位数 {latencies[len(latencies) // 2] * 1000:.1f}ms, 最大 {latencies[-1] * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='视频服务吞吐量与拖动延迟基准测试')
+    parser.add_argument('--size-mb', type=int, default=500, help='本地测试文件大小（MB）')
+    parser.add_argument('--seeks', type=int, default=10, help='拖动测试次数')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='读取块大小（字节）')
+    parser.add_argument('--url', help='测试已部署服务的视频地址（跳过本地对比）')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    if args.url:
+        conn, response = _request(args.url)
+        size = int(response.getheader('Content-Length', 0))
+        conn.close()
+        run('remote', args.url, size, args.seeks, rng)
+        return
+
+    size = args.size_mb * 1024 * 1024
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'output.mp4')
+        print(f"生成 {args.size_mb} MB 测试文件...")
+        with open(path, 'wb') as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(args.size_mb):
+                f.write(block)
+
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        server = make_server('127.0.0.1', 0, create_app(path, args.chunk_size), threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_port}"
+        try:
+            run('legacy 1KB', f"{base}/legacy", size, args.seeks, rng)
+            run(f'range {args.chunk_size // 1024}KB', f"{base}/media", size, args.seeks, rng)
+        finally:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
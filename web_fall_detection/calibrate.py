@@ -0,0 +1,85 @@
+"""
+性能校准命令行工具 - 在参考视频上用实际模型测试跳帧间隔、推理尺寸和线程数的组合，
+推荐（或直接应用）满足目标实时倍率和检测一致性的最省资源的配置，结果保存在data/performance_profile.json，
+Web服务和检测工作进程启动时读取
+
+用法:
+    python calibrate.py --clip samples/reference.mp4                  # 校准并应用
+    python calibrate.py --clip ref.mp4 --no-apply --target-rtf 2      # 只保存推荐配置
+    python calibrate.py --clip ref.mp4 --threads 1 2 --exhaustive     # 指定线程数，测试全部组合
+    python calibrate.py --show                                        # 查看保存的校准结果
+"""
+
+import os
+import sys
+import argparse
+
+# 在当前进程中加载模型运行校准
+os.environ['FALL_DETECTION_MODE'] = 'inline'
+
+import app as web
+
+
+def print_profile(profile):
+    print(f"📏 校准于 {profile['machine']['calibrated_at']}（{profile['machine']['hostname']}，"
+          f"{profile['machine']['cpu_count']} 核），参考视频 {profile['reference_clip']}")
+    print(f"   目标: 实时倍率 ≥ {profile['target']['rtf']}x，一致性 ≥ {profile['target']['min_agreement']}")
+    print(f"   {'跳帧':>4}{'尺寸':>6}{'线程':>6}{'实时倍率':>10}{'一致性':>8}{'核·秒':>8}")
+    recommended = profile['recommended']
+    for result in profile['results']:
+        mark = ' ←' if result == recommended else ''
+        print(f"   {result['skip_frames']:>5}{result['imgsz']:>8}{result['threads']:>8}"
+              f"{result['rtf']:>11.2f}x{result['agreement']:>9.2f}{result['cost']:>10.1f}{mark}")
+    status = '已应用' if profile['applied'] else '未应用（POST /api/performance/calibration/apply 应用）'
+    if profile['models'] != web.current_model_signature():
+        status = '已失效（模型已更新，需要重新校准）'
+    print(f"   推荐配置{'' if profile['meets_target'] else '（没有满足全部要求的配置，取最接近的）'}: "
+          f"跳帧={recommended['skip_frames']}, 尺寸={recommended['imgsz']}, 线程={recommended['threads']} - {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='跌倒检测性能校准')
+    parser.add_argument('--clip', default=web.CALIBRATION_CONFIG['reference_clip'],
+                        help='参考视频（默认环境变量FALL_DETECTION_CALIBRATION_CLIP）')
+    parser.add_argument('--apply', action=argparse.BooleanOptionalAction, default=web.CALIBRATION_CONFIG['apply'],
+                        help='校准后应用推荐配置')
+    parser.add_argument('--target-rtf', type=float, default=web.CALIBRATION_CONFIG['target_rtf'],
+                        help='目标实时倍率（视频时长 / 检测耗时）')
+    parser.add_argument('--min-agreement', type=float, default=web.CALIBRATION_CONFIG['min_agreement'],
+                        help='与最精确配置的最低检测一致性（0~1）')
+    parser.add_argument('--skip-frames', type=int, nargs='+', help='测试的跳帧间隔')
+    parser.add_argument('--imgsz', type=int, nargs='+', help='测试的推理尺寸（32的倍数）')
+    parser.add_argument('--threads', type=int, nargs='+', help='测试的线程数')
+    parser.add_argument('--exhaustive', action='store_true', help='测试全部组合')
+    parser.add_argument('--show', action='store_true', help='只显示保存的校准结果')
+    args = parser.parse_args()
+
+    if args.show:
+        profile = web.load_profile(web.PERFORMANCE_PROFILE_PATH)
+        if profile is None:
+            print("还没有校准结果")
+            return
+        print_profile(profile)
+        return
+
+    if web.DEMO_MODE:
+        print("❌ 检测模型不可用（演示模式），无法校准", file=sys.stderr)
+        sys.exit(1)
+    if not args.clip or not os.path.isfile(args.clip):
+        print("❌ 请用 --clip 指定参考视频（最好包含跌倒过程）", file=sys.stderr)
+        sys.exit(1)
+
+    grid = {key: values for key, values in (('skip_frames', args.skip_frames), ('imgsz', args.imgsz),
+                                            ('threads', args.threads)) if values}
+    try:
+        profile = web.calibrate_performance(args.clip, apply=args.apply, target_rtf=args.target_rtf,
+                                            min_agreement=args.min_agreement, grid=grid,
+                                            exhaustive=args.exhaustive)
+    except web.CalibrationError as e:
+        print(f"❌ {str(e)}", file=sys.stderr)
+        sys.exit(1)
+    print_profile(profile)
+
+
+if __name__ == '__main__':
+    main()
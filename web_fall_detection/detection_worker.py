@@ -0,0 +1,210 @@
+"""
+检测工作进程 - 生产模式下在独立的进程中运行检测任务，Web进程（gunicorn）只处理HTTP请求
+监督进程先加载模型权重，再fork出多个工作进程（模型内存写时复制共享，不必每个进程各加载一份；推理预热在fork后的各工作进程中进行），
+工作进程从任务队列（SQLite）按优先级领取任务；工作进程异常退出时其任务重新排队（有检查点的从检查点继续），
+并补充新的工作进程。配置了校准参考视频时，没有当前模型的性能校准结果则在启动工作进程前先校准
+
+用法:
+    python detection_worker.py                 # 工作进程数为WORKER_CONFIG['max_workers']
+    python detection_worker.py --workers 4
+    gunicorn -c gunicorn.conf.py wsgi:app      # 另行启动Web进程
+"""
+
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+import multiprocessing
+from datetime import datetime
+
+# 必须在导入app之前设置：app按部署模式决定是否在Web进程中运行检测
+os.environ['FALL_DETECTION_MODE'] = 'queue'
+# 用NVML检查CUDA是否可用，不在fork前初始化CUDA
+os.environ.setdefault('PYTORCH_NVML_BASED_CUDA_CHECK', '1')
+
+import app as web
+
+stopping = False
+
+
+def gpu_requested():
+    """检测是否会使用GPU（CUDA上下文不能跨fork使用，此时模型在各工作进程中加载）"""
+    if not web.PERFORMANCE_CONFIG['use_gpu']:
+        return False
+    try:
+        import torch
+    except ImportError:
+        return False
+    return torch.cuda.is_available()
+
+
+def fail_task(task_id, message):
+    web.task_store.update(
+        task_id,
+        status=web.TaskStatus.ERROR,
+        stage=web.TaskStage.DONE,
+        message=message,
+        error=message,
+        end_time=datetime.now().isoformat()
+    )
+    print(f"❌ 任务 {task_id}: {message}")
+
+
+def requeue_jobs(worker_id=None):
+    """把退出的工作进程领取的任务放回队列，多次领取仍未完成的任务标记为失败"""
+    requeued, exhausted = web.job_queue.requeue(worker_id)
+    for task_id in requeued:
+        web.task_store.update(task_id, stage=web.TaskStage.QUEUED, message='检测工作进程已退出，任务重新排队...')
+    for task_id in exhausted:
+        fail_task(task_id, '检测工作进程多次异常退出，任务已停止')
+    if requeued:
+        print(f"🔁 {len(requeued)} 个任务重新排队")
+
+
+def recover_jobs():
+    """启动时恢复上次运行留下的任务：已领取的重新排队，不在队列中的处理中任务标记为失败"""
+    requeue_jobs()
+    queued, offset = [], 0
+    while True:
+        tasks, _ = web.task_store.list(statuses=[web.TaskStatus.PROCESSING], limit=web.TASK_LIST_MAX_LIMIT,
+                                       offset=offset)
+        if not tasks:
+            break
+        offset += len(tasks)
+        queued.extend(task['id'] for task in tasks if web.job_queue.contains(task['id']))
+    interrupted = web.task_store.fail_interrupted(
+        web.TaskStatus.PROCESSING, web.TaskStatus.ERROR, '服务重启，检测任务已中断', exclude=queued)
+    if interrupted:
+        print(f"⚠️ {interrupted} 个未完成的检测任务因服务重启被标记为失败")
+    if queued:
+        print(f"📋 队列中有 {len(queued)} 个待检测任务")
+
+
+def worker_main(worker_id, preloaded):
+    """工作进程：依次领取并运行检测任务"""
+    # 停止信号由监督进程处理，工作进程被终止时未完成的任务由监督进程重新排队
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # 空白帧推理在fork之后进行，PyTorch的线程池在本进程中创建（已在fork前加载的模型直接从模型池取用）
+    if not web.warm_up_models():
+        sys.exit(1)
+    print(f"👷 检测工作进程 {worker_id} 已启动 (PID {os.getpid()}，模型{'继承自监督进程' if preloaded else '由本进程加载'})")
+
+    while True:
+        job = web.job_queue.claim(worker_id)
+        if job is None:
+            time.sleep(web.WORKER_CONFIG['poll_interval'])
+            continue
+        task_id = job['task_id']
+        print(f"📥 工作进程 {worker_id} 领取任务 {task_id}（排队 {job['wait_time']:.1f}s，第 {job['attempts']} 次）")
+        try:
+            web.run_detection_task(task_id, job['confidence'], job['iou_threshold'], None, job['priority'])
+        finally:
+            web.job_queue.complete(task_id)
+
+
+def calibrate_main(clip_path):
+    """校准子进程（spawn启动，不在监督进程中初始化CUDA和推理线程）"""
+    web.calibrate_performance(clip_path)
+
+
+def auto_calibrate():
+    """没有当前模型的校准结果且配置了参考视频时，在fork工作进程前完成校准，工作进程使用新的配置"""
+    clip_path = web.auto_calibration_clip()
+    if not clip_path:
+        return
+    print("📏 没有当前模型的性能校准结果，启动工作进程前先进行校准")
+    process = multiprocessing.get_context('spawn').Process(target=calibrate_main, args=(clip_path,),
+                                                           name='performance-calibration')
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        print(f"⚠️ 性能校准失败 (退出码 {process.exitcode})，使用当前性能配置")
+        return
+    web.calibration['needed'] = web.load_performance_profile()
+
+
+def handle_stop(signum, frame):
+    global stopping
+    stopping = True
+
+
+def supervise(count, preload):
+    """启动并看护工作进程，退出的工作进程按退避间隔重新启动"""
+    context = multiprocessing.get_context('fork')
+    prefix = f"{socket.gethostname()}-{os.getpid()}"
+    slots = [{'worker_id': None, 'process': None, 'started': 0.0, 'failures': 0, 'next_start': 0.0}
+             for _ in range(count)]
+    generation = 0
+
+    signal.signal(signal.SIGTERM, handle_stop)
+    signal.signal(signal.SIGINT, handle_stop)
+    try:
+        while not stopping:
+            now = time.time()
+            for index, slot in enumerate(slots):
+                process = slot['process']
+                if process is not None and not process.is_alive():
+                    lifetime = now - slot['started']
+                    print(f"⚠️ 工作进程 {slot['worker_id']} 已退出 (退出码 {process.exitcode}，运行 {lifetime:.0f}s)")
+                    requeue_jobs(slot['worker_id'])
+                    web.job_queue.remove_worker(slot['worker_id'])
+                    # 启动后很快退出（如模型加载失败）时逐次加长重启间隔
+                    slot['failures'] = slot['failures'] + 1 if lifetime < 60 else 0
+                    slot['next_start'] = now + min(60, 2 ** slot['failures'] - 1)
+                    slot['process'] = process = None
+                if process is None and now >= slot['next_start']:
+                    generation += 1
+                    slot['worker_id'] = f"{prefix}-w{index}.{generation}"
+                    slot['process'] = process = context.Process(
+                        target=worker_main, args=(slot['worker_id'], preload),
+                        name=f"detection-worker-{index}", daemon=True
+                    )
+                    process.start()
+                    slot['started'] = now
+                if process is not None:
+                    web.job_queue.heartbeat(slot['worker_id'], process.pid)
+            time.sleep(web.WORKER_CONFIG['heartbeat_interval'])
+    finally:
+        print("🛑 正在停止检测工作进程...")
+        for slot in slots:
+            if slot['process'] is not None and slot['process'].is_alive():
+                slot['process'].terminate()
+        for slot in slots:
+            if slot['process'] is not None:
+                slot['process'].join(10)
+                if slot['process'].is_alive():
+                    slot['process'].kill()
+                    slot['process'].join()
+                requeue_jobs(slot['worker_id'])
+                web.job_queue.remove_worker(slot['worker_id'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='跌倒检测模型工作进程')
+    parser.add_argument('--workers', type=int, default=web.WORKER_CONFIG['max_workers'], help='工作进程数')
+    parser.add_argument('--no-preload', action='store_true', help='不在fork前加载模型（各工作进程分别加载）')
+    args = parser.parse_args()
+
+    recover_jobs()
+    web.backfill_storage()
+    auto_calibrate()
+
+    preload = web.WORKER_CONFIG['preload_models'] and not args.no_preload
+    if preload and gpu_requested():
+        print("⚠️ 使用GPU时CUDA不能在fork前初始化，模型改为在各工作进程中加载")
+        preload = False
+    if preload:
+        # 在主线程中同步加载模型权重（不推理），并等待LLM服务线程加载完GGUF模型，
+        # fork时没有正在加载模型（持有锁）的线程，也没有PyTorch推理线程池
+        if not web.warm_up_models(wait_llm=True, inference=False):
+            sys.exit(1)
+
+    print(f"🚀 启动 {args.workers} 个检测工作进程（模型{'已在fork前加载' if preload else '在各进程中加载'}）")
+    supervise(args.workers, preload)
+
+
+if __name__ == '__main__':
+    main()
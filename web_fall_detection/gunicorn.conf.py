@@ -0,0 +1,22 @@
+"""
+gunicorn配置（生产模式）: gunicorn -c gunicorn.conf.py wsgi:app
+检测在detection_worker.py的工作进程中运行，Web进程只处理请求，不加载模型
+"""
+
+import os
+import multiprocessing
+
+bind = os.environ.get('FALL_DETECTION_BIND', '0.0.0.0:5000')
+
+# 多进程处理请求；每个进程多线程，SSE进度推送等长连接不会占满进程
+workers = int(os.environ.get('FALL_DETECTION_WEB_WORKERS', min(8, multiprocessing.cpu_count() * 2 + 1)))
+worker_class = 'gthread'
+threads = int(os.environ.get('FALL_DETECTION_WEB_THREADS', 16))
+
+# 上传大文件和长时间的SSE连接
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+raw_env = ['FALL_DETECTION_MODE=queue']
+accesslog = '-'
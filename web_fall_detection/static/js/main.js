@@ -10,6 +10,8 @@ class FallDetectionApp {
         this.isProcessing = false;
         this.currentVideoURL = null; // 存储当前预览视频的blob URL
         this.currentResultVideoURL = null; // 存储当前结果视频的blob URL
+        this.uploadConcurrency = 3; // 并行上传的分块数
+        this.uploadMaxRetries = 8;  // 单个分块的最大重试次数
         
         this.initializeElements();
         this.bindEvents();
@@ -28,8 +30,10 @@ class FallDetectionApp {
         // 按钮元素
         this.uploadBtn = document.getElementById('uploadBtn');
         this.detectBtn = document.getElementById('detectBtn');
+        this.earlyDetectionToggle = document.getElementById('earlyDetection');
         this.viewDetailsBtn = document.getElementById('viewDetailsBtn');
         this.downloadBtn = document.getElementById('downloadBtn');
+        this.cancelBtn = document.getElementById('cancelBtn');
         
         // 状态显示元素
         this.statusSection = document.getElementById('statusSection');
@@ -37,6 +41,8 @@ class FallDetectionApp {
         this.progressBar = document.getElementById('progressBar');
         this.progressPercent = document.getElementById('progressPercent');
         this.progressMessage = document.getElementById('progressMessage');
+        this.livePreview = document.getElementById('livePreview');
+        this.livePreviewVideo = document.getElementById('livePreviewVideo');
         this.quickResults = document.getElementById('quickResults');
         
         // 结果显示元素
@@ -69,6 +75,7 @@ class FallDetectionApp {
         this.detectBtn.addEventListener('click', this.startDetection.bind(this));
         this.viewDetailsBtn.addEventListener('click', this.viewDetails.bind(this));
         this.downloadBtn.addEventListener('click', this.downloadResult.bind(this));
+        this.cancelBtn.addEventListener('click', this.cancelDetection.bind(this));
     }
 
     // 拖拽处理
@@ -162,6 +169,7 @@ class FallDetectionApp {
         
         // 清理视频元素
         this.previewVideo.src = '';
+        this.stopLivePreview();
         if (this.resultVideo) {
             this.resultVideo.src = '';
         }
@@ -224,42 +232,172 @@ class FallDetectionApp {
         this.setLoading(this.uploadBtn, true, '上传中...');
         
         try {
-            const formData = new FormData();
-            formData.append('video', this.selectedFile);
+            const early = this.earlyDetectionToggle && this.earlyDetectionToggle.checked;
+            const result = await this.uploadResumable(
+                this.selectedFile, early ? (session) => this.startEarlyDetection(session) : null);
+            console.log('响应结果:', result);
 
-            console.log('FormData创建完成，开始发送请求');
+            this.currentTaskId = result.task_id;
+            if (result.early_detection) {
+                // 检测已在上传过程中进行，进度监控已启动
+                this.uploadBtn.style.display = 'none';
+                console.log('上传完成，检测继续进行，任务ID:', this.currentTaskId);
+                return;
+            }
+            this.showStatus(`视频上传成功: ${result.filename}`, 'success');
+            
+            // 显示检测按钮
+            this.uploadBtn.style.display = 'none';
+            this.detectBtn.style.display = 'block';
+            this.detectBtn.disabled = false;
+            
+            console.log('上传成功，任务ID:', this.currentTaskId);
+        } catch (error) {
+            console.error('上传过程中发生错误:', error);
+            this.showError('上传失败: ' + error.message);
+        } finally {
+            this.setLoading(this.uploadBtn, false, '上传视频');
+        }
+    }
 
-            const response = await fetch('/upload', {
+    // 断点续传上传：分块并行上传，断线后从已接收的分块继续
+    // onSession在会话创建（或恢复）后、上传分块前调用
+    async uploadResumable(file, onSession = null) {
+        const resumeKey = `upload:${file.name}:${file.size}:${file.lastModified}`;
+        let session = null;
+
+        // 同一文件之前未完成的会话（刷新页面或断线后）直接续传
+        const savedId = localStorage.getItem(resumeKey);
+        if (savedId) {
+            const response = await fetch(`/uploads/${savedId}`);
+            if (response.ok) {
+                session = await response.json();
+                console.log(`续传会话 ${savedId}，已接收 ${session.received.length}/${session.total_chunks} 个分块`);
+            } else {
+                localStorage.removeItem(resumeKey);
+            }
+        }
+
+        if (!session) {
+            const response = await fetch('/uploads', {
                 method: 'POST',
-                body: formData
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({filename: file.name, size: file.size})
             });
+            session = await response.json();
+            if (!response.ok) {
+                throw new Error(session.error || '创建上传会话失败');
+            }
+            localStorage.setItem(resumeKey, session.upload_id);
+        }
 
-            console.log('响应状态:', response.status, response.statusText);
+        if (onSession) {
+            await onSession(session);
+        }
 
+        const received = new Set(session.received);
+        const pending = [];
+        for (let i = 0; i < session.total_chunks; i++) {
+            if (!received.has(i)) pending.push(i);
+        }
+        let doneBytes = session.received.reduce(
+            (sum, i) => sum + Math.min(session.chunk_size, session.size - i * session.chunk_size), 0);
+
+        const updateProgress = () => {
+            const percent = Math.floor(doneBytes / session.size * 100);
+            this.uploadBtn.innerHTML = `<span class="loading-spinner me-2"></span>上传中 ${percent}%`;
+        };
+        updateProgress();
+
+        // 多个分块并行上传
+        const worker = async () => {
+            while (pending.length > 0) {
+                const index = pending.shift();
+                const size = await this.uploadChunk(session, file, index);
+                doneBytes += size;
+                updateProgress();
+            }
+        };
+        const concurrency = Math.min(this.uploadConcurrency, pending.length) || 1;
+        await Promise.all(Array.from({length: concurrency}, worker));
+
+        const response = await fetch(`/uploads/${session.upload_id}/complete`, {method: 'POST'});
+        const result = await response.json();
+        if (response.status !== 409) {
+            // 合并完成或文件被拒绝后会话不再可用
+            localStorage.removeItem(resumeKey);
+        }
+        if (!response.ok) {
+            throw new Error(result.error || '上传失败');
+        }
+        return result;
+    }
+
+    // 边上传边检测：上传分块前启动检测，未能启动时按普通流程在上传完成后手动开始检测
+    async startEarlyDetection(session) {
+        try {
+            const response = await fetch(`/uploads/${session.upload_id}/detect`, {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify(this.getDetectionParams())
+            });
             const result = await response.json();
-            console.log('响应结果:', result);
 
-            if (response.ok) {
+            // 409表示续传的会话已在检测中，继续监控原任务
+            if (response.ok || response.status === 409) {
                 this.currentTaskId = result.task_id;
-                this.showStatus(`视频上传成功: ${result.filename}`, 'success');
-                
-                // 显示检测按钮
-                this.uploadBtn.style.display = 'none';
-                this.detectBtn.style.display = 'block';
-                this.detectBtn.disabled = false;
-                
-                console.log('上传成功，任务ID:', this.currentTaskId);
-                
+                this.isProcessing = true;
+                this.startProgressMonitoring();
             } else {
-                console.error('上传失败:', result.error);
-                this.showError(result.error || '上传失败');
+                console.warn('边上传边检测未启动:', result.error);
             }
         } catch (error) {
-            console.error('上传过程中发生错误:', error);
-            console.error('错误详情:', error.stack);
-            this.showError('上传过程中发生错误: ' + error.message);
-        } finally {
-            this.setLoading(this.uploadBtn, false, '上传视频');
+            console.warn('边上传边检测未启动:', error.message);
+        }
+    }
+
+    getDetectionParams() {
+        return {
+            confidence: parseFloat(document.getElementById('detectionConf').value),
+            iou_threshold: parseFloat(document.getElementById('iouThreshold').value)
+        };
+    }
+
+    // 上传单个分块，失败时按指数退避重试
+    async uploadChunk(session, file, index) {
+        const start = index * session.chunk_size;
+        const blob = file.slice(start, Math.min(start + session.chunk_size, session.size));
+        const headers = {'Content-Type': 'application/octet-stream'};
+        if (window.crypto && window.crypto.subtle) {
+            // crypto.subtle仅在HTTPS或localhost下可用，其他情况只校验分块长度
+            const digest = await window.crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+            headers['X-Chunk-SHA256'] = Array.from(new Uint8Array(digest))
+                .map(b => b.toString(16).padStart(2, '0')).join('');
+        }
+
+        for (let attempt = 0; ; attempt++) {
+            try {
+                const response = await fetch(`/uploads/${session.upload_id}/chunks/${index}`, {
+                    method: 'PUT',
+                    headers: headers,
+                    body: blob
+                });
+                if (response.ok) {
+                    return blob.size;
+                }
+                const result = await response.json().catch(() => ({}));
+                if (response.status === 404 || response.status === 413) {
+                    throw Object.assign(new Error(result.error || '上传会话已失效'), {fatal: true});
+                }
+                throw new Error(result.error || `分块 ${index} 上传失败 (${response.status})`);
+            } catch (error) {
+                if (error.fatal || attempt >= this.uploadMaxRetries) {
+                    throw error;
+                }
+                const delay = Math.min(30000, 1000 * 2 ** attempt);
+                console.warn(`分块 ${index} 上传失败，${delay / 1000}秒后重试:`, error.message);
+                await new Promise(resolve => setTimeout(resolve, delay));
+            }
         }
     }
 
@@ -275,10 +413,7 @@ class FallDetectionApp {
         this.detectBtn.disabled = true;
 
         try {
-            const params = {
-                confidence: parseFloat(document.getElementById('detectionConf').value),
-                iou_threshold: parseFloat(document.getElementById('iouThreshold').value)
-            };
+            const params = this.getDetectionParams();
 
             const response = await fetch(`/detect/${this.currentTaskId}`, {
                 method: 'POST',
@@ -290,6 +425,14 @@ class FallDetectionApp {
 
             const result = await response.json();
 
+            if (response.status === 503 && result.warming) {
+                // 模型仍在预热，按服务端建议的间隔重试
+                const retryAfter = parseInt(response.headers.get('Retry-After') || '3', 10);
+                this.showStatus(result.error || '模型预热中，请稍候...', 'info');
+                setTimeout(() => this.startDetection(), retryAfter * 1000);
+                return;
+            }
+
             if (response.ok) {
                 this.showStatus('检测任务已启动', 'info');
                 this.startProgressMonitoring();
@@ -311,6 +454,54 @@ class FallDetectionApp {
         this.progressSection.style.display = 'block';
         this.statusSection.style.display = 'none';
         
+        if (!window.EventSource) {
+            this.startProgressPolling();
+            return;
+        }
+
+        // 服务端只在进度或阶段变化时推送事件
+        const source = new EventSource(`/events/${this.currentTaskId}`);
+        this.progressSource = source;
+
+        source.addEventListener('progress', (event) => {
+            this.updateProgress(JSON.parse(event.data));
+        });
+
+        source.addEventListener('completed', () => {
+            this.stopProgressStream();
+            this.fetchFinalStatus();
+        });
+
+        source.addEventListener('failed', (event) => {
+            this.stopProgressStream();
+            this.onDetectionError(JSON.parse(event.data));
+        });
+
+        source.addEventListener('cancelled', (event) => {
+            this.stopProgressStream();
+            this.onDetectionCancelled(JSON.parse(event.data));
+        });
+
+        source.onerror = () => {
+            // 连接异常（或代理不支持流式响应）时回退到轮询
+            if (this.progressSource === source) {
+                console.warn('进度推送连接中断，改为轮询');
+                this.stopProgressStream();
+                this.startProgressPolling();
+            }
+        };
+    }
+
+    stopProgressStream() {
+        if (this.progressSource) {
+            this.progressSource.close();
+            this.progressSource = null;
+        }
+    }
+
+    // 轮询进度（不支持SSE时的备用方案）
+    startProgressPolling() {
+        clearInterval(this.progressInterval);
         this.progressInterval = setInterval(async () => {
             try {
                 const response = await fetch(`/status/${this.currentTaskId}`);
@@ -320,9 +511,12 @@ class FallDetectionApp {
                     this.updateProgress(status);
                     
                     if (status.status === 'completed') {
-                        this.onDetectionComplete(status);
+                        clearInterval(this.progressInterval);
+                        this.fetchFinalStatus();
                     } else if (status.status === 'error') {
                         this.onDetectionError(status);
+                    } else if (status.status === 'cancelled') {
+                        this.onDetectionCancelled(status);
                     }
                 } else {
                     console.error('获取状态失败:', status);
@@ -333,6 +527,21 @@ class FallDetectionApp {
         }, 1000);
     }
 
+    // 任务完成后获取一次包含检测结果的状态
+    async fetchFinalStatus() {
+        try {
+            const response = await fetch(`/status/${this.currentTaskId}?include=result`);
+            const status = await response.json();
+            if (response.ok) {
+                this.onDetectionComplete(status);
+            } else {
+                this.onDetectionError(status);
+            }
+        } catch (error) {
+            this.onDetectionError({message: error.message});
+        }
+    }
+
     // 更新进度显示
     updateProgress(status) {
         const progress = Math.min(status.progress || 0, 100);
@@ -340,6 +549,10 @@ class FallDetectionApp {
         this.progressPercent.textContent = progress + '%';
         this.progressMessage.textContent = status.message || '处理中...';
         
+        if (status.preview_url) {
+            this.showLivePreview(status.preview_url);
+        }
+        
         // 更新进度条颜色
         if (progress < 30) {
             this.progressBar.className = 'progress-bar progress-bar-striped progress-bar-animated bg-info';
@@ -350,16 +563,50 @@ class FallDetectionApp {
         }
     }
 
+    // 处理中预览：Safari原生支持HLS，其他浏览器使用hls.js
+    showLivePreview(url) {
+        if (!this.livePreview || this.livePreviewUrl === url) {
+            return;
+        }
+        const video = this.livePreviewVideo;
+        if (video.canPlayType('application/vnd.apple.mpegurl')) {
+            video.src = url;
+        } else if (window.Hls && Hls.isSupported()) {
+            this.hls = new Hls();
+            this.hls.loadSource(url);
+            this.hls.attachMedia(video);
+        } else {
+            return;
+        }
+        this.livePreviewUrl = url;
+        this.livePreview.style.display = 'block';
+    }
+
+    stopLivePreview() {
+        if (!this.livePreview) {
+            return;
+        }
+        if (this.hls) {
+            this.hls.destroy();
+            this.hls = null;
+        }
+        this.livePreviewVideo.removeAttribute('src');
+        this.livePreviewVideo.load();
+        this.livePreviewUrl = null;
+        this.livePreview.style.display = 'none';
+    }
+
     // 检测完成处理
     onDetectionComplete(status) {
         clearInterval(this.progressInterval);
         this.isProcessing = false;
+        this.stopLivePreview();
         
         // 隐藏进度条
         this.progressSection.style.display = 'none';
         
         // 显示结果
-        this.showQuickResults(status.result);
+        this.showQuickResults(status.result, status.llm_status);
         
         // 启用操作按钮
         this.viewDetailsBtn.disabled = false;
@@ -371,10 +618,48 @@ class FallDetectionApp {
         this.showStatus('检测完成！', 'success');
     }
 
+    // 取消检测（运行中的任务在当前帧处理完后停止）
+    async cancelDetection() {
+        if (!this.currentTaskId || !confirm('确定要取消当前检测任务吗？')) {
+            return;
+        }
+        this.setLoading(this.cancelBtn, true, '取消中');
+        try {
+            const response = await fetch(`/cancel/${this.currentTaskId}`, {method: 'POST'});
+            const result = await response.json();
+            if (!response.ok) {
+                this.showError(result.error || '取消失败');
+                this.setLoading(this.cancelBtn, false, '<i class="fas fa-stop me-1"></i>取消');
+            } else if (result.status === 'cancelled') {
+                this.onDetectionCancelled(result);
+            }
+        } catch (error) {
+            this.showError('取消失败: ' + error.message);
+            this.setLoading(this.cancelBtn, false, '<i class="fas fa-stop me-1"></i>取消');
+        }
+    }
+
+    onDetectionCancelled(status) {
+        clearInterval(this.progressInterval);
+        this.stopProgressStream();
+        this.isProcessing = false;
+        this.stopLivePreview();
+        this.setLoading(this.cancelBtn, false, '<i class="fas fa-stop me-1"></i>取消');
+        
+        this.progressSection.style.display = 'none';
+        this.statusSection.style.display = 'block';
+        this.showStatus(status.message || '任务已取消', 'warning');
+        // 已取消的任务不能再次检测，需要重新上传
+        this.setLoading(this.detectBtn, false, '开始检测');
+        this.detectBtn.disabled = true;
+        this.loadTaskHistory();
+    }
+
     // 检测错误处理
     onDetectionError(status) {
         clearInterval(this.progressInterval);
         this.isProcessing = false;
+        this.stopLivePreview();
         
         this.progressSection.style.display = 'none';
         this.statusSection.style.display = 'block';
@@ -385,7 +670,7 @@ class FallDetectionApp {
     }
 
     // 显示快速结果
-    showQuickResults(result) {
+    showQuickResults(result, llmStatus = null) {
         if (!result || !result.analysis) {
             return;
         }
@@ -410,11 +695,87 @@ class FallDetectionApp {
         this.quickResults.style.display = 'block';
         
         // 显示AI智能建议
-        this.showAIRecommendations(result, analysis);
+        this.showAIRecommendations(result, analysis, llmStatus);
+        
+        // LLM分析在检测完成后异步生成，流式补充显示
+        if (llmStatus === 'pending') {
+            this.streamLLMAnalysis(result, analysis);
+        }
+    }
+    
+    // 通过SSE逐token接收LLM分析，不支持或连接失败时回退到轮询
+    streamLLMAnalysis(result, analysis) {
+        if (!window.EventSource) {
+            this.waitForLLMAnalysis(result, analysis);
+            return;
+        }
+        
+        const taskId = this.currentTaskId;
+        if (this.llmSource) {
+            this.llmSource.close();
+        }
+        const source = new EventSource(`/stream/llm/${taskId}`);
+        this.llmSource = source;
+        let streamText = null;
+        
+        source.addEventListener('token', (e) => {
+            const data = JSON.parse(e.data);
+            const container = this.quickResults.querySelector('.ai-analysis-text');
+            if (!container || taskId !== this.currentTaskId) {
+                return;
+            }
+            if (!streamText) {
+                container.innerHTML = '';
+                container.classList.remove('text-muted');
+                streamText = document.createElement('div');
+                streamText.className = 'llm-stream-text';
+                container.appendChild(streamText);
+            }
+            streamText.textContent += data.text;
+        });
+        
+        source.addEventListener('done', (e) => {
+            const data = JSON.parse(e.data);
+            source.close();
+            if (taskId === this.currentTaskId) {
+                result.llm_analysis = data.llm_analysis;
+                this.showAIRecommendations(result, analysis, data.llm_status);
+            }
+        });
+        
+        source.onerror = () => {
+            if (source.readyState !== EventSource.CLOSED) {
+                source.close();
+            }
+            this.waitForLLMAnalysis(result, analysis);
+        };
+    }
+    
+    // 等待异步LLM分析完成
+    waitForLLMAnalysis(result, analysis) {
+        const taskId = this.currentTaskId;
+        clearInterval(this.llmInterval);
+        this.llmInterval = setInterval(async () => {
+            if (taskId !== this.currentTaskId) {
+                clearInterval(this.llmInterval);
+                return;
+            }
+            try {
+                const response = await fetch(`/llm_analysis/${taskId}`);
+                const data = await response.json();
+                if (response.ok && data.llm_status !== 'pending') {
+                    clearInterval(this.llmInterval);
+                    result.llm_analysis = data.llm_analysis;
+                    this.showAIRecommendations(result, analysis, data.llm_status);
+                }
+            } catch (error) {
+                console.error('获取AI分析失败:', error);
+            }
+        }, 2000);
     }
     
     // 显示AI智能建议
-    showAIRecommendations(result, analysis) {
+    showAIRecommendations(result, analysis, llmStatus = null) {
         // 清除之前的建议显示
         const existingAI = this.quickResults.querySelector('.ai-recommendations');
         if (existingAI) {
@@ -447,6 +808,24 @@ class FallDetectionApp {
                     </div>
                 </div>
             `;
+        } else if (llmStatus === 'pending') {
+            aiContent += `
+                <div class="ai-analysis-card mb-3">
+                    <div class="card border-0 shadow-sm">
+                        <div class="card-header bg-gradient-primary text-white py-2">
+                            <div class="d-flex align-items-center">
+                                <i class="fas fa-brain me-2"></i>
+                                <span class="fw-bold">AI智能分析</span>
+                            </div>
+                        </div>
+                        <div class="card-body p-3">
+                            <div class="ai-analysis-text compact text-muted">
+                                <i class="fas fa-spinner fa-spin me-2"></i>AI分析生成中...
+                            </div>
+                        </div>
+                    </div>
+                </div>
+            `;
         }
         
         // 显示关怀建议
@@ -482,7 +861,7 @@ class FallDetectionApp {
         }
         
         // 如果没有AI分析，显示基本提示
-        if (!result.llm_analysis && (!analysis.recommendations || analysis.recommendations.length === 0)) {
+        if (!result.llm_analysis && llmStatus !== 'pending' && (!analysis.recommendations || analysis.recommendations.length === 0)) {
             aiContent = `
                 <div class="alert alert-info text-center">
                     <i class="fas fa-info-circle me-2"></i>
@@ -731,7 +1110,8 @@ class FallDetectionApp {
             'pending': '等待中',
             'processing': '处理中',
             'completed': '已完成',
-            'error': '失败'
+            'error': '失败',
+            'cancelled': '已取消'
         };
         return statusTexts[status] || status;
     }
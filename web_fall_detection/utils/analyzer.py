@@ -23,7 +23,7 @@ class ResultAnalyzer:
             detection_result: 检测结果字典
             
         Returns:
-            dict: 分析结果
+            dict: 分析结果（只含统计数据；逐事件的时间线和图表数据由检测结果的事件表生成，不重复保存）
         """
         fall_events = detection_result.get('fall_events', [])
         video_info = detection_result.get('video_info', {})
@@ -68,8 +68,7 @@ class ResultAnalyzer:
             'time_analysis': time_analysis,
             'confidence_analysis': confidence_analysis,
             'chart_data': chart_data,
-            'recommendations': recommendations,
-            'timeline': self._generate_timeline(fall_events)
+            'recommendations': recommendations
         }
     
     def _generate_no_fall_analysis(self, video_info):
@@ -97,16 +96,13 @@ class ResultAnalyzer:
                 'distribution': []
             },
             'chart_data': {
-                'timeline': [],
-                'confidence_trend': [],
                 'risk_heatmap': []
             },
             'recommendations': [
                 "✅ 视频中未检测到跌倒事件",
                 "📊 活动状态正常",
                 "🔍 建议定期检查以确保居家安全"
-            ],
-            'timeline': []
+            ]
         }
     
     def _analyze_time_distribution(self, timestamps, duration):
@@ -182,28 +178,9 @@ class ResultAnalyzer:
         return base_level
     
     def _generate_chart_data(self, fall_events, video_info):
-        """生成图表数据"""
+        """生成图表数据（事件时间线和置信度趋势直接使用事件表，这里只生成按时间分段的汇总）"""
         if not fall_events:
-            return {'timeline': [], 'confidence_trend': [], 'risk_heatmap': []}
-        
-        # 时间轴数据
-        timeline_data = []
-        for event in fall_events:
-            timeline_data.append({
-                'timestamp': event['timestamp'],
-                'frame': event['frame'],
-                'confidence': event['confidence'],
-                'type': event['type']
-            })
-        
-        # 置信度趋势
-        confidence_trend = []
-        for i, event in enumerate(fall_events):
-            confidence_trend.append({
-                'x': i + 1,
-                'y': event['confidence'],
-                'type': event['type']
-            })
+            return {'risk_heatmap': []}
         
         # 风险热力图（按时间分段）
         duration = video_info.get('duration', 0)
@@ -234,8 +211,6 @@ class ResultAnalyzer:
             risk_heatmap = []
         
         return {
-            'timeline': timeline_data,
-            'confidence_trend': confidence_trend,
             'risk_heatmap': risk_heatmap
         }
     
@@ -333,22 +308,3 @@ class ResultAnalyzer:
             ])
         
         return recommendations
-    
-    def _generate_timeline(self, fall_events):
-        """生成事件时间轴"""
-        timeline = []
-        for i, event in enumerate(fall_events):
-            minutes = int(event['timestamp'] // 60)
-            seconds = int(event['timestamp'] % 60)
-            
-            timeline.append({
-                'id': i + 1,
-                'time': f"{minutes:02d}:{seconds:02d}",
-                'timestamp': event['timestamp'],
-                'type': event['type'],
-                'confidence': event['confidence'],
-                'frame': event['frame'],
-                'description': f"第{i+1}次跌倒事件 ({event['type']}类型)"
-            })
-        
-        return timeline
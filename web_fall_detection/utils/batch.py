@@ -0,0 +1,294 @@
+"""
+批量任务 - 一次提交一个目录或清单中的多个本地视频，视频在原位置读取（不复制到上传目录）
+批次和条目记录在SQLite文件中，多个工作进程按全局并发上限从中领取待检测的条目
+"""
+
+import os
+import json
+import time
+import sqlite3
+from contextlib import contextmanager
+
+VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'wmv'}
+
+
+class BatchError(Exception):
+    """批量任务参数错误"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def is_within(path, roots):
+    """path（已解析符号链接）是否位于某个允许的目录下"""
+    for root in roots:
+        root = os.path.realpath(root)
+        if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+            return True
+    return False
+
+
+def read_manifest(manifest_path):
+    """
+    读取清单文件：JSON（路径列表或 {"videos": [...]}）或每行一个路径的文本（#开头为注释），
+    相对路径相对于清单所在目录
+    """
+    with open(manifest_path, encoding='utf-8') as f:
+        content = f.read()
+    if manifest_path.lower().endswith('.json'):
+        data = json.loads(content)
+        paths = data.get('videos', []) if isinstance(data, dict) else data
+    else:
+        paths = [line.strip() for line in content.splitlines() if line.strip() and not line.startswith('#')]
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    return [os.path.join(base, str(path)) for path in paths]
+
+
+def collect_videos(roots, directory=None, recursive=False, manifest=None, manifest_path=None, max_videos=None):
+    """
+    列出批次中的视频（去重并保持顺序）
+
+    Args:
+        roots: 允许读取的目录，目录、清单和视频都必须位于其中
+        directory: 视频目录（按文件名排序）
+        recursive: 是否包含子目录
+        manifest: 视频路径列表
+        manifest_path: 清单文件路径
+        max_videos: 单个批次的视频数上限
+
+    Returns:
+        list: 视频的绝对路径
+
+    Raises:
+        BatchError: 参数错误或路径不在允许的目录中
+    """
+    if not roots:
+        raise BatchError('未配置允许批量读取的目录（BATCH_CONFIG["allowed_roots"]）', 403)
+    if sum(value is not None for value in (directory, manifest, manifest_path)) != 1:
+        raise BatchError('directory、manifest、manifest_path 必须且只能指定一个')
+
+    def checked(path):
+        path = os.path.realpath(path)
+        if not is_within(path, roots):
+            raise BatchError(f'路径不在允许的目录中: {path}', 403)
+        return path
+
+    if directory is not None:
+        directory = checked(directory)
+        if not os.path.isdir(directory):
+            raise BatchError(f'目录不存在: {directory}', 404)
+        paths = []
+        if recursive:
+            for root, dirs, files in os.walk(directory):
+                dirs.sort()
+                paths.extend(os.path.join(root, name) for name in sorted(files))
+        else:
+            paths = [os.path.join(directory, name) for name in sorted(os.listdir(directory))]
+        paths = [path for path in paths
+                 if os.path.isfile(path) and path.rsplit('.', 1)[-1].lower() in VIDEO_EXTENSIONS]
+    elif manifest_path is not None:
+        manifest_path = checked(manifest_path)
+        try:
+            paths = read_manifest(manifest_path)
+        except (OSError, ValueError) as e:
+            raise BatchError(f'无法读取清单: {str(e)}')
+    else:
+        if not isinstance(manifest, list):
+            raise BatchError('manifest必须是路径列表')
+        paths = [str(path) for path in manifest]
+
+    videos, seen = [], set()
+    for path in paths:
+        path = checked(path)
+        if path not in seen:
+            seen.add(path)
+            videos.append(path)
+    if not videos:
+        raise BatchError('没有找到视频文件')
+    if max_videos is not None and len(videos) > max_videos:
+        raise BatchError(f'单个批次最多 {max_videos} 个视频，实际 {len(videos)} 个')
+    return videos
+
+
+class BatchStore:
+    def __init__(self, db_path):
+        """
+        初始化批量任务存储
+
+        Args:
+            db_path: SQLite数据库文件路径
+        """
+        self.db_path = db_path
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS batches (
+                    id TEXT PRIMARY KEY,
+                    name TEXT,
+                    status TEXT NOT NULL,
+                    tenant TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    finished_at REAL,
+                    report TEXT
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_batches_created ON batches(created_at)')
+            # state: pending（等待调度）/ started（已开始检测）/ done（任务已结束）/ skipped（无法检测）
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS batch_items (
+                    batch_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    path TEXT NOT NULL,
+                    task_id TEXT,
+                    state TEXT NOT NULL,
+                    error TEXT,
+                    PRIMARY KEY (batch_id, position)
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_batch_items_state ON batch_items(state, batch_id, position)')
+
+    @contextmanager
+    def _connect(self):
+        """每次操作使用独立连接，事务结束后提交并关闭"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(self, batch_id, name, tenant, options, items):
+        """
+        创建批次
+
+        Args:
+            items: [{'path', 'task_id', 'error'}]，没有task_id的条目记为skipped
+        """
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT INTO batches (id, name, status, tenant, options, created_at) VALUES (?, ?, 'running', ?, ?, ?)
+            """, (batch_id, name, tenant, json.dumps(options), time.time()))
+            conn.executemany("""
+                INSERT INTO batch_items (batch_id, position, path, task_id, state, error) VALUES (?, ?, ?, ?, ?, ?)
+            """, [(batch_id, position, item['path'], item.get('task_id'),
+                   'pending' if item.get('task_id') else 'skipped', item.get('error'))
+                  for position, item in enumerate(items)])
+
+    def admit(self, limit):
+        """
+        按批次创建顺序领取待调度的条目，使所有批次同时检测中的条目不超过limit
+
+        Returns:
+            list: [(batch_id, task_id, options)]
+        """
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        try:
+            # 统计与领取在同一个写事务中完成，多个进程同时调度也不会超过上限
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                running = conn.execute("SELECT COUNT(*) FROM batch_items WHERE state = 'started'").fetchone()[0]
+                rows = []
+                if running < limit:
+                    rows = conn.execute("""
+                        SELECT i.batch_id, i.position, i.task_id, b.options FROM batch_items i
+                        JOIN batches b ON b.id = i.batch_id
+                        WHERE i.state = 'pending' AND b.status = 'running'
+                        ORDER BY b.created_at, i.position LIMIT ?
+                    """, (limit - running,)).fetchall()
+                    conn.executemany("""
+                        UPDATE batch_items SET state = 'started' WHERE batch_id = ? AND position = ?
+                    """, [(batch_id, position) for batch_id, position, _, _ in rows])
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+        return [(batch_id, task_id, json.loads(options)) for batch_id, _, task_id, options in rows]
+
+    def started_task_ids(self):
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute("SELECT task_id FROM batch_items WHERE state = 'started'")]
+
+    def mark_done(self, task_ids):
+        if not task_ids:
+            return
+        with self._connect() as conn:
+            conn.executemany("UPDATE batch_items SET state = 'done' WHERE task_id = ? AND state != 'skipped'",
+                             [(task_id,) for task_id in task_ids])
+
+    def claim_finished(self):
+        """
+        领取所有条目都已结束的批次（每个批次只返回一次，由领取方生成报告）
+
+        Returns:
+            list: 批次ID
+        """
+        with self._connect() as conn:
+            candidates = [row[0] for row in conn.execute("""
+                SELECT id FROM batches b WHERE status IN ('running', 'cancelling') AND NOT EXISTS (
+                    SELECT 1 FROM batch_items i WHERE i.batch_id = b.id AND i.state IN ('pending', 'started')
+                )
+            """)]
+            claimed = []
+            for batch_id in candidates:
+                if conn.execute("""
+                    UPDATE batches SET status = CASE status WHEN 'cancelling' THEN 'cancelled' ELSE 'completed' END,
+                        finished_at = ? WHERE id = ? AND status IN ('running', 'cancelling')
+                """, (time.time(), batch_id)).rowcount:
+                    claimed.append(batch_id)
+        return claimed
+
+    def cancel(self, batch_id):
+        """
+        取消批次：待调度的条目不再开始
+
+        Returns:
+            tuple: (待调度条目的任务ID, 检测中条目的任务ID)；批次已结束时返回None
+        """
+        with self._connect() as conn:
+            if not conn.execute("UPDATE batches SET status = 'cancelling' WHERE id = ? AND status = 'running'",
+                                (batch_id,)).rowcount:
+                return None
+            pending = [row[0] for row in conn.execute(
+                "SELECT task_id FROM batch_items WHERE batch_id = ? AND state = 'pending'", (batch_id,))]
+            started = [row[0] for row in conn.execute(
+                "SELECT task_id FROM batch_items WHERE batch_id = ? AND state = 'started'", (batch_id,))]
+            conn.execute("UPDATE batch_items SET state = 'done' WHERE batch_id = ? AND state = 'pending'", (batch_id,))
+        return pending, started
+
+    def set_report(self, batch_id, report):
+        with self._connect() as conn:
+            conn.execute('UPDATE batches SET report = ? WHERE id = ?', (json.dumps(report), batch_id))
+
+    @staticmethod
+    def _row_to_batch(row):
+        batch = dict(row)
+        batch['options'] = json.loads(batch['options'])
+        batch['report'] = json.loads(batch['report']) if batch['report'] else None
+        return batch
+
+    def get(self, batch_id):
+        """批次及其条目，不存在时返回None"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM batches WHERE id = ?', (batch_id,)).fetchone()
+            if row is None:
+                return None
+            batch = self._row_to_batch(row)
+            batch['items'] = [dict(item) for item in conn.execute("""
+                SELECT position, path, task_id, state, error FROM batch_items WHERE batch_id = ? ORDER BY position
+            """, (batch_id,))]
+        return batch
+
+    def list(self, limit=50, offset=0):
+        """按创建时间倒序分页列出批次（不含条目），返回 (批次列表, 总数)"""
+        with self._connect() as conn:
+            total = conn.execute('SELECT COUNT(*) FROM batches').fetchone()[0]
+            rows = conn.execute('SELECT * FROM batches ORDER BY created_at DESC LIMIT ? OFFSET ?',
+                                (limit, offset)).fetchall()
+        return [self._row_to_batch(row) for row in rows], total
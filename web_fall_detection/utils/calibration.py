@@ -0,0 +1,213 @@
+"""
+性能校准 - 在参考视频上用实际模型测试不同的跳帧间隔、推理尺寸和线程数组合，
+测量处理速度（实时倍率）和与最精确配置的检测一致性，选出满足目标的最省资源的配置
+"""
+
+import os
+import json
+import time
+import hashlib
+import itertools
+
+import cv2
+
+
+class CalibrationError(Exception):
+    """无法进行校准（参考视频不可用等）"""
+
+
+def model_signature(paths):
+    """模型文件内容的SHA-256（前16位），模型更新后签名变化，需要重新校准"""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        if not os.path.exists(path):
+            digest.update(b'missing')
+            continue
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+_default_threads = {}
+
+
+def set_inference_threads(count):
+    """
+    设置推理线程数（PyTorch和OpenCV均为进程级设置）
+
+    Args:
+        count: 线程数，0表示恢复库的默认值
+    """
+    try:
+        import torch
+    except ImportError:
+        torch = None
+    if torch is not None:
+        _default_threads.setdefault('torch', torch.get_num_threads())
+        torch.set_num_threads(count if count > 0 else _default_threads['torch'])
+    cv2.setNumThreads(count if count > 0 else -1)
+
+
+def fall_bins(events, bin_seconds):
+    """有跌倒事件的时间段（按bin_seconds分箱的序号集合）"""
+    return {int(event['timestamp'] // bin_seconds) for event in events}
+
+
+def detection_agreement(reference_events, events, bin_seconds=1.0):
+    """
+    与参考结果的检测一致性：按时间分箱比较检测到跌倒的时段，返回F1（0~1）
+
+    跳帧时同一次跌倒记录的事件数不同，按时段比较不受事件密度影响；两者都没有事件时为1.0
+    """
+    reference, detected = fall_bins(reference_events, bin_seconds), fall_bins(events, bin_seconds)
+    if not reference and not detected:
+        return 1.0
+    return 2 * len(reference & detected) / (len(reference) + len(detected))
+
+
+def prepare_clip(path, max_seconds, directory):
+    """
+    准备参考视频：超过max_seconds时截取开头部分（MJPG AVI），否则直接使用原文件
+
+    Returns:
+        str: 参考视频路径
+
+    Raises:
+        CalibrationError: 视频无法打开
+    """
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise CalibrationError(f"无法打开参考视频: {path}")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        max_frames = int(max_seconds * fps)
+        if 0 < total_frames <= max_frames:
+            return path
+
+        clip_path = os.path.join(directory, 'reference.avi')
+        width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        out = cv2.VideoWriter(clip_path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+        try:
+            for _ in range(max_frames):
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                out.write(frame)
+        finally:
+            out.release()
+        return clip_path
+    finally:
+        cap.release()
+
+
+def run_calibration(run_detection, grid, target_rtf=1.0, min_agreement=0.9, bin_seconds=1.0,
+                    exhaustive=False, progress=None):
+    """
+    在参数网格上测试检测配置
+
+    先用最精确的配置（最小跳帧、最大尺寸、最多线程）得到参考结果。对每个（尺寸, 线程数）组合，从最大跳帧开始依次
+    减小：实时倍率不达标时更小的跳帧也不会达标，一致性达标时更小的跳帧只会更慢，两种情况都停止该组合
+    （exhaustive为True时测试全部组合）。
+
+    Args:
+        run_detection: 回调run_detection(skip_frames, imgsz, threads)，返回 (跌倒事件列表, 视频时长, 检测耗时)
+        grid: {'skip_frames': [...], 'imgsz': [...], 'threads': [...]}
+        target_rtf: 目标实时倍率（视频时长 / 检测耗时，1.0为刚好实时）
+        min_agreement: 与参考结果的最低一致性
+        bin_seconds: 计算一致性的时间分箱（秒）
+        exhaustive: 是否测试全部组合
+        progress: 回调progress(已测试数, 组合总数, 本次结果)
+
+    Returns:
+        dict: {'reference', 'results', 'recommended', 'meets_target', 'tested', 'grid_size'}
+    """
+    skips, sizes, threads = sorted(set(grid['skip_frames'])), sorted(set(grid['imgsz'])), sorted(set(grid['threads']))
+    total = len(skips) * len(sizes) * len(threads)
+    results = {}
+    reference_events = None
+
+    def measure(skip_frames, imgsz, thread_count):
+        nonlocal reference_events
+        key = (skip_frames, imgsz, thread_count)
+        if key in results:
+            return results[key]
+        events, duration, elapsed = run_detection(skip_frames, imgsz, thread_count)
+        if reference_events is None:
+            reference_events = events
+        result = {
+            'skip_frames': skip_frames,
+            'imgsz': imgsz,
+            'threads': thread_count,
+            'events': len(events),
+            'processing_time': round(elapsed, 3),
+            'rtf': round(duration / max(elapsed, 1e-6), 3),
+            # 资源消耗按占用的核·秒计（线程数×耗时）
+            'cost': round(elapsed * max(1, thread_count), 3),
+            'agreement': round(detection_agreement(reference_events, events, bin_seconds), 4)
+        }
+        results[key] = result
+        if progress is not None:
+            progress(len(results), total, result)
+        return result
+
+    # 第一次测试的是参考配置，其结果作为一致性的基准，本身也是候选
+    reference = measure(skips[0], sizes[-1], threads[-1])
+
+    for imgsz, thread_count in itertools.product(reversed(sizes), reversed(threads)):
+        for skip_frames in reversed(skips):
+            result = measure(skip_frames, imgsz, thread_count)
+            if exhaustive:
+                continue
+            if result['rtf'] < target_rtf or result['agreement'] >= min_agreement:
+                break
+
+    measured = list(results.values())
+    passing = [r for r in measured if r['rtf'] >= target_rtf and r['agreement'] >= min_agreement]
+    if passing:
+        recommended = min(passing, key=lambda r: (r['cost'], -r['agreement']))
+    else:
+        # 没有同时满足的配置时：优先满足实时，其次一致性最高；都不满足实时则选最快的
+        realtime = [r for r in measured if r['rtf'] >= target_rtf]
+        recommended = (max(realtime, key=lambda r: (r['agreement'], -r['cost'])) if realtime
+                       else max(measured, key=lambda r: r['rtf']))
+
+    return {
+        'reference': reference,
+        'results': sorted(measured, key=lambda r: r['cost']),
+        'recommended': recommended,
+        'meets_target': bool(passing),
+        'tested': len(measured),
+        'grid_size': total
+    }
+
+
+def load_profile(path):
+    """读取已保存的性能配置文件，不存在或无法解析时返回None"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_profile(path, profile):
+    """保存性能配置文件（先写临时文件再替换）"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+def machine_info():
+    """校准时的机器信息（配置文件只适用于同一台机器）"""
+    import platform
+    return {
+        'hostname': platform.node(),
+        'cpu_count': os.cpu_count(),
+        'platform': platform.platform(),
+        'calibrated_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
@@ -0,0 +1,170 @@
+"""
+检测检查点 - 长视频检测时在输出分段边界定期保存检测状态（时序状态、已发现的事件、统计信息），
+服务重启后从最近一个输出分段已写完的检查点继续，结果与不中断的检测一致
+"""
+
+import os
+import json
+import shutil
+
+import cv2
+
+CHECKPOINT_PREFIX = 'ckpt_'
+STATE_FILE = 'state.json'
+
+
+class CheckpointError(Exception):
+    """检查点无法使用"""
+
+
+def skip_frames(cap, count):
+    """
+    从视频开头顺序跳过count帧（只grab不取像素）；与按帧号定位不同，之后读到的帧与不中断时完全相同
+
+    Raises:
+        CheckpointError: 视频帧数少于检查点位置
+    """
+    for index in range(count):
+        if not cap.grab():
+            raise CheckpointError(f"视频只有 {index} 帧，无法定位到检查点的第 {count} 帧")
+
+
+class CheckpointStore:
+    def __init__(self, directory, interval=60.0, keep=2):
+        """
+        初始化检查点存储
+
+        Args:
+            directory: 任务的检查点目录
+            interval: 检查点间隔（视频秒数），向上对齐到输出分段边界
+            keep: 保留的检查点数量（至少2个：最新的检查点对应的输出分段可能尚未写完）
+        """
+        self.directory = directory
+        self.interval = interval
+        self.keep = max(2, keep)
+        self.fps = None
+        self.segment_seconds = None
+        self.segments_per_checkpoint = None
+        self.signature = None
+        self.saved = 0
+
+    def plan(self, fps, segment_seconds, signature=None):
+        """
+        按输出分段确定检查点位置
+
+        Args:
+            fps: 视频帧率
+            segment_seconds: 输出分段时长（秒）
+            signature: 影响检测结果的参数（视频、跳帧、阈值等），参数不同的检查点不会被恢复
+        """
+        self.fps = fps
+        self.segment_seconds = segment_seconds
+        self.segments_per_checkpoint = max(1, int(round(self.interval / segment_seconds)))
+        self.signature = signature or {}
+
+    def segment_frame(self, segment):
+        """第segment个输出分段的起始帧号"""
+        from utils.progressive_output import segment_start_frame
+        return segment_start_frame(segment, self.fps, self.segment_seconds)
+
+    def next_checkpoint(self, frame_count):
+        """
+        已处理frame_count帧之后的下一个检查点
+
+        Returns:
+            tuple: (分段序号, 检查点时已处理的帧数)
+        """
+        segment = self.segments_per_checkpoint
+        while self.segment_frame(segment) <= frame_count:
+            segment += self.segments_per_checkpoint
+        return segment, self.segment_frame(segment)
+
+    def _path(self, segment):
+        return os.path.join(self.directory, f"{CHECKPOINT_PREFIX}{segment:06d}")
+
+    def _segments(self):
+        if not os.path.isdir(self.directory):
+            return []
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith(CHECKPOINT_PREFIX) and name[len(CHECKPOINT_PREFIX):].isdigit():
+                segments.append(int(name[len(CHECKPOINT_PREFIX):]))
+        return sorted(segments)
+
+    def exists(self):
+        return bool(self._segments())
+
+    def save(self, segment, frame, state, images=()):
+        """
+        保存检查点：先写入临时目录再重命名，进程在保存中途退出时不会留下不完整的检查点
+
+        Args:
+            segment: 检查点对应的输出分段序号（恢复时从该分段开始重新写入）
+            frame: 已处理的帧数
+            state: 可JSON序列化的检测状态
+            images: 需要保存的图像（如尚未写出的雪碧图缩略图），PNG无损保存
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(segment)
+        temp_path = os.path.join(self.directory, f".tmp-{os.getpid()}-{segment:06d}")
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+        try:
+            for index, image in enumerate(images):
+                if not cv2.imwrite(os.path.join(temp_path, f"image_{index:04d}.png"), image):
+                    raise IOError(f"无法写入检查点图像: {temp_path}")
+            with open(os.path.join(temp_path, STATE_FILE), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'segment': segment,
+                    'frame': frame,
+                    'images': len(images),
+                    'signature': self.signature,
+                    'state': state
+                }, f, ensure_ascii=False)
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(temp_path, path)
+        finally:
+            shutil.rmtree(temp_path, ignore_errors=True)
+        self.saved += 1
+
+        for old in self._segments()[:-self.keep]:
+            shutil.rmtree(self._path(old), ignore_errors=True)
+
+    def load(self, max_segment):
+        """
+        读取可恢复的最新检查点
+
+        Args:
+            max_segment: 已写完的输出分段数，检查点的分段序号不能超过它
+
+        Returns:
+            dict: {'segment', 'frame', 'state', 'images'}，没有可用的检查点时返回None
+        """
+        for segment in reversed(self._segments()):
+            if segment > max_segment:
+                continue
+            path = self._path(segment)
+            try:
+                with open(os.path.join(path, STATE_FILE), encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ 检查点损坏，跳过: {path}: {str(e)}")
+                continue
+            if data.get('signature') != self.signature:
+                print(f"⚠️ 检查点的检测参数与当前不一致，跳过: {path}")
+                continue
+            images = []
+            for index in range(data['images']):
+                image = cv2.imread(os.path.join(path, f"image_{index:04d}.png"))
+                if image is None:
+                    break
+                images.append(image)
+            if len(images) != data['images']:
+                print(f"⚠️ 检查点图像缺失，跳过: {path}")
+                continue
+            return {'segment': data['segment'], 'frame': data['frame'], 'state': data['state'], 'images': images}
+        return None
+
+    def clear(self):
+        """任务结束后删除检查点"""
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,176 @@
+"""
+事件片段 - 从标注后的输出视频中截取跌倒事件前后几秒的短片段
+安装了ffmpeg时从关键帧起无损截取（不重新编码），否则用OpenCV逐帧重新编码；
+片段按任务和事件缓存在磁盘上，同一片段的并发请求只截取一次
+"""
+
+import os
+import time
+import threading
+import subprocess
+from concurrent.futures import Future
+
+import cv2
+
+from utils.progressive_output import FFMPEG, ffmpeg_available
+
+
+class ClipError(Exception):
+    """无法截取片段"""
+
+
+def clip_filename(event_id, pre_seconds, post_seconds):
+    """缓存文件名：事件编号和前后时长（按0.1秒取整）"""
+    return f"event_{event_id:04d}_{int(round(pre_seconds * 10)):03d}_{int(round(post_seconds * 10)):03d}.mp4"
+
+
+class ClipExtractor:
+    def __init__(self, use_ffmpeg=True):
+        """
+        初始化片段截取器
+
+        Args:
+            use_ffmpeg: 是否优先用ffmpeg无损截取（ffmpeg不可用时自动回退到OpenCV）
+        """
+        self.use_ffmpeg = use_ffmpeg
+        self._pending = {}  # 片段路径 -> 截取中的Future，用于合并并发请求
+        self._lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'cache_hits': 0,
+            'coalesced': 0,
+            'stream_copy': 0,
+            'reencoded': 0,
+            'errors': 0,
+            'total_extract_time': 0.0
+        }
+
+    def _cached(self, source_path, clip_path):
+        """缓存的片段存在且不早于源视频"""
+        try:
+            return os.path.getmtime(clip_path) >= os.path.getmtime(source_path)
+        except OSError:
+            return False
+
+    def get(self, source_path, clip_path, start, end):
+        """
+        返回片段路径，缓存中没有时截取
+
+        Args:
+            source_path: 源视频（标注后的输出视频）
+            clip_path: 片段缓存路径
+            start: 起始时间（秒）
+            end: 结束时间（秒）
+
+        Returns:
+            str: 片段路径
+
+        Raises:
+            ClipError: 截取失败
+        """
+        with self._lock:
+            self.stats['requests'] += 1
+            if self._cached(source_path, clip_path):
+                self.stats['cache_hits'] += 1
+                return clip_path
+            future = self._pending.get(clip_path)
+            if future is not None:
+                self.stats['coalesced'] += 1
+                owner = False
+            else:
+                future = Future()
+                self._pending[clip_path] = future
+                owner = True
+
+        if not owner:
+            # 同一片段正在截取，等待其结果
+            return future.result()
+
+        try:
+            started = time.time()
+            method = self._extract(source_path, clip_path, start, end)
+            with self._lock:
+                self.stats[method] += 1
+                self.stats['total_extract_time'] += time.time() - started
+            future.set_result(clip_path)
+        except Exception as e:
+            with self._lock:
+                self.stats['errors'] += 1
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(clip_path, None)
+        return clip_path
+
+    def _extract(self, source_path, clip_path, start, end):
+        """截取到临时文件后重命名，其他进程不会读到写了一半的片段；返回使用的方式"""
+        os.makedirs(os.path.dirname(clip_path), exist_ok=True)
+        temp_path = os.path.join(os.path.dirname(clip_path),
+                                 f".{os.getpid()}-{threading.get_ident()}-{os.path.basename(clip_path)}")
+        try:
+            if self.use_ffmpeg and ffmpeg_available() and self._stream_copy(source_path, temp_path, start, end):
+                method = 'stream_copy'
+            else:
+                self._reencode(source_path, temp_path, start, end)
+                method = 'reencoded'
+            os.replace(temp_path, clip_path)
+            return method
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _stream_copy(self, source_path, temp_path, start, end):
+        """
+        ffmpeg无损截取：输入端定位到起始时间之前最近的关键帧，从该关键帧开始复制，
+        片段可能比请求的略长（最多一个关键帧间隔），但不需要重新编码
+        """
+        result = subprocess.run([
+            FFMPEG, '-hide_banner', '-loglevel', 'error', '-y',
+            '-ss', f'{start:.3f}', '-i', source_path, '-t', f'{end - start:.3f}',
+            '-map', '0:v:0', '-c', 'copy', '-avoid_negative_ts', 'make_zero',
+            '-movflags', '+faststart', '-f', 'mp4', temp_path
+        ], capture_output=True)
+        if result.returncode == 0 and os.path.exists(temp_path) and os.path.getsize(temp_path) > 0:
+            return True
+        print(f"⚠️ ffmpeg无损截取失败，改用OpenCV重新编码: {result.stderr.decode('utf-8', 'replace').strip()}")
+        return False
+
+    def _reencode(self, source_path, temp_path, start, end):
+        """OpenCV逐帧读取并重新编码（与检测器的输出编码一致）"""
+        cap = cv2.VideoCapture(source_path)
+        if not cap.isOpened():
+            raise ClipError(f"无法打开视频文件: {source_path}")
+        writer = None
+        try:
+            fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            first_frame = int(start * fps)
+            last_frame = int(end * fps)
+            cap.set(cv2.CAP_PROP_POS_FRAMES, first_frame)
+
+            writer = cv2.VideoWriter(temp_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+            if not writer.isOpened():
+                raise ClipError(f"无法创建片段文件: {temp_path}")
+            written = 0
+            for _ in range(first_frame, last_frame):
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                writer.write(frame)
+                written += 1
+            if written == 0:
+                raise ClipError(f"片段时间范围内没有视频帧: {start:.2f}s - {end:.2f}s")
+        finally:
+            cap.release()
+            if writer is not None:
+                writer.release()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['in_progress'] = len(self._pending)
+        extracted = max(1, stats['stream_copy'] + stats['reencoded'])
+        stats['avg_extract_time'] = stats['total_extract_time'] / extracted
+        return stats
@@ -0,0 +1,141 @@
+"""
+列式编码 - 检测结果中的跌倒事件按字段保存为并行数组（每个事件只保存一次），需要时再展开为事件字典
+长视频的事件多达上万个时，列式JSON比字典列表小一个数量级，解析和序列化也快得多
+"""
+
+import numbers
+
+COLUMNAR_FORMAT = 'columnar/1'
+
+# 跌倒事件各字段保留的小数位数（bbox、center为坐标列表，逐个元素取整到像素；时间戳精确到10ms，小于一帧）
+EVENT_PRECISION = {'timestamp': 2, 'confidence': 3, 'bbox': 0, 'center': 0}
+# 取值种类很少的字符串字段，编码为取值表中的序号
+EVENT_DICTIONARY = ('type',)
+
+
+def _round(value, digits):
+    if isinstance(value, numbers.Real) and not isinstance(value, numbers.Integral):
+        return int(round(float(value))) if digits == 0 else round(float(value), digits)
+    if isinstance(value, (list, tuple)):
+        return [_round(item, digits) for item in value]
+    return value
+
+
+def is_columnar(value):
+    return isinstance(value, dict) and value.get('format') == COLUMNAR_FORMAT
+
+
+def encode_rows(rows, precision=None, dictionary=()):
+    """
+    把字典列表编码为列式表
+
+    Args:
+        rows: 字典列表（各字典的键可以不同，缺少的字段记为None）
+        precision: {字段: 小数位数}，浮点数按位数取整（0位时转为整数）
+        dictionary: 编码为取值表序号的字段
+
+    Returns:
+        dict: {'format', 'count', 'columns': {字段: 数组}, 'dictionaries': {字段: 取值表}}
+    """
+    fields = []
+    for row in rows:
+        for key in row:
+            if key not in fields:
+                fields.append(key)
+
+    columns = {}
+    for field in fields:
+        values = [row.get(field) for row in rows]
+        digits = (precision or {}).get(field)
+        columns[field] = values if digits is None else [_round(value, digits) for value in values]
+
+    dictionaries = {}
+    for field in dictionary:
+        if field not in columns:
+            continue
+        codes = {}
+        columns[field] = [codes.setdefault(value, len(codes)) for value in columns[field]]
+        dictionaries[field] = list(codes)
+
+    return {
+        'format': COLUMNAR_FORMAT,
+        'count': len(rows),
+        'columns': columns,
+        'dictionaries': dictionaries
+    }
+
+
+def slice_rows(table, offset=0, limit=None):
+    """截取部分行，仍为列式表"""
+    end = table['count'] if limit is None else min(table['count'], offset + limit)
+    return dict(
+        table,
+        count=max(0, end - offset),
+        columns={field: values[offset:end] for field, values in table['columns'].items()}
+    )
+
+
+def expand_rows(table, offset=0, limit=None):
+    """展开为字典列表（offset、limit用于分页），取值表编码的字段还原为原值"""
+    page = slice_rows(table, offset, limit)
+    dictionaries = table.get('dictionaries', {})
+    fields = [(field, values, dictionaries.get(field)) for field, values in page['columns'].items()]
+    rows = []
+    for index in range(page['count']):
+        row = {}
+        for field, values, values_table in fields:
+            value = values[index]
+            row[field] = values_table[value] if values_table is not None else value
+        rows.append(row)
+    return rows
+
+
+def encode_events(fall_events):
+    """把跌倒事件列表编码为列式表"""
+    return encode_rows(fall_events, precision=EVENT_PRECISION, dictionary=EVENT_DICTIONARY)
+
+
+def event_table(detection_data):
+    """
+    检测结果中的事件表（兼容以字典列表保存事件的旧结果）
+    """
+    detection_data = detection_data or {}
+    events = detection_data.get('events')
+    if is_columnar(events):
+        return events
+    return encode_events(detection_data.get('fall_events') or [])
+
+
+def event_count(detection_data):
+    return event_table(detection_data)['count']
+
+
+def event_rows(detection_data, offset=0, limit=None):
+    """检测结果中的事件字典列表"""
+    return expand_rows(event_table(detection_data), offset, limit)
+
+
+def compact_detection_result(detection_data):
+    """
+    保存前压缩检测结果：事件列表和事件缩略图列表改为列式表
+
+    Returns:
+        dict: 新的检测结果（不修改传入的字典）
+    """
+    compact = dict(detection_data)
+    compact['events'] = encode_events(compact.pop('fall_events', None) or [])
+    thumbnails = compact.get('thumbnails')
+    if thumbnails and isinstance(thumbnails.get('events'), list):
+        compact['thumbnails'] = dict(thumbnails, events=encode_rows(thumbnails['events']))
+    return compact
+
+
+def expand_detection_result(detection_data):
+    """还原为事件字典列表的检测结果（供按旧格式读取的客户端使用）"""
+    expanded = dict(detection_data)
+    expanded['fall_events'] = expand_rows(event_table(expanded))
+    expanded.pop('events', None)
+    thumbnails = expanded.get('thumbnails')
+    if thumbnails and is_columnar(thumbnails.get('events')):
+        expanded['thumbnails'] = dict(thumbnails, events=expand_rows(thumbnails['events']))
+    return expanded
@@ -0,0 +1,62 @@
+"""
+响应压缩 - 较大的JSON、HTML响应按客户端的Accept-Encoding压缩（优先brotli，未安装时使用gzip）
+"""
+
+import gzip
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    brotli = None
+    BROTLI_AVAILABLE = False
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'text/csv', 'text/plain')
+
+
+def choose_encoding(accept_encodings):
+    """
+    按客户端支持选择编码
+
+    Args:
+        accept_encodings: werkzeug的请求Accept-Encoding（MIMEAccept/Accept对象）
+
+    Returns:
+        str: 'br'、'gzip'，不支持压缩时返回None
+    """
+    if BROTLI_AVAILABLE and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress_response(response, accept_encodings, min_size=1024, gzip_level=6, brotli_quality=5):
+    """
+    压缩响应体（流式响应、文件响应、已编码或过小的响应原样返回）
+
+    Returns:
+        Response: 传入的响应对象
+    """
+    if response.direct_passthrough or response.is_streamed or response.status_code not in (200, 201) \
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    if encoding == 'br':
+        compressed = brotli.compress(data, quality=brotli_quality)
+    else:
+        compressed = gzip.compress(data, compresslevel=gzip_level, mtime=0)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    response.headers['Content-Length'] = str(len(compressed))
+    # 强校验器对应的是未压缩的内容
+    if response.get_etag()[0]:
+        response.set_etag(response.get_etag()[0] + '-' + encoding)
+    return response
@@ -10,23 +10,43 @@ import os
 import cv2
 from datetime import datetime
 
+from utils.growing_video import GrowingVideoCapture
+from utils.job_control import JobCancelled
+from utils.progressive_output import create_progressive_writer, completed_segments, ffmpeg_available, SEGMENT_SECONDS
+from utils.checkpoint import skip_frames
+
 class DemoDetector:
     """演示用的检测器，生成模拟检测结果"""
     
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, segment_seconds=SEGMENT_SECONDS, **kwargs):
         self.is_demo = True
+        self.segment_seconds = segment_seconds
         print("⚠️ 使用演示模式 - 将生成模拟检测结果")
     
+    def warm_up(self):
+        """演示模式无需预热模型"""
+        return 0.0
+    
+    def release(self):
+        """演示模式没有需要归还的模型"""
+        pass
+    
     def detect_video(self, video_path, output_path, confidence=0.5, 
-                    iou_threshold=0.4, progress_callback=None):
+                    iou_threshold=0.4, progress_callback=None, with_llm_analysis=True,
+                    source=None, preview_dir=None, thumbnails=None, control=None, checkpoint=None):
         """
-        模拟视频检测过程
+        模拟视频检测过程（source为仍在上传的视频时边上传边处理，
+        指定preview_dir且ffmpeg可用时输出同时写成HLS分段供处理中预览，
+        指定thumbnails时保存事件缩略图和雪碧图，指定control时每帧检查取消和抢占，
+        指定checkpoint时在输出分段边界保存检查点并从已有的检查点继续）
         """
+        cap = None
+        out = None
         try:
             start_time = time.time()
             
             # 获取视频信息
-            cap = cv2.VideoCapture(video_path)
+            cap = GrowingVideoCapture(source) if source is not None else cv2.VideoCapture(video_path)
             if not cap.isOpened():
                 raise ValueError(f"无法打开视频文件: {video_path}")
             
@@ -34,12 +54,34 @@ class DemoDetector:
             height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
             fps = cap.get(cv2.CAP_PROP_FPS)
             total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            duration = total_frames / fps
+            
+            # 模拟标注使用独立的随机数生成器，其状态随检查点保存，续跑后的输出与不中断时一致
+            rng = random.Random()
+            resume = None
+            if checkpoint is not None and (source is not None or not preview_dir or not ffmpeg_available()):
+                print("⚠️ 断点续跑需要ffmpeg分段输出，本次检测不保存检查点")
+                checkpoint = None
+            if checkpoint is not None:
+                checkpoint.plan(fps, self.segment_seconds, signature={
+                    'video': os.path.basename(video_path),
+                    'total_frames': total_frames,
+                    'segment_seconds': self.segment_seconds,
+                    'demo_mode': True
+                })
+                resume = checkpoint.load(completed_segments(preview_dir))
             
             # 创建输出视频（复制原视频并添加演示标识）
+            # 优先写成可预览的HLS分段（ffmpeg编码H.264，结束时封装为MP4）
+            out = None
+            if preview_dir:
+                out = create_progressive_writer(output_path, preview_dir, fps, (width, height),
+                                                segment_seconds=self.segment_seconds,
+                                                resume_segment=resume['segment'] if resume else 0)
+            
             # 使用H.264编码器，更好的浏览器兼容性
-            fourcc = cv2.VideoWriter_fourcc(*'avc1')  # H.264编码
-            out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+            if out is None:
+                fourcc = cv2.VideoWriter_fourcc(*'avc1')  # H.264编码
+                out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
             
             # 如果H.264失败，尝试其他编码器
             if not out.isOpened():
@@ -54,8 +96,21 @@ class DemoDetector:
                 out = cv2.VideoWriter(temp_output, fourcc, fps, (width, height))
             
             frame_count = 0
+            if resume is not None:
+                skip_frames(cap, resume['frame'])
+                state = resume['state']
+                frame_count = state['frame_count']
+                version, internal, gauss_next = state['random_state']
+                rng.setstate((version, tuple(internal), gauss_next))
+                if thumbnails is not None and state['thumbnails'] is not None:
+                    thumbnails.restore_state(state['thumbnails'], resume['images'])
+                start_time -= state['elapsed']
+                print(f"⏩ 从检查点继续: 第 {frame_count} 帧")
+            next_checkpoint = checkpoint.next_checkpoint(frame_count) if checkpoint is not None else None
             
             while True:
+                if control is not None:
+                    control.checkpoint()
                 ret, frame = cap.read()
                 if not ret:
                     break
@@ -64,7 +119,7 @@ class DemoDetector:
                 
                 # 更新进度
                 if progress_callback and frame_count % 30 == 0:
-                    progress = int((frame_count / total_frames) * 90)
+                    progress = int(min(1.0, frame_count / max(1, total_frames)) * 90)
                     progress_callback(progress, f"演示模式处理第 {frame_count}/{total_frames} 帧...")
                 
                 # 添加演示标识
@@ -72,19 +127,42 @@ class DemoDetector:
                            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
                 
                 # 模拟跌倒检测标注（随机在某些帧上）
-                if random.random() < 0.02:  # 2%的概率
+                if rng.random() < 0.02:  # 2%的概率
                     # 绘制模拟检测框
-                    x1, y1 = random.randint(50, width//2), random.randint(50, height//2)
-                    x2, y2 = x1 + random.randint(100, 200), y1 + random.randint(150, 300)
+                    x1, y1 = rng.randint(50, width//2), rng.randint(50, height//2)
+                    x2, y2 = x1 + rng.randint(100, 200), y1 + rng.randint(150, 300)
                     
                     cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
                     cv2.putText(frame, f"FALL DETECTED (Demo)", (x1, y1-10),
                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
                 
                 out.write(frame)
+                if thumbnails is not None:
+                    thumbnails.add_frame(frame_count / fps, frame)
+                
+                if next_checkpoint is not None and frame_count == next_checkpoint[1]:
+                    try:
+                        thumbnail_state, images = (thumbnails.get_state() if thumbnails is not None
+                                                   else (None, []))
+                        checkpoint.save(next_checkpoint[0], frame_count, {
+                            'frame_count': frame_count,
+                            'random_state': rng.getstate(),
+                            'thumbnails': thumbnail_state,
+                            'elapsed': time.time() - start_time
+                        }, images)
+                    except Exception as checkpoint_error:
+                        print(f"保存第{frame_count}帧检查点时出错: {checkpoint_error}")
+                    next_checkpoint = checkpoint.next_checkpoint(frame_count)
             
+            # 上传中的视频等待新数据的时间（释放前读取）
+            input_wait_time = getattr(cap, 'wait_time', 0.0)
             cap.release()
             out.release()
+            cap = out = None
+            
+            if total_frames <= 0:
+                total_frames = frame_count
+            duration = total_frames / fps
             
             # 如果使用了临时文件，需要转换为mp4
             temp_output = output_path.replace('.mp4', '_temp.avi')
@@ -111,7 +189,10 @@ class DemoDetector:
             
             # 生成模拟检测结果
             fall_events = self._generate_demo_events(duration, fps)
-            llm_analysis = self._generate_demo_analysis(fall_events)
+            if thumbnails is not None:
+                self._capture_event_thumbnails(source.path if source is not None else video_path,
+                                               fall_events, thumbnails)
+            llm_analysis = self._generate_demo_analysis(fall_events) if with_llm_analysis else None
             
             processing_time = time.time() - start_time
             
@@ -130,12 +211,51 @@ class DemoDetector:
                 'llm_analysis': llm_analysis,
                 'processing_time': processing_time,
                 'output_path': output_path,
+                'thumbnails': thumbnails.finish() if thumbnails is not None else None,
+                'timing': {
+                    # 演示事件在处理结束后生成
+                    'first_event_time': processing_time if fall_events else None,
+                    'first_event_input_wait': input_wait_time,
+                    'input_wait_time': input_wait_time
+                },
                 'demo_mode': True
             }
             
+        except JobCancelled:
+            self._release_quietly(cap, out)
+            raise
         except Exception as e:
+            self._release_quietly(cap, out)
             raise Exception(f"演示检测失败: {str(e)}")
     
+    @staticmethod
+    def _release_quietly(cap, out):
+        """处理中途退出时释放视频读取和写入"""
+        try:
+            if cap is not None:
+                cap.release()
+            if out is not None:
+                out.release()
+        except Exception as cleanup_error:
+            print(f"清理资源时出错: {cleanup_error}")
+    
+    def _capture_event_thumbnails(self, video_path, fall_events, thumbnails):
+        """演示事件在处理结束后生成，定位到事件帧截取缩略图"""
+        cap = cv2.VideoCapture(video_path)
+        try:
+            for i, event in enumerate(fall_events):
+                cap.set(cv2.CAP_PROP_POS_FRAMES, max(0, event['frame'] - 1))
+                ret, frame = cap.read()
+                if not ret:
+                    continue
+                x1, y1, x2, y2 = event['bbox']
+                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
+                cv2.putText(frame, "FALL DETECTED (Demo)", (x1, max(20, y1 - 10)),
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+                thumbnails.capture_event(i, frame, event)
+        finally:
+            cap.release()
+    
     def _generate_demo_events(self, duration, fps):
         """生成模拟跌倒事件"""
         events = []
@@ -166,6 +286,15 @@ class DemoDetector:
         events.sort(key=lambda x: x['timestamp'])
         return events
     
+    def generate_llm_analysis(self, fall_events, video_path=None, time_budget=None, on_token=None):
+        """模拟独立的LLM分析阶段（逐行模拟流式输出）"""
+        text = self._generate_demo_analysis(fall_events)
+        if on_token is not None:
+            for line in text.splitlines(keepends=True):
+                on_token(line)
+                time.sleep(0.05)
+        return {'text': text, 'source': 'demo'}
+    
     def _generate_demo_analysis(self, fall_events):
         """生成模拟LLM分析"""
         if not fall_events:
@@ -318,41 +447,12 @@ class DemoAnalyzer:
         else:
             risk_level = 'high'
         
-        # 生成图表数据
-        chart_data = {
-            'timeline': [
-                {
-                    'timestamp': e['timestamp'],
-                    'frame': e['frame'],
-                    'confidence': e['confidence'],
-                    'type': e['type']
-                } for e in fall_events
-            ],
-            'confidence_trend': [
-                {'x': i+1, 'y': e['confidence'], 'type': e['type']} 
-                for i, e in enumerate(fall_events)
-            ],
-            'risk_heatmap': []
-        }
+        # 事件时间线和置信度趋势直接使用检测结果的事件表
+        chart_data = {'risk_heatmap': []}
         
         # 生成建议
         recommendations = self._generate_demo_recommendations(risk_level, total_falls, fall_types)
         
-        # 生成时间线
-        timeline = []
-        for i, event in enumerate(fall_events):
-            minutes = int(event['timestamp'] // 60)
-            seconds = int(event['timestamp'] % 60)
-            timeline.append({
-                'id': i + 1,
-                'time': f"{minutes:02d}:{seconds:02d}",
-                'timestamp': event['timestamp'],
-                'type': event['type'],
-                'confidence': event['confidence'],
-                'frame': event['frame'],
-                'description': f"演示事件 {i+1} ({event['type']}类型)"
-            })
-        
         return {
             'summary': {
                 'total_falls': total_falls,
@@ -382,7 +482,6 @@ class DemoAnalyzer:
             },
             'chart_data': chart_data,
             'recommendations': recommendations,
-            'timeline': timeline,
             'demo_mode': True
         }
     
@@ -398,14 +497,13 @@ class DemoAnalyzer:
             'fall_types': {'sustained': 0, 'sudden': 0, 'distribution': {}},
             'time_analysis': {'peak_hours': [], 'distribution': []},
             'confidence_analysis': {'average': 0, 'max': 0, 'min': 0, 'distribution': []},
-            'chart_data': {'timeline': [], 'confidence_trend': [], 'risk_heatmap': []},
+            'chart_data': {'risk_heatmap': []},
             'recommendations': [
                 "✅ 演示模式：未检测到跌倒事件",
                 "📊 活动状态正常",
                 "🔍 建议定期检查以确保居家安全",
                 "💡 演示模式提示：实际使用时将提供更精确的分析"
             ],
-            'timeline': [],
             'demo_mode': True
         }
     
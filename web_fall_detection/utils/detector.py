@@ -7,19 +7,82 @@ import sys
 import cv2
 import time
 import json
+import threading
 import numpy as np
 from collections import deque
 from ultralytics import YOLO
-from llama_cpp import Llama
 
 # 添加父目录以导入main模块
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 添加项目根目录以导入共享的LLM服务
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from llm_service import get_llm_service
+from utils.growing_video import GrowingVideoCapture, UploadAborted
+from utils.job_control import JobCancelled
+from utils.progressive_output import create_progressive_writer, completed_segments, ffmpeg_available, SEGMENT_SECONDS
+from utils.checkpoint import skip_frames
+from utils.llm_cache import generation_signature
+
+# LLM分析提示词的固定指令部分，其KV状态在每次模型加载后只求值一次
+LLM_PROMPT_PREFIX = """你是一名专业的老年护理顾问。请根据下面的跌倒检测数据，从以下几个方面提供专业建议：
+
+1. 风险评估：基于跌倒次数和类型评估风险等级（低/中/高）
+2. 即时措施：当前应该采取的紧急措施
+3. 预防建议：未来如何预防类似事件
+4. 环境改善：居住环境安全优化建议
+5. 医疗建议：是否需要寻求专业医疗帮助
+
+请用中文回答，语言温和关怀，建议具体可行。每个方面用简短的句子说明。
+
+"""
+
+# LLM分析提示词的可变部分（检测统计数据）
+LLM_PROMPT_TEMPLATE = """检测结果摘要：
+- 总跌倒次数：{total_falls}次
+- 跌倒类型：{fall_types}
+- 检测置信度：最高{max_confidence:.2f}，最低{min_confidence:.2f}，平均{avg_confidence:.2f}
+- 时间跨度：{time_span:.1f}秒
+
+护理建议：
+"""
+
+# LLM分析的生成参数（与提示词、模型一起计入响应缓存键）
+LLM_GENERATION_PARAMS = {'max_tokens': 300, 'temperature': 0.7, 'stop': ["</s>"]}
+
+# 进程级YOLO模型池：(模型路径, 设备) -> 空闲模型实例列表
+# 同一实例不在多个线程中并发推理，检测器使用期间独占，release后归还供后续任务复用
+_model_pool = {}
+_model_pool_lock = threading.Lock()
+
+
+def _acquire_model(model_path, device):
+    """从模型池取出空闲实例，没有时加载新实例"""
+    key = (os.path.abspath(model_path), device)
+    with _model_pool_lock:
+        idle = _model_pool.setdefault(key, [])
+        if idle:
+            return idle.pop()
+
+    model = YOLO(model_path)
+    if hasattr(model, 'to'):
+        model.to(device)
+    return model
+
+
+def _release_model(model_path, device, model):
+    """将模型实例归还模型池"""
+    key = (os.path.abspath(model_path), device)
+    with _model_pool_lock:
+        _model_pool.setdefault(key, []).append(model)
+
 
 class FallDetector:
     def __init__(self, fall_model_path='../models/best.pt', 
                  pose_model_path='../models/yolov8n-pose.pt',
                  llm_model_path='../models/tinyllama-1.1b-chat-v1.0.Q4_K_M.gguf',
-                 use_gpu=True, skip_frames=5):
+                 use_gpu=True, skip_frames=5, llm_timeout=120, llm_cache=None, imgsz=640,
+                 segment_seconds=SEGMENT_SECONDS):
         """
         初始化跌倒检测器
         
@@ -29,12 +92,20 @@ class FallDetector:
             llm_model_path: LLaMA模型路径
             use_gpu: 是否使用GPU加速
             skip_frames: 跳帧间隔（1=每帧检测，2=每2帧检测1次，3=每3帧检测1次）
+            llm_timeout: 单次LLM分析的截止时间（秒，含排队时间）
+            llm_cache: LLM响应缓存（LLMResponseCache），为None时不使用缓存
+            imgsz: YOLO推理输入尺寸
+            segment_seconds: 预览输出的HLS分段时长（秒），检查点对齐到分段边界
         """
         self.fall_model_path = fall_model_path
         self.pose_model_path = pose_model_path
         self.llm_model_path = llm_model_path
         self.use_gpu = use_gpu
         self.skip_frames = max(1, skip_frames)  # 至少为1
+        self.llm_timeout = llm_timeout
+        self.llm_cache = llm_cache
+        self.imgsz = imgsz
+        self.segment_seconds = segment_seconds
         
         # 检查GPU可用性
         self.device = self._check_gpu_availability()
@@ -57,6 +128,8 @@ class FallDetector:
             'total_processing_time': 0
         }
         
+        # 当前处理到的帧号（供剖析器计算每帧内存增长）
+        self.current_frame = 0
         
     def _check_gpu_availability(self):
         """检查GPU可用性并选择设备"""
@@ -82,27 +155,17 @@ class FallDetector:
         try:
             print("🔄 正在加载模型...")
             
-            # 加载YOLO模型并设置设备
-            self.fall_model = YOLO(self.fall_model_path)
-            self.pose_model = YOLO(self.pose_model_path)
+            # 从进程级模型池获取YOLO模型（已预热的实例无需重新加载）
+            self.fall_model = _acquire_model(self.fall_model_path, self.device)
+            self.pose_model = _acquire_model(self.pose_model_path, self.device)
             
-            # 设置模型设备
-            if hasattr(self.fall_model, 'to'):
-                self.fall_model.to(self.device)
-            if hasattr(self.pose_model, 'to'):
-                self.pose_model.to(self.device)
-                
             print(f"✅ YOLO模型加载完成 (设备: {self.device})")
             print(f"⚡ 跳帧设置: 每{self.skip_frames}帧检测1次")
             
-            # 加载LLaMA模型
+            # 使用共享的LLM服务（模型由服务的工作线程统一加载和持有）
             if os.path.exists(self.llm_model_path):
-                self.llm = Llama(
-                    model_path=self.llm_model_path,
-                    n_ctx=512,
-                    verbose=False
-                )
-                print("✅ LLaMA模型加载完成")
+                self.llm = get_llm_service(self.llm_model_path, n_ctx=512)
+                print("✅ LLM分析服务已就绪")
             else:
                 self.llm = None
                 print("⚠️ LLaMA模型文件不存在，将跳过智能分析")
@@ -111,8 +174,35 @@ class FallDetector:
             print(f"❌ 模型加载失败: {str(e)}")
             raise
     
+    def warm_up(self):
+        """
+        用空白帧按配置的输入尺寸执行一次推理，提前完成首次推理的初始化开销
+
+        Returns:
+            float: 预热耗时（秒）
+        """
+        start = time.time()
+        dummy = np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        self.fall_model.predict(source=dummy, conf=0.50, iou=0.4, imgsz=self.imgsz,
+                                device=self.device, verbose=False)
+        self.pose_model.predict(source=dummy, conf=0.25, imgsz=self.imgsz,
+                                device=self.device, verbose=False)
+        elapsed = time.time() - start
+        print(f"🔥 YOLO模型预热完成 (输入尺寸: {self.imgsz}, 耗时: {elapsed:.2f}s)")
+        return elapsed
+
+    def release(self):
+        """将YOLO模型归还模型池（检测器之后不能再执行检测）"""
+        if getattr(self, 'fall_model', None) is not None:
+            _release_model(self.fall_model_path, self.device, self.fall_model)
+            self.fall_model = None
+        if getattr(self, 'pose_model', None) is not None:
+            _release_model(self.pose_model_path, self.device, self.pose_model)
+            self.pose_model = None
+
     def detect_video(self, video_path, output_path, confidence=0.5, 
-                    iou_threshold=0.4, progress_callback=None):
+                    iou_threshold=0.4, progress_callback=None, with_llm_analysis=True,
+                    source=None, preview_dir=None, thumbnails=None, control=None, checkpoint=None):
         """
         检测视频中的跌倒事件
         
@@ -122,6 +212,14 @@ class FallDetector:
             confidence: 检测置信度阈值
             iou_threshold: IOU阈值
             progress_callback: 进度回调函数
+            with_llm_analysis: 是否在检测结束后同步生成LLM分析；为False时由调用方
+                               通过generate_llm_analysis单独异步生成
+            source: 仍在上传的视频（UploadFollower），指定时边上传边检测，忽略video_path
+            preview_dir: 指定且ffmpeg可用时，输出同时写成该目录下的HLS分段，检测中即可预览
+            thumbnails: ThumbnailRecorder，指定时保存事件帧缩略图和定期缩略图雪碧图
+            control: JobControl，每帧处理前检查取消和抢占（取消时抛出JobCancelled）
+            checkpoint: CheckpointStore，指定时在输出分段边界定期保存检测状态，并从已有的检查点继续；
+                        需要preview_dir和ffmpeg（输出分段可续写），不支持边上传边检测
             
         Returns:
             dict: 检测结果
@@ -131,8 +229,8 @@ class FallDetector:
         out = None
         
         try:
-            # 打开视频
-            cap = cv2.VideoCapture(video_path)
+            # 打开视频（上传中的视频跟随已接收的数据读取）
+            cap = GrowingVideoCapture(source) if source is not None else cv2.VideoCapture(video_path)
             if not cap.isOpened():
                 raise ValueError(f"无法打开视频文件: {video_path}")
             
@@ -142,9 +240,34 @@ class FallDetector:
             fps = cap.get(cv2.CAP_PROP_FPS)
             total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
             
-            # 初始化视频写入器
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+            # 断点续跑：从输出分段已写完的最新检查点继续
+            resume = None
+            if checkpoint is not None and (source is not None or not preview_dir or not ffmpeg_available()):
+                print("⚠️ 断点续跑需要ffmpeg分段输出，本次检测不保存检查点")
+                checkpoint = None
+            if checkpoint is not None:
+                checkpoint.plan(fps, self.segment_seconds, signature={
+                    'video': os.path.basename(video_path),
+                    'total_frames': total_frames,
+                    'segment_seconds': self.segment_seconds,
+                    'skip_frames': self.skip_frames,
+                    'imgsz': self.imgsz,
+                    'confidence': confidence,
+                    'iou_threshold': iou_threshold,
+                    'window_size': self.window_size,
+                    'vote_threshold': self.vote_threshold
+                })
+                resume = checkpoint.load(completed_segments(preview_dir))
+            
+            # 初始化视频写入器（可预览的HLS分段，ffmpeg不可用时直接写MP4）
+            out = None
+            if preview_dir:
+                out = create_progressive_writer(output_path, preview_dir, fps, (width, height),
+                                                segment_seconds=self.segment_seconds,
+                                                resume_segment=resume['segment'] if resume else 0)
+            if out is None:
+                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+                out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
             
             # 检测状态
             fall_history = deque(maxlen=self.window_size)
@@ -157,21 +280,55 @@ class FallDetector:
             # 跳帧检测状态
             last_detection_result = (False, None)  # 缓存上次检测结果
             
+            # 首个跌倒事件的检测耗时（及其中等待上传数据的时长）
+            first_event_time = None
+            first_event_wait = 0.0
+            
+            if resume is not None:
+                skip_frames(cap, resume['frame'])
+                state = resume['state']
+                frame_count = state['frame_count']
+                fall_history.extend(state['fall_history'])
+                last_centers = [tuple(center) for center in state['last_centers']]
+                fall_events = state['fall_events']
+                error_count = state['error_count']
+                fall_detected, fall_info = state['last_detection_result']
+                if fall_info is not None:
+                    fall_info['center'] = tuple(fall_info['center'])
+                last_detection_result = (fall_detected, fall_info)
+                first_event_time = state['first_event_time']
+                first_event_wait = state['first_event_wait']
+                self.performance_stats.update(state['performance_stats'])
+                if thumbnails is not None and state['thumbnails'] is not None:
+                    thumbnails.restore_state(state['thumbnails'], resume['images'])
+                # 处理耗时只累计实际检测的时间，不含服务停止期间
+                start_time -= state['elapsed']
+                print(f"⏩ 从检查点继续: 第 {frame_count} 帧, 已有 {len(fall_events)} 个跌倒事件")
+            next_checkpoint = checkpoint.next_checkpoint(frame_count) if checkpoint is not None else None
+            
             if progress_callback:
                 progress_callback(0, "开始处理视频...")
             
             while True:
+                if control is not None:
+                    control.checkpoint()
                 try:
                     ret, frame = cap.read()
                     if not ret:
                         break
                     
                     frame_count += 1
+                    self.current_frame = frame_count
                     
                     # 更新进度
                     if progress_callback and frame_count % 30 == 0:
-                        progress = int((frame_count / total_frames) * 80)  # 80%用于检测
-                        progress_callback(progress, f"正在处理第 {frame_count}/{total_frames} 帧... (跳帧:{self.skip_frames})")
+                        if total_frames > 0:
+                            progress = int(min(1.0, frame_count / total_frames) * 80)  # 80%用于检测
+                        else:
+                            # 上传中的文件可能还读不到总帧数，按已接收的比例估算
+                            progress = int(source.fraction * 80) if source is not None else 0
+                        upload_note = f", 已上传{int(source.fraction * 100)}%" if source is not None and not source.complete else ""
+                        progress_callback(progress, f"正在处理第 {frame_count}/{total_frames or '?'} 帧... (跳帧:{self.skip_frames}{upload_note})")
                     
                     # 创建帧副本用于处理
                     display_frame = frame.copy()
@@ -179,9 +336,10 @@ class FallDetector:
                     # 跌倒检测 - 跳帧优化
                     fall_detected = False
                     fall_info = None
+                    event_recorded = False
                     
                     # 只在指定帧间隔进行检测
-                    if frame_count % self.skip_frames == 1:  # 第1帧开始，然后每skip_frames帧检测一次
+                    if self._is_detection_frame(frame_count):
                         try:
                             detection_start = time.time()
                             fall_detected, fall_info = self._detect_fall_in_frame(
@@ -210,8 +368,11 @@ class FallDetector:
                         fall_detected, fall_info = last_detection_result
                     
                     # 记录跌倒事件（只在实际检测帧记录，避免重复）
-                    if fall_detected and fall_info is not None and frame_count % self.skip_frames == 1:
+                    if fall_detected and fall_info is not None and self._is_detection_frame(frame_count):
                         try:
+                            if not fall_events:
+                                first_event_time = time.time() - start_time
+                                first_event_wait = getattr(cap, 'wait_time', 0.0)
                             fall_events.append({
                                 'frame': frame_count,
                                 'timestamp': frame_count / fps,
@@ -220,6 +381,7 @@ class FallDetector:
                                 'bbox': fall_info.get('bbox', []),
                                 'center': fall_info.get('center', [])
                             })
+                            event_recorded = True
                             print(f"⚠️ 检测到跌倒: 第{frame_count}帧 (跳帧模式)")
                         except Exception as event_error:
                             print(f"记录事件时出错: {event_error}")
@@ -232,18 +394,53 @@ class FallDetector:
                             print(f"标注第{frame_count}帧时出错: {annotate_error}")
                     
                     # 姿态检测 - 也应用跳帧优化
-                    if frame_count % self.skip_frames == 1:
+                    if self._is_detection_frame(frame_count):
                         try:
                             self._detect_pose_in_frame(display_frame)
                         except Exception as pose_error:
                             print(f"姿态检测第{frame_count}帧时出错: {pose_error}")
                     
+                    # 缩略图（使用已标注的帧）
+                    if thumbnails is not None:
+                        try:
+                            if event_recorded:
+                                thumbnails.capture_event(len(fall_events) - 1, display_frame, fall_events[-1])
+                            thumbnails.add_frame(frame_count / fps, display_frame)
+                        except Exception as thumbnail_error:
+                            print(f"保存第{frame_count}帧缩略图时出错: {thumbnail_error}")
+                    
                     # 写入帧
                     try:
                         out.write(display_frame)
                     except Exception as write_error:
                         print(f"写入第{frame_count}帧时出错: {write_error}")
                     
+                    # 检查点（在输出分段边界保存，恢复时从该分段重新写入）
+                    if next_checkpoint is not None and frame_count == next_checkpoint[1]:
+                        try:
+                            thumbnail_state, images = (thumbnails.get_state() if thumbnails is not None
+                                                       else (None, []))
+                            checkpoint.save(next_checkpoint[0], frame_count, {
+                                'frame_count': frame_count,
+                                'fall_history': list(fall_history),
+                                'last_centers': last_centers,
+                                'fall_events': fall_events,
+                                'error_count': error_count,
+                                'last_detection_result': last_detection_result,
+                                'first_event_time': first_event_time,
+                                'first_event_wait': first_event_wait,
+                                'performance_stats': {key: self.performance_stats[key] for key in
+                                                      ('frames_processed', 'frames_skipped', 'detection_time')},
+                                'thumbnails': thumbnail_state,
+                                'elapsed': time.time() - start_time
+                            }, images)
+                        except Exception as checkpoint_error:
+                            print(f"保存第{frame_count}帧检查点时出错: {checkpoint_error}")
+                        next_checkpoint = checkpoint.next_checkpoint(frame_count)
+                    
+                except (UploadAborted, JobCancelled):
+                    # 上传被放弃（后续数据不会再到达）或任务被取消
+                    raise
                 except Exception as frame_error:
                     print(f"处理第{frame_count}帧时出错: {frame_error}")
                     error_count += 1
@@ -253,19 +450,21 @@ class FallDetector:
                     # 继续处理下一帧
                     continue
             
-            if progress_callback:
-                progress_callback(90, "生成智能分析...")
-            
             # 生成智能分析
             llm_analysis = None
-            try:
-                llm_analysis = self._generate_llm_analysis(fall_events, video_path)
-            except Exception as llm_error:
-                print(f"LLM分析生成失败: {llm_error}")
-                llm_analysis = "智能分析生成失败"
+            if with_llm_analysis:
+                if progress_callback:
+                    progress_callback(90, "生成智能分析...")
+                try:
+                    llm_analysis = self._generate_llm_analysis(fall_events, video_path)
+                except Exception as llm_error:
+                    print(f"LLM分析生成失败: {llm_error}")
+                    llm_analysis = "智能分析生成失败"
             
             processing_time = time.time() - start_time
             self.performance_stats['total_processing_time'] = processing_time
+            if total_frames <= 0:
+                total_frames = frame_count
             
             # 计算性能指标
             avg_detection_time = (self.performance_stats['detection_time'] / 
@@ -295,6 +494,12 @@ class FallDetector:
                 'processing_time': processing_time,
                 'output_path': output_path,
                 'error_count': error_count,
+                'thumbnails': thumbnails.finish() if thumbnails is not None else None,
+                'timing': {
+                    'first_event_time': first_event_time,
+                    'first_event_input_wait': first_event_wait,
+                    'input_wait_time': getattr(cap, 'wait_time', 0.0)
+                },
                 'performance_stats': {
                     'frames_processed': self.performance_stats['frames_processed'],
                     'frames_skipped': self.performance_stats['frames_skipped'],
@@ -319,6 +524,10 @@ class FallDetector:
             except Exception as cleanup_error:
                 print(f"清理资源时出错: {cleanup_error}")
     
+    def _is_detection_frame(self, frame_count):
+        """第1帧开始，每skip_frames帧检测一次（skip_frames为1时逐帧检测）"""
+        return (frame_count - 1) % self.skip_frames == 0
+    
     def _detect_fall_in_frame(self, frame, last_centers, fall_history, frame_count):
         """在单帧中检测跌倒"""
         try:
@@ -327,6 +536,7 @@ class FallDetector:
                 source=frame, 
                 conf=0.50, 
                 iou=0.4, 
+                imgsz=self.imgsz,
                 device=self.device,
                 verbose=False  # 减少输出噪音
             )[0]
@@ -451,6 +661,7 @@ class FallDetector:
             pose_results = self.pose_model.predict(
                 source=frame, 
                 conf=0.25,
+                imgsz=self.imgsz,
                 device=self.device,
                 verbose=False  # 减少输出噪音
             )[0]
@@ -497,10 +708,31 @@ class FallDetector:
             # 继续处理，不中断视频处理
             pass
     
+    def generate_llm_analysis(self, fall_events, video_path=None, time_budget=None, on_token=None):
+        """
+        生成LLM智能分析（可在检测完成后作为独立阶段调用）
+        
+        Args:
+            fall_events: 跌倒事件列表
+            video_path: 输入视频路径
+            time_budget: 时间预算（秒，含排队），超出后使用备用分析；None表示使用llm_timeout
+            on_token: 流式回调，每生成一个token调用一次on_token(text)
+            
+        Returns:
+            dict: text为分析文本（无事件或LLM不可用时为None），
+                  source为llm/cache/fallback/none
+        """
+        text, source = self._run_llm_analysis(fall_events, time_budget or self.llm_timeout, on_token)
+        return {'text': text, 'source': source}
+    
     def _generate_llm_analysis(self, fall_events, video_path):
         """生成LLM智能分析"""
+        return self._run_llm_analysis(fall_events, self.llm_timeout)[0]
+    
+    def _run_llm_analysis(self, fall_events, timeout, on_token=None):
+        """生成LLM分析，返回(分析文本, 来源)"""
         if not self.llm or not fall_events:
-            return None
+            return None, 'none'
         
         try:
             # 限制分析的事件数量，避免token超限
@@ -524,41 +756,57 @@ class FallDetector:
                 }
             }
             
-            # 构建更详细的提示词
-            prompt = f"""你是一名专业的老年护理顾问。根据以下跌倒检测数据，提供专业的护理建议：
-
-检测结果摘要：
-- 总跌倒次数：{analysis_data['total_falls']}次
-- 跌倒类型：{', '.join(analysis_data['fall_types'])}
-- 检测置信度：最高{analysis_data['confidence_stats']['max']:.2f}，最低{analysis_data['confidence_stats']['min']:.2f}，平均{analysis_data['confidence_stats']['avg']:.2f}
-- 时间跨度：{analysis_data['time_distribution']['time_span']:.1f}秒
-
-请从以下几个方面提供专业建议：
-
-1. 风险评估：基于跌倒次数和类型评估风险等级（低/中/高）
-2. 即时措施：当前应该采取的紧急措施
-3. 预防建议：未来如何预防类似事件
-4. 环境改善：居住环境安全优化建议
-5. 医疗建议：是否需要寻求专业医疗帮助
-
-请用中文回答，语言温和关怀，建议具体可行。每个方面用简短的句子说明。"""
+            # 查询响应缓存：量化后摘要相同的分析直接复用
+            cache_key = None
+            if self.llm_cache is not None:
+                try:
+                    signature = generation_signature(LLM_PROMPT_PREFIX, LLM_PROMPT_TEMPLATE, self.llm_model_path,
+                                                     **LLM_GENERATION_PARAMS)
+                    cache_key, cache_summary = self.llm_cache.make_key(analysis_data, signature)
+                    cached_text = self.llm_cache.get(cache_key)
+                    if cached_text:
+                        print("🎯 LLM分析命中缓存")
+                        return cached_text, 'cache'
+                except Exception as cache_error:
+                    print(f"查询LLM缓存失败: {cache_error}")
+                    cache_key = None
+            
+            # 构建提示词：固定的指令前缀在前（KV状态可复用），可变的统计数据在后
+            prompt = LLM_PROMPT_TEMPLATE.format(
+                total_falls=analysis_data['total_falls'],
+                fall_types=', '.join(analysis_data['fall_types']),
+                max_confidence=analysis_data['confidence_stats']['max'],
+                min_confidence=analysis_data['confidence_stats']['min'],
+                avg_confidence=analysis_data['confidence_stats']['avg'],
+                time_span=analysis_data['time_distribution']['time_span']
+            )
             
             # 生成分析 - 增加token数以获得更详细的回答
-            response = self.llm(prompt, max_tokens=300, stop=["</s>"], temperature=0.7)
-            analysis_text = response["choices"][0]["text"].strip()
+            response = self.llm.generate(prompt, prefix=LLM_PROMPT_PREFIX, timeout=timeout, on_token=on_token,
+                                         **LLM_GENERATION_PARAMS)
+            analysis_text = response["text"].strip()
+            print(f"🤖 LLM分析完成: 排队{response['queue_wait']:.1f}s, 首token{response['time_to_first_token']:.2f}s"
+                  f"(前缀缓存:{response['prefix_cache']}), 生成{response['generation_time']:.1f}s, "
+                  f"{response['tokens_per_second']:.1f} tokens/s")
             
             # 如果回答太短，提供备用分析
             if len(analysis_text) < 50:
-                return self._generate_fallback_analysis(analysis_data)
+                return self._generate_fallback_analysis(analysis_data), 'fallback'
+            
+            if cache_key is not None:
+                try:
+                    self.llm_cache.put(cache_key, cache_summary, analysis_text, response['generation_time'])
+                except Exception as cache_error:
+                    print(f"写入LLM缓存失败: {cache_error}")
             
-            return analysis_text
+            return analysis_text, 'llm'
             
         except Exception as e:
             print(f"LLM分析生成失败: {str(e)}")
             return self._generate_fallback_analysis({
                 "total_falls": len(fall_events),
                 "fall_types": list(set([event.get('type', 'unknown') for event in fall_events]))
-            })
+            }), 'fallback'
     
     def _generate_fallback_analysis(self, analysis_data):
         """生成备用分析（当LLM不可用时）"""
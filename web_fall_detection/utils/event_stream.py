@@ -0,0 +1,110 @@
+"""
+事件流 - 任务级事件通道和Server-Sent Events格式化
+"""
+
+import json
+import threading
+
+
+class EventChannel:
+    """单个任务的事件通道：保留事件历史，订阅者按序号续读"""
+
+    def __init__(self, max_events=5000):
+        self.max_events = max_events
+        self._events = []  # [(序号, 事件名, 数据)]
+        self._seq = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def publish(self, event, data):
+        """发布事件并唤醒等待的订阅者"""
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, event, data))
+            if len(self._events) > self.max_events:
+                del self._events[:len(self._events) - self.max_events]
+            self._cond.notify_all()
+
+    @property
+    def last_seq(self):
+        """最新事件的序号（新订阅者从此处开始可跳过历史事件）"""
+        with self._cond:
+            return self._seq
+
+    def close(self):
+        """关闭通道，订阅者读完剩余事件后结束"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def read(self, after_seq=0, timeout=15):
+        """
+        读取序号大于after_seq的事件，没有新事件时最多等待timeout秒
+
+        Returns:
+            tuple: (事件列表, 通道是否已关闭)
+        """
+        with self._cond:
+            if self._seq <= after_seq and not self._closed:
+                self._cond.wait(timeout)
+            events = [item for item in self._events if item[0] > after_seq]
+            return events, self._closed
+
+
+class EventBroker:
+    """按键管理事件通道"""
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def channel(self, key):
+        """获取通道，不存在时创建"""
+        with self._lock:
+            channel = self._channels.get(key)
+            if channel is None:
+                channel = EventChannel()
+                self._channels[key] = channel
+            return channel
+
+    def get(self, key):
+        """获取已存在的通道，不存在时返回None"""
+        with self._lock:
+            return self._channels.get(key)
+
+    def discard(self, key):
+        """移除通道"""
+        with self._lock:
+            self._channels.pop(key, None)
+
+
+def format_sse(event, data, event_id=None):
+    """格式化为一条Server-Sent Events消息"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def parse_last_event_id(value):
+    """解析客户端重连时的Last-Event-ID请求头，缺失或格式不正确时返回0（从头读取）"""
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def stream_channel(channel, last_event_id=0, keepalive=15):
+    """将通道事件转为SSE消息生成器，通道关闭且事件读完后结束"""
+    last = last_event_id
+    while True:
+        events, closed = channel.read(last, timeout=keepalive)
+        for seq, event, data in events:
+            last = seq
+            yield format_sse(event, data, seq)
+        if closed and not events:
+            break
+        if not events:
+            yield ': keepalive\n\n'
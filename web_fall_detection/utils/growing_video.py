@@ -0,0 +1,243 @@
+"""
+边上传边检测 - 跟随断点续传会话中连续到达的数据，在上传完成前开始解码和检测
+分块可能乱序到达，检测只读取从文件开头起连续接收的前缀（复制到镜像文件），上传完成后切换到最终文件
+"""
+
+import os
+import time
+import threading
+from collections import deque
+
+import cv2
+
+from utils.resumable_upload import UploadSessionError
+
+# 读到已接收前缀末尾时，最后几帧可能只收到一部分，这些帧在更多数据到达后重新解码
+LOOKAHEAD_FRAMES = 3
+
+# 等待新数据的轮询间隔（秒）
+POLL_INTERVAL = 0.2
+
+# 会话目录消失（正在合并）后等待完成通知的最长时间（秒）
+FINISH_GRACE = 30
+
+# 超过该时长没有新数据视为上传停滞，检测放弃并释放工作槽位（秒）
+IDLE_TIMEOUT = 300
+
+
+class UploadAborted(Exception):
+    """上传被放弃或合并后的文件未通过校验，检测无法继续"""
+
+
+class UploadFollower:
+    """跟随一个上传会话：把连续接收的前缀追加到镜像文件，上传完成后指向最终文件"""
+
+    def __init__(self, store, upload_id, final_path, poll_interval=POLL_INTERVAL,
+                 idle_timeout=IDLE_TIMEOUT):
+        """
+        初始化跟随器
+
+        Args:
+            store: UploadSessionStore实例
+            upload_id: 上传会话ID
+            final_path: 上传完成后文件的保存路径（镜像文件保存在同一目录）
+            poll_interval: 检查新分块的间隔（秒）
+            idle_timeout: 没有新数据的最长等待时间（秒）
+        """
+        session = store.status(upload_id)
+        self.store = store
+        self.upload_id = upload_id
+        self.size = session['size']
+        self.upload_started = session['created_at']
+        self.upload_completed = None
+        self.final_path = final_path
+        self.mirror_path = os.path.join(os.path.dirname(final_path),
+                                        f".stream-{os.path.basename(final_path)}.part")
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.error = None
+        self._last_growth = time.time()
+        self._mirrored = 0
+        self._mirror = open(self.mirror_path, 'wb')
+        self._done = threading.Event()
+
+    @property
+    def complete(self):
+        return self.upload_completed is not None
+
+    @property
+    def path(self):
+        """当前可读取的文件：上传中为镜像文件，完成后为最终文件"""
+        return self.final_path if self.complete else self.mirror_path
+
+    @property
+    def fraction(self):
+        """已连续接收的比例"""
+        return 1.0 if self.complete else self._mirrored / self.size
+
+    def finish(self):
+        """上传已合并到final_path（由完成上传的请求调用）"""
+        self.upload_completed = time.time()
+        self._done.set()
+
+    def abort(self, message):
+        """上传被放弃或文件被拒绝"""
+        self.error = message
+        self._done.set()
+
+    def _sync(self):
+        """把新连续到达的数据追加到镜像文件，返回是否有新数据"""
+        start = self._mirrored
+        try:
+            for data in self.store.read_received(self.upload_id, start):
+                self._mirror.write(data)
+                self._mirrored += len(data)
+        except (UploadSessionError, FileNotFoundError):
+            # 会话正在合并或已被删除
+            return None
+        self._mirror.flush()
+        return self._mirrored > start
+
+    def wait_for_data(self, timeout=None):
+        """
+        等待更多连续数据或上传结束
+
+        Returns:
+            bool: 是否有新数据（或上传已完成）
+
+        Raises:
+            UploadAborted: 上传被放弃
+        """
+        deadline = time.time() + (self.poll_interval if timeout is None else timeout)
+        missing_since = None
+        while True:
+            if self.error:
+                raise UploadAborted(self.error)
+            if self.complete:
+                return True
+
+            grew = self._sync()
+            if grew:
+                self._last_growth = time.time()
+                return True
+            if grew is None:
+                # 会话目录已不存在：等待合并完成的通知，超时视为上传被放弃
+                missing_since = missing_since or time.time()
+                if time.time() - missing_since > FINISH_GRACE:
+                    raise UploadAborted('上传会话已失效')
+            elif time.time() - self._last_growth > self.idle_timeout:
+                raise UploadAborted(f'上传已停滞超过 {self.idle_timeout} 秒')
+            elif time.time() >= deadline:
+                return False
+            self._done.wait(self.poll_interval)
+
+    def close(self):
+        """删除镜像文件"""
+        if not self._mirror.closed:
+            self._mirror.close()
+        if os.path.exists(self.mirror_path):
+            os.remove(self.mirror_path)
+
+
+class GrowingVideoCapture:
+    """
+    接口与cv2.VideoCapture相同（isOpened/get/read/release），读取仍在上传的视频
+
+    读到已接收数据的末尾时等待更多数据，然后重新打开文件并定位到下一帧继续读取；
+    上传完成且读完最终文件后read返回(False, None)。
+    容器索引在文件末尾时（如普通MP4）前缀无法打开，此时等到上传完成才开始
+    """
+
+    def __init__(self, source, lookahead=LOOKAHEAD_FRAMES):
+        self.source = source
+        self.lookahead = lookahead
+        self.wait_time = 0.0    # 等待上传数据的总时长（秒）
+        self.reopens = 0
+        self._cap = None
+        self._final = False     # 当前打开的是否为上传完成后的最终文件
+        self._position = 0      # 已交给调用方的帧数
+        self._buffer = deque()  # 已解码、暂不交出的帧（可能不完整）
+        self._waiting_logged = False
+
+    def _open(self):
+        """打开当前可读取的文件并定位到下一个未交出的帧"""
+        final = self.source.complete
+        cap = cv2.VideoCapture(self.source.path)
+        if not cap.isOpened():
+            cap.release()
+            return False
+
+        if self._position and not cap.set(cv2.CAP_PROP_POS_FRAMES, self._position):
+            # 不支持定位时逐帧跳过
+            for _ in range(self._position):
+                if not cap.grab():
+                    break
+
+        if self._cap is not None:
+            self._cap.release()
+            self.reopens += 1
+        self._cap = cap
+        self._final = final
+        return True
+
+    def _wait(self):
+        start = time.time()
+        while not self.source.wait_for_data():
+            pass
+        self.wait_time += time.time() - start
+
+    def isOpened(self):
+        """等待到可以打开文件（已接收的前缀足以解析容器头）为止"""
+        while self._cap is None:
+            if self._open():
+                break
+            if self.source.complete:
+                return False
+            if not self._waiting_logged and self.source.fraction > 0:
+                print("⏳ 已接收的数据还不足以打开视频（容器索引可能在文件末尾），等待更多数据...")
+                self._waiting_logged = True
+            self._wait()
+        return True
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self._position)
+        return self._cap.get(prop) if self.isOpened() else 0.0
+
+    def _take(self):
+        self._position += 1
+        return True, self._buffer.popleft()
+
+    def read(self):
+        if not self.isOpened():
+            return False, None
+
+        while True:
+            if self._final:
+                if self._buffer:
+                    return self._take()
+                ret, frame = self._cap.read()
+                if ret:
+                    self._position += 1
+                return ret, frame
+
+            ret, frame = self._cap.read()
+            if ret:
+                self._buffer.append(frame)
+                if len(self._buffer) > self.lookahead:
+                    return self._take()
+                continue
+
+            # 读到已接收前缀的末尾：缓冲中的帧可能不完整，有新数据后重新打开并从这里解码
+            self._buffer.clear()
+            self._wait()
+            while not self._open():
+                if self.source.complete:
+                    raise UploadAborted(f"无法打开上传完成的视频文件: {self.source.path}")
+                self._wait()
+
+    def release(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+        self._buffer.clear()
@@ -0,0 +1,198 @@
+"""
+任务控制 - 检测任务的协作式取消和按优先级抢占
+检测循环每帧调用JobControl.checkpoint()：任务被取消时抛出JobCancelled，被更高优先级的任务抢占时
+让出工作槽位并在原地等待（视频读取位置、检测状态都保留在内存中），重新获得槽位后从下一帧继续
+"""
+
+import time
+import itertools
+import threading
+
+# 任务优先级：等待中的任务优先级高于运行中的任务时，运行中优先级最低的任务被暂停
+PRIORITIES = {
+    'batch': 0,     # 批量任务，可被抢占
+    'normal': 1,
+    'high': 2       # 交互任务
+}
+
+# 等待槽位或暂停期间检查外部取消请求的间隔（秒）
+POLL_INTERVAL = 1.0
+
+
+class JobCancelled(Exception):
+    """任务被取消"""
+
+
+class JobControl:
+    def __init__(self, task_id, priority='normal', poll_cancel=None, poll_interval=POLL_INTERVAL,
+                 on_state=None):
+        """
+        初始化任务控制
+
+        Args:
+            task_id: 任务ID
+            priority: 优先级名称（见PRIORITIES）
+            poll_cancel: 回调poll_cancel()，返回取消原因或None；用于读取其他进程发出的取消请求
+            poll_interval: poll_cancel的最小调用间隔（秒）
+            on_state: 回调on_state(state)，state为'paused'或'resumed'
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"未知的优先级: {priority}")
+        self.task_id = task_id
+        self.priority_name = priority
+        self.priority = PRIORITIES[priority]
+        self.poll_cancel = poll_cancel
+        self.poll_interval = poll_interval
+        self.on_state = on_state
+        self.cancel_reason = None
+        self.preempt_requested = False
+        self.paused_count = 0
+        self.paused_time = 0.0
+        self.pool = None
+        self.seq = None             # 首次排队的顺序，被抢占后按原顺序恢复
+        self._last_poll = 0.0
+
+    @property
+    def cancelled(self):
+        return self.cancel_reason is not None
+
+    def cancel(self, reason='任务已取消'):
+        """请求取消（检测线程在下一帧或等待中的下一次检查时退出）"""
+        if self.cancel_reason is None:
+            self.cancel_reason = reason
+        if self.pool is not None:
+            self.pool.wake()
+
+    def poll(self, force=False):
+        """检查外部取消请求（按间隔限频）"""
+        if self.cancelled or self.poll_cancel is None:
+            return
+        now = time.time()
+        if not force and now - self._last_poll < self.poll_interval:
+            return
+        self._last_poll = now
+        reason = self.poll_cancel()
+        if reason:
+            self.cancel(reason)
+
+    def checkpoint(self):
+        """
+        检测循环的检查点：处理取消和抢占
+
+        Raises:
+            JobCancelled: 任务已被取消
+        """
+        self.poll()
+        if self.cancelled:
+            raise JobCancelled(self.cancel_reason)
+        if self.preempt_requested and self.pool is not None:
+            self.pool.yield_slot(self)
+
+    def _notify(self, state):
+        if self.on_state is not None:
+            try:
+                self.on_state(state)
+            except Exception as e:
+                print(f"⚠️ 任务状态回调失败: {str(e)}")
+
+
+class WorkerPool:
+    """固定数量的检测工作槽位，按优先级（同优先级先到先得）分配，必要时抢占低优先级任务"""
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._cond = threading.Condition()
+        self._running = []
+        self._waiting = []
+        self._seq = itertools.count()
+        self.stats = {'preemptions': 0, 'resumed': 0, 'cancelled_waiting': 0}
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def _next_waiter(self):
+        return min(self._waiting, key=lambda control: (-control.priority, control.seq))
+
+    def _request_preemption(self):
+        """为更高优先级的等待任务暂停运行中优先级最低的任务（每个等待任务最多对应一次抢占）"""
+        if len(self._running) < self.max_workers:
+            return
+        higher = sorted((c for c in self._waiting if not c.cancelled), key=lambda c: -c.priority)
+        pending = [c for c in self._running if c.preempt_requested]
+        candidates = sorted((c for c in self._running if not c.preempt_requested),
+                            key=lambda c: (c.priority, -c.seq))
+        for waiter in higher[len(pending):]:
+            if not candidates or candidates[0].priority >= waiter.priority:
+                break
+            victim = candidates.pop(0)
+            victim.preempt_requested = True
+            self.stats['preemptions'] += 1
+            print(f"⏸️ 任务 {victim.task_id}（{victim.priority_name}）将让出工作槽位给"
+                  f"任务 {waiter.task_id}（{waiter.priority_name}）")
+
+    def acquire(self, control):
+        """
+        等待并占用一个工作槽位
+
+        Raises:
+            JobCancelled: 等待期间任务被取消
+        """
+        with self._cond:
+            if control.seq is None:
+                control.seq = next(self._seq)
+            control.pool = self
+            self._waiting.append(control)
+            try:
+                while True:
+                    if control.cancelled:
+                        self.stats['cancelled_waiting'] += 1
+                        raise JobCancelled(control.cancel_reason)
+                    if len(self._running) < self.max_workers and self._next_waiter() is control:
+                        break
+                    self._request_preemption()
+                    self._cond.wait(control.poll_interval)
+                    # 外部取消请求可能读取存储，不在持锁时调用
+                    self._cond.release()
+                    try:
+                        control.poll(force=True)
+                    finally:
+                        self._cond.acquire()
+            finally:
+                self._waiting.remove(control)
+                self._cond.notify_all()
+            control.preempt_requested = False
+            self._running.append(control)
+
+    def release(self, control):
+        with self._cond:
+            if control in self._running:
+                self._running.remove(control)
+            self._cond.notify_all()
+
+    def yield_slot(self, control):
+        """被抢占的任务在检查点让出槽位，重新排队（保持原顺序）直到再次获得槽位"""
+        paused_at = time.time()
+        self.release(control)
+        control.paused_count += 1
+        control._notify('paused')
+        print(f"⏸️ 任务 {control.task_id} 已暂停")
+        self.acquire(control)
+        control.paused_time += time.time() - paused_at
+        with self._cond:
+            self.stats['resumed'] += 1
+        control._notify('resumed')
+        print(f"▶️ 任务 {control.task_id} 继续检测（暂停 {time.time() - paused_at:.1f}s）")
+
+    def snapshot(self):
+        """运行、等待和暂停中的任务数"""
+        with self._cond:
+            return {
+                'max': self.max_workers,
+                'busy': len(self._running),
+                'idle': self.max_workers - len(self._running),
+                'queued': sum(1 for c in self._waiting if not c.paused_count),
+                'paused': sum(1 for c in self._waiting if c.paused_count),
+                'running': [{'task_id': c.task_id, 'priority': c.priority_name} for c in self._running],
+                'stats': dict(self.stats)
+            }
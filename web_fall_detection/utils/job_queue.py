@@ -0,0 +1,197 @@
+"""
+检测任务队列 - 生产模式下Web进程把检测任务放入SQLite队列，由独立的模型工作进程按优先级领取
+工作进程的心跳由监督进程写入，Web进程据此判断是否有可用的检测工作进程
+"""
+
+import os
+import json
+import time
+import sqlite3
+from contextlib import contextmanager
+
+from utils.job_control import PRIORITIES
+
+
+class JobQueue:
+    def __init__(self, db_path, max_attempts=3):
+        """
+        初始化任务队列
+
+        Args:
+            db_path: SQLite数据库文件路径
+            max_attempts: 同一任务最多被领取的次数（工作进程反复崩溃的任务不再重新排队）
+        """
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    task_id TEXT PRIMARY KEY,
+                    priority INTEGER NOT NULL,
+                    params TEXT NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    claimed_by TEXT,
+                    claimed_at REAL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(claimed_by, priority, enqueued_at)')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS workers (
+                    worker_id TEXT PRIMARY KEY,
+                    pid INTEGER NOT NULL,
+                    started_at REAL NOT NULL,
+                    heartbeat REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS queue_stats (
+                    name TEXT PRIMARY KEY,
+                    value REAL NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        """每次操作使用独立连接，事务结束后提交并关闭"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _bump(conn, name, amount=1):
+        conn.execute("""
+            INSERT INTO queue_stats (name, value) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+        """, (name, amount))
+
+    def enqueue(self, task_id, priority='normal', **params):
+        """放入队列（params为检测参数，如confidence、iou_threshold）"""
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO jobs (task_id, priority, params, enqueued_at) VALUES (?, ?, ?, ?)
+            """, (task_id, PRIORITIES[priority], json.dumps(dict(params, priority=priority)), time.time()))
+            self._bump(conn, 'enqueued')
+
+    def claim(self, worker_id):
+        """
+        领取优先级最高（同优先级先入队）的未领取任务
+
+        Returns:
+            dict: {'task_id', 'attempts', 'wait_time', 检测参数...}，队列为空时返回None
+        """
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        try:
+            # 选择与标记在同一个写事务中完成，多个工作进程不会领取同一任务
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute("""
+                    SELECT task_id, params, enqueued_at, attempts FROM jobs WHERE claimed_by IS NULL
+                    ORDER BY priority DESC, enqueued_at LIMIT 1
+                """).fetchone()
+                if row is not None:
+                    conn.execute("""
+                        UPDATE jobs SET claimed_by = ?, claimed_at = ?, attempts = attempts + 1 WHERE task_id = ?
+                    """, (worker_id, time.time(), row[0]))
+                    self._bump(conn, 'claimed')
+                    self._bump(conn, 'total_wait_time', time.time() - row[2])
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return dict(json.loads(row[1]), task_id=row[0], attempts=row[3] + 1, wait_time=time.time() - row[2])
+
+    def complete(self, task_id):
+        """任务结束（完成、失败或取消）后移出队列"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM jobs WHERE task_id = ?', (task_id,))
+            self._bump(conn, 'completed')
+
+    def discard(self, task_id):
+        """移除尚未被领取的任务（取消排队中的任务），已被领取时返回False"""
+        with self._connect() as conn:
+            return conn.execute('DELETE FROM jobs WHERE task_id = ? AND claimed_by IS NULL',
+                                (task_id,)).rowcount > 0
+
+    def contains(self, task_id):
+        with self._connect() as conn:
+            return conn.execute('SELECT 1 FROM jobs WHERE task_id = ?', (task_id,)).fetchone() is not None
+
+    def requeue(self, worker_id=None):
+        """
+        工作进程退出后把它领取的任务放回队列（worker_id为None时放回所有已领取的任务）
+
+        Returns:
+            tuple: (重新排队的任务ID列表, 超过最大领取次数而移出队列的任务ID列表)
+        """
+        condition, values = ('claimed_by IS NOT NULL', []) if worker_id is None else ('claimed_by = ?', [worker_id])
+        with self._connect() as conn:
+            rows = conn.execute(f'SELECT task_id, attempts FROM jobs WHERE {condition}', values).fetchall()
+            requeued = [task_id for task_id, attempts in rows if attempts < self.max_attempts]
+            exhausted = [task_id for task_id, attempts in rows if attempts >= self.max_attempts]
+            for task_id in requeued:
+                conn.execute('UPDATE jobs SET claimed_by = NULL, claimed_at = NULL WHERE task_id = ?', (task_id,))
+            for task_id in exhausted:
+                conn.execute('DELETE FROM jobs WHERE task_id = ?', (task_id,))
+            self._bump(conn, 'requeued', len(requeued))
+        return requeued, exhausted
+
+    def heartbeat(self, worker_id, pid):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT INTO workers (worker_id, pid, started_at, heartbeat) VALUES (?, ?, ?, ?)
+                ON CONFLICT(worker_id) DO UPDATE SET pid = excluded.pid, heartbeat = excluded.heartbeat
+            """, (worker_id, pid, now, now))
+
+    def remove_worker(self, worker_id):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM workers WHERE worker_id = ?', (worker_id,))
+
+    def live_workers(self, max_age):
+        """最近max_age秒内有心跳的工作进程数"""
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM workers WHERE heartbeat >= ?',
+                                (time.time() - max_age,)).fetchone()[0]
+
+    def snapshot(self, max_age):
+        """排队、运行中的任务数和工作进程状态"""
+        now = time.time()
+        with self._connect() as conn:
+            queued = conn.execute('SELECT COUNT(*) FROM jobs WHERE claimed_by IS NULL').fetchone()[0]
+            running = conn.execute("""
+                SELECT task_id, claimed_by, claimed_at, attempts FROM jobs WHERE claimed_by IS NOT NULL
+            """).fetchall()
+            workers = conn.execute('SELECT worker_id, pid, started_at, heartbeat FROM workers').fetchall()
+            counters = dict(conn.execute('SELECT name, value FROM queue_stats').fetchall())
+
+        jobs_by_worker = {worker_id: {'task_id': task_id, 'running_time': now - claimed_at, 'attempts': attempts}
+                          for task_id, worker_id, claimed_at, attempts in running}
+        live = [{'worker_id': worker_id, 'pid': pid, 'uptime': now - started_at, 'job': jobs_by_worker.get(worker_id)}
+                for worker_id, pid, started_at, heartbeat in workers if now - heartbeat <= max_age]
+        claimed = max(1, int(counters.get('claimed', 0)))
+        return {
+            'max': len(live),
+            'busy': sum(1 for worker in live if worker['job'] is not None),
+            'idle': sum(1 for worker in live if worker['job'] is None),
+            'queued': queued,
+            'running': [dict(job, worker_id=worker_id) for worker_id, job in jobs_by_worker.items()],
+            'processes': live,
+            'stats': {
+                'enqueued': int(counters.get('enqueued', 0)),
+                'claimed': int(counters.get('claimed', 0)),
+                'completed': int(counters.get('completed', 0)),
+                'requeued': int(counters.get('requeued', 0)),
+                'avg_queue_wait': counters.get('total_wait_time', 0.0) / claimed
+            }
+        }
@@ -0,0 +1,174 @@
+"""
+LLM响应缓存 - 以量化后的分析摘要和生成条件（提示词、模型、生成参数）为键持久化LLM输出，
+多个工作进程共享同一个SQLite文件
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+from contextlib import contextmanager
+
+# 时间跨度分桶边界（秒）
+TIME_SPAN_BUCKETS = [0, 5, 15, 30, 60, 120, 300, 600, 1800, 3600]
+
+
+def quantize_analysis(analysis_data, confidence_step=0.1):
+    """
+    将LLM分析输入数据量化为语义相近即相同的摘要
+
+    跌倒次数和类型保持精确，置信度按confidence_step取整，时间跨度按TIME_SPAN_BUCKETS分桶
+    """
+    confidence_stats = analysis_data.get('confidence_stats', {})
+    time_span = analysis_data.get('time_distribution', {}).get('time_span', 0)
+
+    span_bucket = 0
+    for i, bound in enumerate(TIME_SPAN_BUCKETS):
+        if time_span >= bound:
+            span_bucket = i
+
+    return {
+        'total_falls': analysis_data.get('total_falls', 0),
+        'fall_types': sorted(analysis_data.get('fall_types', [])),
+        'confidence': {
+            name: round(round(confidence_stats.get(name, 0) / confidence_step) * confidence_step, 2)
+            for name in ('max', 'min', 'avg')
+        },
+        'time_span_bucket': span_bucket
+    }
+
+
+def generation_signature(prefix, template, model_path, **params):
+    """
+    生成条件签名：提示词前缀、提示词模板、模型文件（路径、大小、修改时间）和生成参数，
+    任一变化时缓存键随之变化，旧条目不再命中（随TTL和容量淘汰）
+    """
+    try:
+        stat = os.stat(model_path)
+        model = [os.path.abspath(model_path), stat.st_size, stat.st_mtime_ns]
+    except OSError:
+        model = [os.path.abspath(model_path), None, None]
+    encoded = json.dumps({'prefix': prefix, 'template': template, 'model': model, 'params': params},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:16]
+
+
+class LLMResponseCache:
+    def __init__(self, db_path, ttl=7 * 24 * 3600, max_entries=1000):
+        """
+        初始化响应缓存
+
+        Args:
+            db_path: SQLite数据库文件路径
+            ttl: 缓存条目有效期（秒）
+            max_entries: 最大条目数，超出后按最近访问时间淘汰
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    summary TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    generation_time REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access)')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache_stats (
+                    name TEXT PRIMARY KEY,
+                    value REAL NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        """每次操作使用独立连接，事务结束后提交并关闭"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _bump(conn, name, amount=1):
+        conn.execute("""
+            INSERT INTO llm_cache_stats (name, value) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+        """, (name, amount))
+
+    def make_key(self, analysis_data, signature=''):
+        """根据量化摘要和生成条件签名（generation_signature）生成缓存键"""
+        summary = quantize_analysis(analysis_data)
+        encoded = json.dumps({'summary': summary, 'signature': signature}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest(), summary
+
+    def get(self, key):
+        """
+        查询缓存
+
+        Returns:
+            str: 命中时返回缓存的LLM输出，否则返回None
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT response, generation_time, created_at FROM llm_cache WHERE key = ?', (key,)
+            ).fetchone()
+
+            if row is not None and now - row[2] > self.ttl:
+                conn.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+                row = None
+
+            if row is None:
+                self._bump(conn, 'misses')
+                return None
+
+            conn.execute('UPDATE llm_cache SET last_access = ?, hits = hits + 1 WHERE key = ?', (now, key))
+            self._bump(conn, 'hits')
+            self._bump(conn, 'saved_seconds', row[1])
+            return row[0]
+
+    def put(self, key, summary, response, generation_time):
+        """写入缓存并按TTL和容量淘汰旧条目"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO llm_cache
+                    (key, summary, response, generation_time, created_at, last_access, hits)
+                VALUES (?, ?, ?, ?, ?, ?, 0)
+            """, (key, json.dumps(summary, ensure_ascii=False), response, generation_time, now, now))
+            conn.execute('DELETE FROM llm_cache WHERE created_at < ?', (now - self.ttl,))
+            conn.execute("""
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def get_stats(self):
+        """返回命中率和节省的生成时间"""
+        with self._connect() as conn:
+            entries = conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+            counters = dict(conn.execute('SELECT name, value FROM llm_cache_stats').fetchall())
+
+        hits = int(counters.get('hits', 0))
+        misses = int(counters.get('misses', 0))
+        return {
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0,
+            'saved_seconds': counters.get('saved_seconds', 0.0)
+        }
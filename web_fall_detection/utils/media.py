@@ -0,0 +1,153 @@
+"""
+媒体文件服务 - 支持Range/If-Range断点请求、强ETag和Last-Modified条件请求
+服务器提供wsgi.file_wrapper且能按Content-Length截断时使用sendfile零拷贝发送
+"""
+
+import os
+from flask import Response, request
+from werkzeug.http import http_date, parse_date, quote_etag, unquote_etag
+
+# 默认读取块大小（非零拷贝路径）
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+# 这些服务器的file_wrapper会用sendfile发送，并按Content-Length截断范围响应
+ZERO_COPY_SERVERS = ('gunicorn',)
+
+
+def file_etag(stat):
+    """根据inode、大小和纳秒级修改时间生成强ETag（输出文件写完后不再原地修改）"""
+    return f"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+
+def _parse_range(range_header, size):
+    """
+    解析单个字节范围
+
+    Returns:
+        tuple: (start, end)（end包含在内）；无Range头或包含多个范围时返回None；
+               范围不可满足时返回 (None, None)
+    """
+    if not range_header or not range_header.startswith('bytes='):
+        return None
+    spec = range_header[len('bytes='):].strip()
+    if ',' in spec:
+        # 多范围请求按RFC 7233可以直接返回完整内容
+        return None
+
+    start_text, sep, end_text = spec.partition('-')
+    if not sep:
+        return None
+    try:
+        if start_text == '':
+            # 后缀范围: bytes=-N 表示最后N个字节
+            suffix = int(end_text)
+            if suffix <= 0:
+                return None, None
+            start = max(0, size - suffix)
+            end = size - 1
+        else:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+            end = min(end, size - 1)
+    except ValueError:
+        return None
+
+    if start < 0 or start >= size or end < start:
+        return None, None
+    return start, end
+
+
+def _if_range_matches(if_range, etag, mtime):
+    """
+    If-Range只在验证器与当前文件一致时才允许返回部分内容（RFC 9110 13.1.5）：
+    ETag必须强比较相等，日期必须与Last-Modified完全相同（更早或更晚的日期都说明客户端缓存的不是当前文件）
+    """
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        value, weak = unquote_etag(if_range)
+        return not weak and value == etag
+    date = parse_date(if_range)
+    return date is not None and int(mtime) == int(date.timestamp())
+
+
+def _read_range(path, start, length, chunk_size):
+    """按块读取文件的指定范围"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            data = f.read(min(chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+def send_media(path, mimetype='video/mp4', download_name=None, chunk_size=DEFAULT_CHUNK_SIZE,
+               cache_control='no-cache', zero_copy=True):
+    """
+    发送媒体文件，处理条件请求和单个字节范围请求
+
+    Args:
+        path: 文件路径
+        mimetype: 响应类型
+        download_name: 指定时以附件形式下载
+        chunk_size: 非零拷贝路径的读取块大小
+        cache_control: Cache-Control响应头
+        zero_copy: 是否允许使用服务器的file_wrapper（sendfile）
+
+    Returns:
+        Response: 200 / 206 / 304 / 416 响应
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = file_etag(stat)
+
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': quote_etag(etag),
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': cache_control
+    }
+    if download_name:
+        headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+
+    # 条件GET：If-None-Match优先于If-Modified-Since
+    if request.if_none_match:
+        if request.if_none_match.contains(etag) or request.if_none_match.star_tag:
+            return Response(status=304, headers=headers)
+    elif request.if_modified_since and int(stat.st_mtime) <= int(request.if_modified_since.timestamp()):
+        return Response(status=304, headers=headers)
+
+    status = 200
+    start, end = 0, size - 1
+    byte_range = None
+    if _if_range_matches(request.headers.get('If-Range'), etag, stat.st_mtime):
+        byte_range = _parse_range(request.headers.get('Range'), size)
+
+    if byte_range == (None, None):
+        headers['Content-Range'] = f'bytes */{size}'
+        return Response(status=416, headers=headers)
+    if byte_range is not None:
+        start, end = byte_range
+        status = 206
+        headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    length = end - start + 1 if size else 0
+    headers['Content-Length'] = str(length)
+    if request.method == 'HEAD':
+        return Response(status=status, headers=headers, mimetype=mimetype)
+
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    server = request.environ.get('SERVER_SOFTWARE', '').lower()
+    # 范围响应只有在服务器会按Content-Length截断时才能交给file_wrapper
+    if zero_copy and file_wrapper is not None and (
+            length == size or server.startswith(ZERO_COPY_SERVERS)):
+        f = open(path, 'rb')
+        f.seek(start)
+        body = file_wrapper(f, chunk_size)
+    else:
+        body = _read_range(path, start, length, chunk_size)
+
+    return Response(body, status=status, headers=headers, mimetype=mimetype, direct_passthrough=True)
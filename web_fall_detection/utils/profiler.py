@@ -0,0 +1,114 @@
+"""
+任务剖析器 - 对运行中的检测任务进行按需采样剖析和内存快照
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+
+class TaskProfiler:
+    """对指定线程进行采样剖析，输出火焰图可用的折叠栈（collapsed stack）格式"""
+
+    def __init__(self, interval=0.005, max_depth=64):
+        """
+        Args:
+            interval: 采样间隔（秒）
+            max_depth: 单个调用栈最多记录的帧数
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+
+    def sample_thread(self, thread_id, duration):
+        """
+        对指定线程采样duration秒
+
+        Args:
+            thread_id: 目标线程的ident
+            duration: 采样时长（秒）
+
+        Returns:
+            dict: 采样数、实际时长以及折叠栈文本（每行"帧;帧;帧 次数"）
+        """
+        stacks = Counter()
+        samples = 0
+        start = time.perf_counter()
+        deadline = start + duration
+
+        while time.perf_counter() < deadline:
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                # 目标线程已结束
+                break
+
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            del frame
+
+            stacks[';'.join(reversed(stack))] += 1
+            samples += 1
+            time.sleep(self.interval)
+
+        collapsed = '\n'.join(f"{stack} {count}" for stack, count in stacks.most_common())
+        return {
+            'samples': samples,
+            'duration': time.perf_counter() - start,
+            'collapsed': collapsed
+        }
+
+    def trace_allocations(self, duration, frame_counter=None, top=30):
+        """
+        在duration秒窗口内比较两次tracemalloc快照，找出内存增长最多的代码行
+
+        Args:
+            duration: 观察窗口（秒）
+            frame_counter: 返回当前已处理帧数的函数，用于计算每帧增长
+            top: 报告中保留的条目数
+
+        Returns:
+            str: 文本格式的内存增长报告
+        """
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start(10)
+
+        try:
+            frames_before = frame_counter() if frame_counter else 0
+            snapshot_before = tracemalloc.take_snapshot()
+            time.sleep(duration)
+            snapshot_after = tracemalloc.take_snapshot()
+            frames_after = frame_counter() if frame_counter else 0
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ]
+        stats = snapshot_after.filter_traces(filters).compare_to(
+            snapshot_before.filter_traces(filters), 'lineno'
+        )
+
+        frames = frames_after - frames_before
+        total_diff = sum(stat.size_diff for stat in stats)
+        lines = [
+            f"# tracemalloc 窗口: {duration:.1f}s, 处理帧数: {frames}",
+            f"# 总增长: {total_diff / 1024:.1f} KiB"
+            + (f", 每帧: {total_diff / frames / 1024:.2f} KiB" if frames > 0 else ""),
+            "# 位置\t增长(KiB)\t对象数增长\t每帧增长(KiB)",
+        ]
+        for stat in stats[:top]:
+            location = stat.traceback[0]
+            per_frame = f"{stat.size_diff / frames / 1024:.3f}" if frames > 0 else "-"
+            lines.append(
+                f"{location.filename}:{location.lineno}\t{stat.size_diff / 1024:.1f}"
+                f"\t{stat.count_diff}\t{per_frame}"
+            )
+
+        return '\n'.join(lines)
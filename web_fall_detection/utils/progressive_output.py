@@ -0,0 +1,190 @@
+"""
+渐进式输出 - 标注后的帧经ffmpeg编码为H.264，写成fMP4分段的HLS（播放列表随分段完成滚动更新），
+检测进行中即可播放已处理的部分；结束时把分段无损封装为完整的MP4输出文件
+已写完的分段在进程重启后仍然有效，可以截断到某个分段边界后继续追加（断点续跑）
+未安装ffmpeg时不可用，检测器回退到cv2.VideoWriter
+"""
+
+import os
+import re
+import math
+import shutil
+import tempfile
+import subprocess
+
+FFMPEG = 'ffmpeg'
+
+PLAYLIST_NAME = 'index.m3u8'
+INIT_SEGMENT = 'init.mp4'
+SEGMENT_PATTERN = 'segment_%05d.m4s'
+SEGMENT_SECONDS = 2
+
+# 可通过预览接口访问的文件名（播放列表、初始化分段和媒体分段）
+PREVIEW_FILE_RE = re.compile(r'^(index\.m3u8|init\.mp4|segment_\d{5}\.m4s)$')
+
+
+def ffmpeg_available():
+    return shutil.which(FFMPEG) is not None
+
+
+def segment_start_frame(index, fps, segment_seconds=SEGMENT_SECONDS):
+    """第index个分段的起始帧号（关键帧强制在 t >= index * segment_seconds 的第一帧）"""
+    return int(math.ceil(index * segment_seconds * fps - 1e-6))
+
+
+def completed_segments(hls_dir):
+    """播放列表中已写完的分段数（分段先写临时文件，写完才加入播放列表）"""
+    path = os.path.join(hls_dir, PLAYLIST_NAME)
+    if not os.path.exists(path):
+        return 0
+    with open(path, encoding='utf-8') as f:
+        return sum(1 for line in f if line.strip() and not line.startswith('#'))
+
+
+def truncate_playlist(hls_dir, segments):
+    """只保留前segments个分段：删除之后的分段文件和播放列表结束标记，用于从分段边界继续写入"""
+    path = os.path.join(hls_dir, PLAYLIST_NAME)
+    kept, pending, count = [], [], 0
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f.read().splitlines():
+                if line.startswith('#EXT-X-ENDLIST') or not line.strip():
+                    continue
+                if line.startswith('#'):
+                    # 标签属于其后的分段（头部标签随第一个分段保留）
+                    pending.append(line)
+                    continue
+                if count >= segments:
+                    break
+                kept.extend(pending)
+                kept.append(line)
+                pending = []
+                count += 1
+    for name in os.listdir(hls_dir):
+        if PREVIEW_FILE_RE.match(name) and name.startswith('segment_') and int(name[8:13]) >= count:
+            os.remove(os.path.join(hls_dir, name))
+    if count:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(kept) + '\n')
+    elif os.path.exists(path):
+        os.remove(path)
+    return count
+
+
+class ProgressiveVideoWriter:
+    """接口与cv2.VideoWriter相同（isOpened/write/release），同时生成HLS预览分段和最终MP4"""
+
+    def __init__(self, output_path, hls_dir, fps, frame_size, segment_seconds=SEGMENT_SECONDS, preset='veryfast',
+                 resume_segment=0):
+        """
+        启动ffmpeg编码进程
+
+        Args:
+            output_path: 检测结束后生成的MP4路径
+            hls_dir: 播放列表和分段的目录
+            fps: 帧率
+            frame_size: (宽, 高)
+            segment_seconds: 分段时长（秒），也是预览相对检测进度的最大延迟
+            preset: x264编码预设
+            resume_segment: 大于0时保留已有的前resume_segment个分段，从第resume_segment个分段的
+                起始帧（segment_start_frame）继续追加，时间戳接续之前的分段
+        """
+        self.output_path = output_path
+        self.hls_dir = hls_dir
+        self.playlist_path = os.path.join(hls_dir, PLAYLIST_NAME)
+        self.frames = 0
+        self._failed = False
+        os.makedirs(hls_dir, exist_ok=True)
+
+        hls_flags = 'independent_segments+temp_file'
+        resume_args = []
+        if resume_segment:
+            resume_segment = truncate_playlist(hls_dir, resume_segment)
+            hls_flags += '+append_list'
+            # append_list从播放列表中已有的分段继续编号，时间戳接续到该分段的起始帧
+            resume_args = ['-output_ts_offset', f'{segment_start_frame(resume_segment, fps, segment_seconds) / fps:.6f}']
+        self.resume_segment = resume_segment
+
+        width, height = frame_size
+        command = [
+            FFMPEG, '-hide_banner', '-loglevel', 'error', '-y',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+            '-an', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',   # yuv420p要求宽高为偶数
+            '-c:v', 'libx264', '-preset', preset, '-pix_fmt', 'yuv420p',
+            # 每个分段从关键帧开始，分段可独立解码
+            '-force_key_frames', f'expr:gte(t,n_forced*{segment_seconds})',
+            *resume_args,
+            '-f', 'hls', '-hls_time', str(segment_seconds), '-hls_list_size', '0',
+            '-hls_playlist_type', 'event', '-hls_segment_type', 'fmp4',
+            '-hls_fmp4_init_filename', INIT_SEGMENT,
+            '-hls_flags', hls_flags,
+            '-hls_segment_filename', os.path.join(hls_dir, SEGMENT_PATTERN),
+            self.playlist_path
+        ]
+        self._log = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=self._log)
+
+    def isOpened(self):
+        return self._process.poll() is None
+
+    def write(self, frame):
+        if self._failed:
+            return
+        try:
+            self._process.stdin.write(frame.tobytes())
+            self.frames += 1
+        except (BrokenPipeError, OSError):
+            # 编码进程已退出，后续帧不再写入，release时报告错误
+            self._failed = True
+            print(f"⚠️ 预览编码进程异常退出: {self._stderr()}")
+
+    def _stderr(self):
+        self._log.seek(0)
+        return self._log.read().decode('utf-8', 'replace').strip()
+
+    def release(self):
+        """结束编码（播放列表写入结束标记）并封装最终MP4"""
+        if self._process.stdin and not self._process.stdin.closed:
+            try:
+                self._process.stdin.close()
+            except OSError:
+                pass
+        code = self._process.wait()
+        if code != 0 or self._failed:
+            raise RuntimeError(f"ffmpeg编码失败({code}): {self._stderr()}")
+        self._log.close()
+        self._remux()
+
+    def _remux(self):
+        """分段无损封装为MP4（moov前置便于边下边播）；失败时直接拼接为fragmented MP4"""
+        result = subprocess.run([
+            FFMPEG, '-hide_banner', '-loglevel', 'error', '-y',
+            '-i', self.playlist_path, '-c', 'copy', '-movflags', '+faststart', self.output_path
+        ], capture_output=True)
+        if result.returncode == 0:
+            return
+        print(f"⚠️ 封装MP4失败，改为拼接分段: {result.stderr.decode('utf-8', 'replace').strip()}")
+        segments = sorted(name for name in os.listdir(self.hls_dir) if PREVIEW_FILE_RE.match(name)
+                          and name.startswith('segment_'))
+        with open(self.output_path, 'wb') as out:
+            for name in [INIT_SEGMENT] + segments:
+                with open(os.path.join(self.hls_dir, name), 'rb') as f:
+                    shutil.copyfileobj(f, out)
+
+
+def create_progressive_writer(output_path, hls_dir, fps, frame_size, segment_seconds=SEGMENT_SECONDS,
+                              resume_segment=0):
+    """
+    创建渐进式输出写入器（resume_segment见ProgressiveVideoWriter）
+
+    Returns:
+        ProgressiveVideoWriter: ffmpeg不可用或启动失败时返回None（调用方回退到cv2.VideoWriter）
+    """
+    if not ffmpeg_available():
+        return None
+    try:
+        return ProgressiveVideoWriter(output_path, hls_dir, fps, frame_size, segment_seconds,
+                                      resume_segment=resume_segment)
+    except OSError as e:
+        print(f"⚠️ 无法启动ffmpeg，预览分段不可用: {str(e)}")
+        return None
@@ -0,0 +1,269 @@
+"""
+断点续传 - 分块上传会话：创建会话、查询已接收分块、并行上传分块、合并校验
+会话保存在磁盘目录中（每个分块一个标记文件），多个工作进程共享且无需加锁
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+
+from utils.upload import HEADER_BYTES, sniff_container
+
+READ_SIZE = 64 * 1024
+
+
+class UploadSessionError(Exception):
+    """会话操作失败，status为对应的HTTP状态码"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class UploadSessionStore:
+    def __init__(self, root, chunk_size=8 * 1024 * 1024, max_size=None, ttl=24 * 3600):
+        """
+        初始化上传会话存储
+
+        Args:
+            root: 会话目录
+            chunk_size: 分块大小（字节）
+            max_size: 单个文件的最大字节数，None表示不限制
+            ttl: 会话在最后一次活动后保留的时长（秒），超时由清理线程删除
+        """
+        self.root = root
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.ttl = ttl
+        self._janitor = None
+        self._janitor_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _session_dir(self, upload_id):
+        # upload_id由服务端生成（uuid hex），拒绝其他形式以防路径穿越
+        if len(upload_id) != 32 or not all(c in '0123456789abcdef' for c in upload_id):
+            raise UploadSessionError('上传会话不存在', 404)
+        return os.path.join(self.root, upload_id)
+
+    def _load_meta(self, upload_id):
+        session_dir = self._session_dir(upload_id)
+        try:
+            with open(os.path.join(session_dir, 'meta.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadSessionError('上传会话不存在或已过期', 404)
+
+    def _chunk_length(self, meta, index):
+        start = index * meta['chunk_size']
+        return min(meta['chunk_size'], meta['size'] - start)
+
+    def _received(self, upload_id):
+        chunk_dir = os.path.join(self._session_dir(upload_id), 'chunks')
+        try:
+            names = os.listdir(chunk_dir)
+        except FileNotFoundError:
+            # 会话在读取元数据后被合并完成或清理
+            raise UploadSessionError('上传会话不存在或已过期', 404)
+        return sorted(int(name[:-3]) for name in names if name.endswith('.ok'))
+
+    def create(self, filename, size):
+        """创建上传会话并预分配数据文件"""
+        if size <= 0:
+            raise UploadSessionError('文件大小无效')
+        if self.max_size is not None and size > self.max_size:
+            raise UploadSessionError('文件过大', 413)
+
+        upload_id = uuid.uuid4().hex
+        session_dir = self._session_dir(upload_id)
+        os.makedirs(os.path.join(session_dir, 'chunks'))
+        with open(os.path.join(session_dir, 'data.part'), 'wb') as f:
+            f.truncate(size)
+
+        meta = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'size': size,
+            'chunk_size': self.chunk_size,
+            'total_chunks': (size + self.chunk_size - 1) // self.chunk_size,
+            'created_at': time.time()
+        }
+        with open(os.path.join(session_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        self.start_janitor()
+        return self.status(upload_id)
+
+    def status(self, upload_id):
+        """
+        查询会话状态
+
+        Returns:
+            dict: 会话信息、已接收分块列表和连续接收的字节偏移量（offset）
+        """
+        meta = self._load_meta(upload_id)
+        received = self._received(upload_id)
+        offset = 0
+        for expected, index in enumerate(received):
+            if index != expected:
+                break
+            offset += self._chunk_length(meta, index)
+        return dict(meta, received=received, offset=offset,
+                    expires_at=os.path.getmtime(self._session_dir(upload_id)) + self.ttl)
+
+    def write_chunk(self, upload_id, index, stream, expected_sha256=None):
+        """
+        将请求体写入指定分块位置（重复上传同一分块是安全的）
+
+        Args:
+            stream: 请求体输入流
+            expected_sha256: 客户端提供的分块SHA-256，不一致时拒绝
+        """
+        meta = self._load_meta(upload_id)
+        if index < 0 or index >= meta['total_chunks']:
+            raise UploadSessionError('分块序号超出范围')
+        length = self._chunk_length(meta, index)
+        session_dir = self._session_dir(upload_id)
+        marker = os.path.join(session_dir, 'chunks', f'{index}.ok')
+        try:
+            f = open(os.path.join(session_dir, 'data.part'), 'r+b')
+        except FileNotFoundError:
+            raise UploadSessionError('上传正在合并或已经完成', 409)
+        if os.path.exists(marker):
+            # 重传已接收的分块：先撤销标记，写入中断时该分块会被视为未接收
+            os.remove(marker)
+
+        sha256 = hashlib.sha256()
+        written = 0
+        with f:
+            f.seek(index * meta['chunk_size'])
+            while True:
+                data = stream.read(READ_SIZE)
+                if not data:
+                    break
+                written += len(data)
+                if written > length:
+                    raise UploadSessionError(f'分块大小不正确，应为 {length} 字节')
+                sha256.update(data)
+                f.write(data)
+
+        if written != length:
+            raise UploadSessionError(f'分块不完整: 收到 {written} / {length} 字节')
+        digest = sha256.hexdigest()
+        if expected_sha256 and expected_sha256.lower() != digest:
+            raise UploadSessionError('分块校验失败（SHA-256不一致）', 422)
+
+        try:
+            with open(marker, 'w') as f:
+                f.write(digest)
+            os.utime(session_dir)  # 刷新会话活动时间
+        except FileNotFoundError:
+            raise UploadSessionError('上传正在合并或已经完成', 409)
+        return {'index': index, 'size': written, 'sha256': digest}
+
+    def read_received(self, upload_id, start=0):
+        """
+        按块读取从start起、到连续接收偏移量为止的数据（用于边上传边处理）
+
+        Yields:
+            bytes: 数据块
+        """
+        offset = self.status(upload_id)['offset']
+        with open(os.path.join(self._session_dir(upload_id), 'data.part'), 'rb') as f:
+            f.seek(start)
+            remaining = offset - start
+            while remaining > 0:
+                data = f.read(min(1024 * 1024, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+
+    def assemble(self, upload_id, dest_path, expected_sha256=None):
+        """
+        所有分块到齐后校验完整文件并移动到目标路径，随后删除会话
+
+        Returns:
+            dict: 文件名、大小、SHA-256和容器格式
+        """
+        meta = self._load_meta(upload_id)
+        received = self._received(upload_id)
+        missing = sorted(set(range(meta['total_chunks'])) - set(received))
+        if missing:
+            raise UploadSessionError(f'还有 {len(missing)} 个分块未上传', 409)
+
+        session_dir = self._session_dir(upload_id)
+        data_path = os.path.join(session_dir, 'data.part')
+        # 重命名数据文件认领合并（原子操作，多个进程同时完成同一会话时只有一个成功）
+        claimed_path = os.path.join(session_dir, 'data.assembling')
+        try:
+            os.rename(data_path, claimed_path)
+        except FileNotFoundError:
+            raise UploadSessionError('上传正在合并或已经完成', 409)
+
+        try:
+            sha256 = hashlib.sha256()
+            with open(claimed_path, 'rb') as f:
+                header = f.read(HEADER_BYTES)
+                f.seek(0)
+                while True:
+                    data = f.read(1024 * 1024)
+                    if not data:
+                        break
+                    sha256.update(data)
+            digest = sha256.hexdigest()
+            if expected_sha256 and expected_sha256.lower() != digest:
+                raise UploadSessionError('文件校验失败（SHA-256不一致），请重新上传', 422)
+            shutil.move(claimed_path, dest_path)
+        except Exception:
+            # 未完成合并时放回数据文件，会话保持可续传
+            if os.path.exists(claimed_path):
+                os.rename(claimed_path, data_path)
+            raise
+        self.discard(upload_id)
+        return {
+            'filename': meta['filename'],
+            'size': meta['size'],
+            'sha256': digest,
+            'container': sniff_container(header)
+        }
+
+    def discard(self, upload_id):
+        """删除会话及其数据"""
+        shutil.rmtree(self._session_dir(upload_id), ignore_errors=True)
+
+    def cleanup_expired(self):
+        """删除超过ttl未活动的会话，返回删除数量"""
+        now = time.time()
+        removed = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if os.path.isdir(path) and now - os.path.getmtime(path) > self.ttl:
+                    shutil.rmtree(path, ignore_errors=True)
+                    removed += 1
+            except OSError:
+                continue
+        if removed:
+            print(f"🧹 已清理 {removed} 个过期的上传会话")
+        return removed
+
+    def start_janitor(self, interval=600):
+        """启动定期清理过期会话的后台线程（每个进程一个）"""
+        with self._janitor_lock:
+            if self._janitor is not None:
+                return
+
+            def run():
+                while True:
+                    try:
+                        self.cleanup_expired()
+                    except Exception as e:
+                        print(f"⚠️ 清理上传会话失败: {str(e)}")
+                    time.sleep(interval)
+
+            self._janitor = threading.Thread(target=run, name='upload-janitor', daemon=True)
+            self._janitor.start()
@@ -0,0 +1,281 @@
+"""
+存储管理 - 记录每个任务在上传目录和输出目录中占用的文件，按目录和租户配额淘汰最久未访问的文件
+淘汰只删除视频等大文件，任务元数据和检测事件保留；记录保存在SQLite文件中，多个工作进程共享
+"""
+
+import os
+import json
+import time
+import shutil
+import sqlite3
+from contextlib import contextmanager
+
+
+def measure(paths):
+    """文件和目录（递归）的总字节数，不存在的路径计为0"""
+    total = 0
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in files:
+                    try:
+                        total += os.path.getsize(os.path.join(root, name))
+                    except OSError:
+                        pass
+        elif os.path.isfile(path):
+            total += os.path.getsize(path)
+    return total
+
+
+def remove_paths(paths):
+    for path in paths:
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            print(f"⚠️ 删除文件失败: {path}: {str(e)}")
+
+
+class StorageManager:
+    def __init__(self, db_path, quotas=None, tenant_quota=None, tenant_quotas=None, min_idle=300,
+                 touch_interval=60, can_evict=None, on_evict=None):
+        """
+        初始化存储管理器
+
+        Args:
+            db_path: SQLite数据库文件路径
+            quotas: 各存储区的配额 {区域名: 字节数}，None表示不限
+            tenant_quota: 每个租户（所有区域合计）的默认配额，None表示不限
+            tenant_quotas: 指定租户的配额 {租户: 字节数}，覆盖默认配额
+            min_idle: 最近该时长内访问过的文件不淘汰（秒），避免刚生成的结果立即被删除
+            touch_interval: 访问时间的最小更新间隔（秒），减少视频范围请求带来的写入
+            can_evict: 回调can_evict(task_id, area)，返回False时跳过该任务（如检测进行中）
+            on_evict: 回调on_evict(task_id, area, size)，文件删除后调用
+        """
+        self.db_path = db_path
+        self.quotas = dict(quotas or {})
+        self.tenant_quota = tenant_quota
+        self.tenant_quotas = dict(tenant_quotas or {})
+        self.min_idle = min_idle
+        self.touch_interval = touch_interval
+        self.can_evict = can_evict
+        self.on_evict = on_evict
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS artifacts (
+                    task_id TEXT NOT NULL,
+                    area TEXT NOT NULL,
+                    tenant TEXT NOT NULL,
+                    paths TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (task_id, area)
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_artifacts_area_access ON artifacts(area, last_access)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_artifacts_tenant_access ON artifacts(tenant, last_access)')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS storage_stats (
+                    name TEXT PRIMARY KEY,
+                    value REAL NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        """每次操作使用独立连接，事务结束后提交并关闭"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _bump(conn, name, amount=1):
+        conn.execute("""
+            INSERT INTO storage_stats (name, value) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+        """, (name, amount))
+
+    def quota_for_tenant(self, tenant):
+        return self.tenant_quotas.get(tenant, self.tenant_quota)
+
+    def register(self, task_id, area, tenant, paths, last_access=None):
+        """
+        登记（或更新）任务在某个区域的文件并执行配额检查
+
+        Args:
+            task_id: 任务ID
+            area: 存储区域（如uploads / outputs）
+            tenant: 租户
+            paths: 文件或目录路径列表
+            last_access: 最近访问时间，默认为当前时间（登记既有文件时可传入文件修改时间）
+
+        Returns:
+            list: 本次淘汰的 (task_id, area, size)
+        """
+        now = time.time()
+        last_access = now if last_access is None else last_access
+        size = measure(paths)
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT INTO artifacts (task_id, area, tenant, paths, size, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(task_id, area) DO UPDATE SET
+                    tenant = excluded.tenant, paths = excluded.paths, size = excluded.size,
+                    last_access = excluded.last_access
+            """, (task_id, area, tenant, json.dumps(paths), size, now, last_access))
+        return self.enforce()
+
+    def is_registered(self, task_id, area):
+        with self._connect() as conn:
+            return conn.execute('SELECT 1 FROM artifacts WHERE task_id = ? AND area = ?',
+                                (task_id, area)).fetchone() is not None
+
+    def touch(self, task_id, area):
+        """记录一次访问（更新LRU顺序）"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("""
+                UPDATE artifacts SET last_access = ? WHERE task_id = ? AND area = ? AND last_access < ?
+            """, (now, task_id, area, now - self.touch_interval))
+
+    def refresh(self, task_id, area):
+        """重新统计文件大小（目录中新增了文件，如事件片段）并执行配额检查"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT paths FROM artifacts WHERE task_id = ? AND area = ?',
+                               (task_id, area)).fetchone()
+            if row is None:
+                return []
+            conn.execute('UPDATE artifacts SET size = ?, last_access = ? WHERE task_id = ? AND area = ?',
+                         (measure(json.loads(row[0])), time.time(), task_id, area))
+        return self.enforce()
+
+    def _evictable(self, task_id, area, last_access, now):
+        if now - last_access < self.min_idle:
+            return False
+        return self.can_evict is None or self.can_evict(task_id, area)
+
+    def _select_victims(self, conn, now):
+        """按最近访问时间从旧到新选出需要淘汰的文件，使各区域和各租户回到配额以内"""
+        victims = {}
+
+        def reduce(rows, total, quota):
+            for task_id, area, size, last_access in rows:
+                if total <= quota:
+                    break
+                if (task_id, area) in victims:
+                    continue
+                if self._evictable(task_id, area, last_access, now):
+                    victims[(task_id, area)] = size
+                    total -= size
+
+        for area, quota in self.quotas.items():
+            if quota is None:
+                continue
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM artifacts WHERE area = ?',
+                                 (area,)).fetchone()[0]
+            if total > quota:
+                rows = conn.execute("""
+                    SELECT task_id, area, size, last_access FROM artifacts
+                    WHERE area = ? ORDER BY last_access
+                """, (area,))
+                reduce(rows, total, quota)
+
+        for tenant, total in conn.execute('SELECT tenant, SUM(size) FROM artifacts GROUP BY tenant').fetchall():
+            quota = self.quota_for_tenant(tenant)
+            if quota is None or total <= quota:
+                continue
+            rows = conn.execute("""
+                SELECT task_id, area, size, last_access FROM artifacts
+                WHERE tenant = ? ORDER BY last_access
+            """, (tenant,)).fetchall()
+            total -= sum(victims.get((task_id, area), 0) for task_id, area, _, _ in rows)
+            reduce(rows, total, quota)
+        return victims
+
+    def enforce(self):
+        """
+        淘汰超出配额的文件（各区域配额和租户配额）
+
+        Returns:
+            list: 淘汰的 (task_id, area, size)
+        """
+        if not any(quota is not None for quota in self.quotas.values()) \
+                and self.tenant_quota is None and not self.tenant_quotas:
+            return []
+
+        now = time.time()
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        try:
+            # 选择与删除记录在同一个写事务中完成，多个进程不会重复淘汰
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                victims = self._select_victims(conn, now)
+                evicted = []
+                for (task_id, area), size in victims.items():
+                    row = conn.execute('SELECT paths FROM artifacts WHERE task_id = ? AND area = ?',
+                                       (task_id, area)).fetchone()
+                    conn.execute('DELETE FROM artifacts WHERE task_id = ? AND area = ?', (task_id, area))
+                    evicted.append((task_id, area, size, json.loads(row[0])))
+                    self._bump(conn, f'evicted_{area}')
+                    self._bump(conn, f'evicted_{area}_bytes', size)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+
+        for task_id, area, size, paths in evicted:
+            remove_paths(paths)
+            print(f"🧹 存储配额淘汰: 任务 {task_id} 的{area}文件 ({size / 1024 / 1024:.1f} MB)")
+            if self.on_evict:
+                try:
+                    self.on_evict(task_id, area, size)
+                except Exception as e:
+                    print(f"⚠️ 淘汰回调失败: {str(e)}")
+        return [(task_id, area, size) for task_id, area, size, _ in evicted]
+
+    def usage(self):
+        """各区域和各租户的占用、配额与淘汰统计"""
+        with self._connect() as conn:
+            areas = conn.execute("""
+                SELECT area, COUNT(*), COALESCE(SUM(size), 0), MIN(last_access) FROM artifacts GROUP BY area
+            """).fetchall()
+            tenants = conn.execute("""
+                SELECT tenant, COUNT(*), COALESCE(SUM(size), 0) FROM artifacts GROUP BY tenant
+            """).fetchall()
+            counters = dict(conn.execute('SELECT name, value FROM storage_stats').fetchall())
+
+        now = time.time()
+        area_usage = {name: {'bytes': 0, 'artifacts': 0, 'oldest_access_age': None} for name in self.quotas}
+        for name, count, size, oldest in areas:
+            area_usage[name] = {'bytes': size, 'artifacts': count,
+                                'oldest_access_age': now - oldest if oldest else None}
+        for name, usage in area_usage.items():
+            quota = self.quotas.get(name)
+            usage.update({
+                'quota': quota,
+                'usage_ratio': usage['bytes'] / quota if quota else None,
+                'evicted': int(counters.get(f'evicted_{name}', 0)),
+                'evicted_bytes': int(counters.get(f'evicted_{name}_bytes', 0))
+            })
+
+        tenant_usage = {}
+        for tenant, count, size in tenants:
+            quota = self.quota_for_tenant(tenant)
+            tenant_usage[tenant] = {
+                'bytes': size,
+                'artifacts': count,
+                'quota': quota,
+                'usage_ratio': size / quota if quota else None
+            }
+        return {'areas': area_usage, 'tenants': tenant_usage}
@@ -0,0 +1,241 @@
+"""
+任务存储 - 基于SQLite（WAL模式）持久化任务状态，多个工作进程共享同一个数据库文件
+状态轮询读取的热字段与体积较大的检测结果分表存储
+"""
+
+import os
+import json
+import time
+import sqlite3
+from contextlib import contextmanager
+
+# tasks表中的列（其余字段以JSON形式存入extra列）
+TASK_COLUMNS = (
+    'id', 'status', 'filename', 'filepath', 'upload_time', 'start_time', 'end_time',
+    'progress', 'message', 'llm_status', 'error'
+)
+
+
+def _json_default(value):
+    """序列化numpy标量/数组等非标准类型"""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, default=_json_default)
+
+
+class TaskStore:
+    def __init__(self, db_path):
+        """
+        初始化任务存储
+
+        Args:
+            db_path: SQLite数据库文件路径
+        """
+        self.db_path = db_path
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    filename TEXT,
+                    filepath TEXT,
+                    upload_time TEXT NOT NULL,
+                    start_time TEXT,
+                    end_time TEXT,
+                    progress INTEGER NOT NULL DEFAULT 0,
+                    message TEXT,
+                    llm_status TEXT,
+                    error TEXT,
+                    extra TEXT,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_upload_time ON tasks(upload_time)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_status_upload_time ON tasks(status, upload_time)')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS task_results (
+                    task_id TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        """每次操作使用独立连接，事务结束后提交并关闭"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            # WAL模式下NORMAL同步级别仍保证数据库一致，只在掉电时可能丢失最近的提交
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _split_fields(fields):
+        """将字段拆分为列字段和extra字段"""
+        columns = {k: v for k, v in fields.items() if k in TASK_COLUMNS}
+        extra = {k: v for k, v in fields.items() if k not in TASK_COLUMNS and k != 'result'}
+        return columns, extra
+
+    @staticmethod
+    def _row_to_task(row):
+        task = {name: row[name] for name in TASK_COLUMNS}
+        if row['extra']:
+            task.update(json.loads(row['extra']))
+        return task
+
+    def create(self, task):
+        """创建任务（task必须包含id、status和upload_time）"""
+        columns, extra = self._split_fields(task)
+        columns['extra'] = _dumps(extra) if extra else None
+        columns['updated_at'] = time.time()
+        names = ', '.join(columns)
+        placeholders = ', '.join('?' for _ in columns)
+        with self._connect() as conn:
+            conn.execute(f'INSERT INTO tasks ({names}) VALUES ({placeholders})', tuple(columns.values()))
+        if task.get('result') is not None:
+            self.set_result(task['id'], task['result'])
+
+    def get(self, task_id, include_result=False):
+        """
+        获取任务
+
+        Args:
+            task_id: 任务ID
+            include_result: 是否同时读取检测结果（结果单独存表，状态轮询无需读取）
+
+        Returns:
+            dict: 任务字典，不存在时返回None
+        """
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+            if row is None:
+                return None
+            task = self._row_to_task(row)
+            if include_result:
+                result_row = conn.execute(
+                    'SELECT result FROM task_results WHERE task_id = ?', (task_id,)
+                ).fetchone()
+                task['result'] = json.loads(result_row['result']) if result_row else None
+        return task
+
+    def get_many(self, task_ids):
+        """批量读取任务的热字段（不含检测结果），返回 {任务ID: 任务字典}"""
+        tasks = {}
+        task_ids = list(task_ids)
+        with self._connect() as conn:
+            # 分批查询，避免超过SQLite的参数数量上限
+            for start in range(0, len(task_ids), 500):
+                chunk = task_ids[start:start + 500]
+                rows = conn.execute(f'SELECT * FROM tasks WHERE id IN ({", ".join("?" for _ in chunk)})', chunk)
+                for row in rows:
+                    tasks[row['id']] = self._row_to_task(row)
+        return tasks
+
+    def exists(self, task_id):
+        with self._connect() as conn:
+            return conn.execute('SELECT 1 FROM tasks WHERE id = ?', (task_id,)).fetchone() is not None
+
+    def update(self, task_id, expected_status=None, **fields):
+        """
+        更新任务字段
+
+        Args:
+            task_id: 任务ID
+            expected_status: 仅当当前状态等于该值时才更新（用于原子的状态转换）
+            **fields: 要更新的字段，非列字段合并到extra中
+
+        Returns:
+            bool: 是否有任务被更新
+        """
+        columns, extra = self._split_fields(fields)
+        columns['updated_at'] = time.time()
+        assignments = [f'{name} = ?' for name in columns]
+        values = list(columns.values())
+        if extra:
+            # json_patch按键合并，extra为空时以'{}'为基础
+            assignments.append("extra = json_patch(COALESCE(extra, '{}'), ?)")
+            values.append(_dumps(extra))
+
+        sql = f'UPDATE tasks SET {", ".join(assignments)} WHERE id = ?'
+        values.append(task_id)
+        if expected_status is not None:
+            sql += ' AND status = ?'
+            values.append(expected_status)
+
+        with self._connect() as conn:
+            return conn.execute(sql, values).rowcount > 0
+
+    def set_result(self, task_id, result):
+        """保存任务的检测结果"""
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO task_results (task_id, result, updated_at) VALUES (?, ?, ?)
+            """, (task_id, _dumps(result), time.time()))
+
+    def get_result(self, task_id):
+        """读取任务的检测结果，不存在时返回None"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT result FROM task_results WHERE task_id = ?', (task_id,)).fetchone()
+        return json.loads(row['result']) if row else None
+
+    def get_result_json(self, task_id):
+        """读取检测结果的JSON文本（原样返回给客户端时不必解析），不存在时返回None"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT result FROM task_results WHERE task_id = ?', (task_id,)).fetchone()
+        return row['result'] if row else None
+
+    def list(self, statuses=None, since=None, until=None, limit=50, offset=0):
+        """
+        按上传时间倒序分页查询任务（只读取热字段）
+
+        Args:
+            statuses: 状态过滤列表，None表示不过滤
+            since / until: 上传时间范围（ISO格式字符串，包含边界）
+            limit / offset: 分页参数
+
+        Returns:
+            tuple: (任务列表, 符合条件的总数)
+        """
+        conditions = []
+        values = []
+        if statuses:
+            conditions.append(f'status IN ({", ".join("?" for _ in statuses)})')
+            values.extend(statuses)
+        if since:
+            conditions.append('upload_time >= ?')
+            values.append(since)
+        if until:
+            conditions.append('upload_time <= ?')
+            values.append(until)
+        where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+
+        with self._connect() as conn:
+            total = conn.execute(f'SELECT COUNT(*) FROM tasks {where}', values).fetchone()[0]
+            rows = conn.execute(f"""
+                SELECT id, filename, status, upload_time, progress FROM tasks {where}
+                ORDER BY upload_time DESC LIMIT ? OFFSET ?
+            """, values + [limit, offset]).fetchall()
+        return [dict(row) for row in rows], total
+
+    def fail_interrupted(self, running_status, error_status, message, exclude=()):
+        """将上次运行中断的处理中任务标记为失败（服务重启后这些任务不会再有进度，exclude中的任务已继续运行）"""
+        exclude = list(exclude)
+        placeholders = ', '.join('?' for _ in exclude)
+        with self._connect() as conn:
+            return conn.execute(f"""
+                UPDATE tasks SET status = ?, message = ?, error = ?, updated_at = ?
+                WHERE status = ? {f'AND id NOT IN ({placeholders})' if exclude else ''}
+            """, [error_status, message, message, time.time(), running_status] + exclude).rowcount
@@ -0,0 +1,160 @@
+"""
+缩略图 - 检测过程中保存每个跌倒事件帧的缩小JPEG，并按固定间隔截取缩略图拼成雪碧图（sprite sheet）
+结果页查看事件只需加载几十KB的图片，不必下载并拖动整个输出视频
+"""
+
+import os
+import re
+import cv2
+import numpy as np
+
+# 可通过缩略图接口访问的文件名
+THUMBNAIL_FILE_RE = re.compile(r'^(event_\d{4,}|sprite_\d{3,})\.jpg$')
+
+
+def _resize_to_width(frame, width):
+    height, original_width = frame.shape[:2]
+    if original_width <= width:
+        return frame
+    new_height = max(1, int(round(height * width / original_width)))
+    return cv2.resize(frame, (width, new_height), interpolation=cv2.INTER_AREA)
+
+
+class ThumbnailRecorder:
+    def __init__(self, directory, event_width=320, sprite_interval=10.0, tile_width=160,
+                 sprite_columns=10, sprite_rows=10, jpeg_quality=80):
+        """
+        初始化缩略图记录器
+
+        Args:
+            directory: 输出目录
+            event_width: 事件缩略图宽度（像素）
+            sprite_interval: 雪碧图截取间隔（视频秒数）
+            tile_width: 雪碧图中单个缩略图的宽度（像素）
+            sprite_columns / sprite_rows: 每张雪碧图的列数和行数，写满后开始下一张
+            jpeg_quality: JPEG质量（0-100）
+        """
+        self.directory = directory
+        self.event_width = event_width
+        self.sprite_interval = sprite_interval
+        self.tile_width = tile_width
+        self.sprite_columns = sprite_columns
+        self.sprite_rows = sprite_rows
+        self.jpeg_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+
+        self.events = []
+        self.sheets = []
+        self.tile_height = None
+        self._tiles = []            # 当前雪碧图中的缩略图
+        self._next_sprite_time = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _write(self, name, image):
+        path = os.path.join(self.directory, name)
+        if not cv2.imwrite(path, image, self.jpeg_params):
+            raise IOError(f"无法写入缩略图: {path}")
+        return os.path.getsize(path)
+
+    def capture_event(self, index, frame, event):
+        """
+        保存跌倒事件帧的缩略图，文件名写入event['thumbnail']
+
+        Args:
+            index: 事件序号（从0开始）
+            frame: 事件帧（已标注）
+            event: 事件字典
+        """
+        name = f"event_{index + 1:04d}.jpg"
+        image = _resize_to_width(frame, self.event_width)
+        size = self._write(name, image)
+        event['thumbnail'] = name
+        self.events.append({
+            'index': index,
+            'frame': event.get('frame'),
+            'timestamp': event.get('timestamp'),
+            'file': name,
+            'width': image.shape[1],
+            'height': image.shape[0],
+            'bytes': size
+        })
+
+    def add_frame(self, timestamp, frame):
+        """到达截取间隔时把该帧加入雪碧图（其余帧直接忽略）"""
+        if timestamp < self._next_sprite_time:
+            return
+        self._next_sprite_time += self.sprite_interval
+        while self._next_sprite_time <= timestamp:
+            self._next_sprite_time += self.sprite_interval
+
+        if self.tile_height is None:
+            height, width = frame.shape[:2]
+            self.tile_height = max(1, int(round(height * self.tile_width / width)))
+        tile = cv2.resize(frame, (self.tile_width, self.tile_height), interpolation=cv2.INTER_AREA)
+        self._tiles.append((timestamp, tile))
+        if len(self._tiles) >= self.sprite_columns * self.sprite_rows:
+            self._flush_sheet()
+
+    def _flush_sheet(self):
+        if not self._tiles:
+            return
+        count = len(self._tiles)
+        columns = min(self.sprite_columns, count)
+        rows = (count + columns - 1) // columns
+        sheet = np.zeros((rows * self.tile_height, columns * self.tile_width, 3), dtype=np.uint8)
+        for i, (_, tile) in enumerate(self._tiles):
+            row, column = divmod(i, columns)
+            y, x = row * self.tile_height, column * self.tile_width
+            sheet[y:y + self.tile_height, x:x + self.tile_width] = tile
+
+        name = f"sprite_{len(self.sheets):03d}.jpg"
+        size = self._write(name, sheet)
+        self.sheets.append({
+            'file': name,
+            'columns': columns,
+            'rows': rows,
+            'timestamps': [round(timestamp, 3) for timestamp, _ in self._tiles],
+            'bytes': size
+        })
+        self._tiles = []
+
+    def get_state(self):
+        """
+        检查点状态：已写出的事件缩略图和雪碧图信息，以及当前雪碧图中尚未写出的缩略图
+
+        Returns:
+            tuple: (可JSON序列化的状态, 未写出的缩略图图像列表)
+        """
+        state = {
+            'events': self.events,
+            'sheets': self.sheets,
+            'tile_height': self.tile_height,
+            'next_sprite_time': self._next_sprite_time,
+            'tile_timestamps': [timestamp for timestamp, _ in self._tiles]
+        }
+        return state, [tile for _, tile in self._tiles]
+
+    def restore_state(self, state, tiles):
+        """从检查点恢复（目录中已写出的缩略图文件保留）"""
+        self.events = list(state['events'])
+        self.sheets = list(state['sheets'])
+        self.tile_height = state['tile_height']
+        self._next_sprite_time = state['next_sprite_time']
+        self._tiles = list(zip(state['tile_timestamps'], tiles))
+
+    def finish(self):
+        """
+        写出最后一张雪碧图
+
+        Returns:
+            dict: 事件缩略图列表和雪碧图信息（文件名相对于输出目录）
+        """
+        self._flush_sheet()
+        return {
+            'events': self.events,
+            'sprite': {
+                'interval': self.sprite_interval,
+                'tile_width': self.tile_width,
+                'tile_height': self.tile_height,
+                'sheets': self.sheets
+            }
+        }
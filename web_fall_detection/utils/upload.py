@@ -0,0 +1,164 @@
+"""
+上传处理 - 上传文件在解析表单时直接分块写入上传目录，同一遍计算SHA-256和大小
+保存时只需重命名，不再整体读入内存或二次复制；保存后做容器识别和快速解码探测
+"""
+
+import os
+import uuid
+import hashlib
+import cv2
+from flask import Request, current_app
+
+# 文件头魔数 -> 容器格式
+CONTAINER_SIGNATURES = (
+    (4, b'ftyp', 'mp4'),                                 # MP4 / MOV (ISO BMFF)
+    (4, b'moov', 'mov'),                                 # 旧版QuickTime
+    (4, b'mdat', 'mov'),
+    (4, b'wide', 'mov'),
+    (4, b'free', 'mov'),
+    (0, b'\x1a\x45\xdf\xa3', 'mkv'),                     # Matroska / WebM
+    (0, b'\x30\x26\xb2\x75\x8e\x66\xcf\x11', 'asf'),     # WMV / ASF
+)
+
+HEADER_BYTES = 64
+
+
+class UploadRejected(Exception):
+    """上传的文件不是可处理的视频"""
+
+
+def sniff_container(header):
+    """根据文件头识别容器格式，无法识别时返回None"""
+    if header[:4] == b'RIFF' and header[8:12] == b'AVI ':
+        return 'avi'
+    for offset, magic, container in CONTAINER_SIGNATURES:
+        if header[offset:offset + len(magic)] == magic:
+            return container
+    return None
+
+
+class HashingFile:
+    """写入时计算哈希和大小的上传文件（先写入.part临时文件，保存时重命名）"""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.temp_path = os.path.join(directory, f".upload-{uuid.uuid4().hex}.part")
+        self._file = open(self.temp_path, 'w+b')
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+        self.header = b''
+        self.saved_path = None
+
+    def write(self, data):
+        if len(self.header) < HEADER_BYTES:
+            self.header += bytes(data[:HEADER_BYTES - len(self.header)])
+        self._sha256.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
+
+    def save_as(self, path):
+        """将已写入的内容移动到目标路径"""
+        self._file.close()
+        os.replace(self.temp_path, path)
+        self.saved_path = path
+
+    def close(self):
+        """请求结束时调用：未保存的临时文件直接删除"""
+        if not self._file.closed:
+            self._file.close()
+        if self.saved_path is None and os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    # werkzeug的FileStorage需要的其余文件接口
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def readline(self, *args):
+        return self._file.readline(*args)
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        return self._file.flush()
+
+
+class StreamingUploadRequest(Request):
+    """上传文件直接写入app.config['UPLOAD_FOLDER']，而不是先写入临时文件"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        return HashingFile(current_app.config['UPLOAD_FOLDER'])
+
+
+def save_upload(file_storage, path):
+    """
+    保存上传文件
+
+    Returns:
+        dict: 文件大小、SHA-256和识别出的容器格式
+    """
+    stream = file_storage.stream
+    if isinstance(stream, HashingFile):
+        stream.save_as(path)
+        return {'size': stream.size, 'sha256': stream.sha256, 'container': sniff_container(stream.header)}
+
+    # 非流式请求（如测试客户端传入内存文件）：边复制边计算
+    sha256 = hashlib.sha256()
+    size = 0
+    header = b''
+    with open(path, 'wb') as f:
+        while True:
+            data = stream.read(1024 * 1024)
+            if not data:
+                break
+            if len(header) < HEADER_BYTES:
+                header += data[:HEADER_BYTES - len(header)]
+            sha256.update(data)
+            size += len(data)
+            f.write(data)
+    return {'size': size, 'sha256': sha256.hexdigest(), 'container': sniff_container(header)}
+
+
+def probe_video(path):
+    """
+    快速探测视频：能否打开、能否解码首帧，以及基本参数
+
+    Raises:
+        UploadRejected: 无法打开或解码
+    """
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise UploadRejected('无法打开视频文件，文件可能已损坏或编码不受支持')
+        ret, frame = cap.read()
+        if not ret or frame is None:
+            raise UploadRejected('无法解码视频首帧，文件可能已损坏或编码不受支持')
+
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        codec = ''.join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip('\x00 ')
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if fps <= 0 or fps > 1000:
+            raise UploadRejected('无法读取视频帧率')
+        return {
+            'width': frame.shape[1],
+            'height': frame.shape[0],
+            'fps': fps,
+            'frame_count': frame_count,
+            'duration': frame_count / fps if frame_count > 0 else None,
+            'codec': codec or None
+        }
+    finally:
+        cap.release()
@@ -0,0 +1,17 @@
+"""
+生产模式WSGI入口 - Web进程只处理HTTP请求，检测任务放入队列，由detection_worker.py启动的模型工作进程执行
+
+用法:
+    python detection_worker.py
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import os
+
+# 必须在导入app之前设置
+os.environ.setdefault('FALL_DETECTION_MODE', 'queue')
+
+from app import app, start_batch_dispatcher  # noqa: E402
+
+# 每个Web进程各有一个批量任务调度线程，通过批次存储的事务协调全局并发上限
+start_batch_dispatcher()